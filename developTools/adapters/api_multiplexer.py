@@ -0,0 +1,138 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from developTools.utils import fast_json
+from developTools.utils.logger import get_logger
+
+# 默认限流，单位：次/秒，burst 为允许的突发量。未列出的 action 不限流
+DEFAULT_RATE_LIMITS = {
+    "send_group_msg": {"rate": 10, "burst": 20},
+    "send_private_msg": {"rate": 10, "burst": 20},
+    "send_group_forward_msg": {"rate": 3, "burst": 6},
+    "send_private_forward_msg": {"rate": 3, "burst": 6},
+    "upload_group_file": {"rate": 1, "burst": 3},
+    "upload_private_file": {"rate": 1, "burst": 3},
+}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """取得一个令牌，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+class ActionStats:
+    __slots__ = ("calls", "timeouts", "errors", "total_rtt", "max_rtt", "throttled")
+
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_rtt = 0.0
+        self.max_rtt = 0.0
+        self.throttled = 0.0  # 因限流累计等待的秒数
+
+
+class ApiMultiplexer:
+    """
+    通过 echo 关联 API 请求与响应。
+
+    - pending: echo -> Future，收到响应时由 resolve 唤醒
+    - max_inflight: 同时等待响应的请求上限
+    - rate_limits: 按 action 的令牌桶限流
+    - stats: 按 action 统计往返耗时、超时与失败次数
+    """
+
+    def __init__(self, max_inflight: int = 32, rate_limits: Optional[Dict[str, dict]] = None, logger=None):
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.max_inflight = max_inflight
+        self._inflight = asyncio.Semaphore(max_inflight)
+        limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        self.buckets: Dict[str, TokenBucket] = {
+            action: TokenBucket(limit["rate"], limit.get("burst", limit["rate"]))
+            for action, limit in limits.items() if limit and limit.get("rate")
+        }
+        self.stats: Dict[str, ActionStats] = {}
+        self.logger = logger or get_logger()
+
+    async def call(self, send: Callable[[str], Awaitable[Any]], action: str, params: dict, timeout: float = 20) -> dict:
+        stats = self.stats.get(action)
+        if stats is None:
+            stats = self.stats[action] = ActionStats()
+        if bucket := self.buckets.get(action):
+            stats.throttled += await bucket.acquire()
+
+        async with self._inflight:
+            echo = str(uuid.uuid4())
+            future = asyncio.get_running_loop().create_future()
+            self.pending[echo] = future
+            start = time.perf_counter()
+            try:
+                await send(fast_json.dumps({"action": action, "params": params, "echo": echo}))
+                result = await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                stats.timeouts += 1
+                self.logger.error(f"调用 API 超时: {action}")
+                return {"status": "failed", "retcode": 98, "data": None, "msg": "API call timeout", "echo": echo}
+            except asyncio.CancelledError:
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    # 连接断开时 cancel_all 取消了等待中的请求，调用方本身没有被取消
+                    stats.errors += 1
+                    return {"status": "failed", "retcode": -1, "data": None, "msg": "connection closed", "echo": echo}
+                raise
+            finally:
+                self.pending.pop(echo, None)
+            rtt = time.perf_counter() - start
+            stats.calls += 1
+            stats.total_rtt += rtt
+            if rtt > stats.max_rtt:
+                stats.max_rtt = rtt
+            if isinstance(result, dict) and result.get("status") == "failed":
+                stats.errors += 1
+            return result
+
+    def resolve(self, data: dict) -> bool:
+        """把响应交给对应的请求，返回是否有请求在等待该 echo"""
+        future = self.pending.pop(data.get("echo"), None)
+        if future is None or future.done():
+            return False
+        future.set_result(data)
+        return True
+
+    def cancel_all(self):
+        """连接断开时取消所有等待中的请求"""
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+
+    def summary(self) -> str:
+        if not self.stats:
+            return "API：暂无调用"
+        lines = [f"API：等待响应 {len(self.pending)}/{self.max_inflight}"]
+        for action, s in sorted(self.stats.items(), key=lambda item: item[1].calls, reverse=True):
+            avg = s.total_rtt / s.calls * 1000 if s.calls else 0
+            lines.append(f"  {action}: {s.calls} 次 | 平均 {avg:.0f}ms | 最大 {s.max_rtt * 1000:.0f}ms | "
+                         f"超时 {s.timeouts} | 失败 {s.errors} | 限流等待 {s.throttled:.1f}s")
+        return "\n".join(lines)
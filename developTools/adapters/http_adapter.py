@@ -55,6 +55,10 @@ class HTTPBot(http_mailman):
             await asyncio.create_task(self.receive(data))
             return {"status": "success"}
 
+        @self.app.on_event("shutdown")
+        async def shutdown():
+            await self.close()
+
     def on(self, event: Type[EventBase]):
         return self.event_bus.on(event)
 
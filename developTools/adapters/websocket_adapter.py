@@ -1,41 +1,115 @@
 import asyncio
-import json
 import os
 import sys
+import time
 import uuid
-from typing import Type, Union, Dict, Optional
+from typing import Any, Awaitable, Callable, Type, Union, Dict, Optional
 
 import httpx
 import websockets
 
+from developTools.adapters.api_multiplexer import ApiMultiplexer
 from developTools.event.base import EventBase
 from developTools.event.eventFactory import EventFactory
+from developTools.event.events import HeartbeatMetaEvent
+from developTools.event.handler_stats import HandlerStatsRegistry, handler_name
+from developTools.event.router import CommandRouter, segment_types_of
+from developTools.event.scheduler import EventScheduler, DEFAULT_LANE
 from developTools.message.message_chain import MessageChain
 from developTools.message.message_components import MessageComponent, Text, Reply, Node, File
+from developTools.utils import fast_json
+from developTools.utils.frame_classifier import classify_frame, FRAME_HEARTBEAT
 from developTools.utils.logger import get_logger
 
 
 # 引入 EventBus
 class EventBus:
-    def __init__(self) -> None:
+    def __init__(self, logger=None, scheduler: Optional[EventScheduler] = None) -> None:
         self.handlers: dict[Type[EventBase], set] = {}
+        self.routers: dict[Type[EventBase], CommandRouter] = {}
+        self.stats = HandlerStatsRegistry()  # 各处理器的调用次数、耗时与异常统计
+        self.logger = logger or get_logger()
+        self.scheduler = scheduler or EventScheduler(logger=self.logger)
+        self._background_tasks: set[asyncio.Task] = set()
 
-    def subscribe(self, event: Type[EventBase], handler):
+    def subscribe(self, event: Type[EventBase], handler, lane: Optional[str] = None,
+                  concurrency: Optional[int] = None, **triggers):
+        """
+        订阅事件。
+        lane/concurrency 为调度选项，见 EventScheduler.configure；
+        triggers 可选 exact/prefix/regex/needs，仅对消息事件生效，见 CommandRouter.add
+        """
         if event not in self.handlers:
             self.handlers[event] = set()
+            self.routers[event] = CommandRouter()
         self.handlers[event].add(handler)
+        self.routers[event].add(handler, **triggers)
+        if lane or concurrency:
+            self.scheduler.configure(handler, lane, concurrency)
 
-    def on(self, event: Type[EventBase]):
+    def on(self, event: Type[EventBase], **options):
         def decorator(func):
-            self.subscribe(event, func)
+            self.subscribe(event, func, **options)
             return func
         return decorator
 
-    async def emit(self, event_instance: EventBase) -> None:
+    def select_handlers(self, event_instance: EventBase) -> list:
+        """
+        选出需要处理该事件的处理器。消息事件经过指令路由表筛选，其余事件广播给全部处理器。
+        """
         event_type = type(event_instance)
-        if handlers := self.handlers.get(event_type):
-            tasks = [asyncio.create_task(handler(event_instance)) for handler in handlers]
-            await asyncio.gather(*tasks)
+        router = self.routers.get(event_type)
+        if router is None:
+            return []
+        if hasattr(event_instance, "pure_text"):
+            return router.match(event_instance.pure_text, segment_types_of(event_instance))
+        return list(self.handlers[event_type])
+
+    async def _run_handler(self, handler, event_instance: EventBase):
+        """
+        执行单个处理器并记录耗时、异常与取消。
+        """
+        start = time.perf_counter()
+        try:
+            await handler(event_instance)
+        except asyncio.CancelledError:
+            self.stats.record(handler, time.perf_counter() - start, cancelled=True)
+            raise
+        except Exception as e:
+            self.stats.record(handler, time.perf_counter() - start, error=e)
+            self.logger.error(f"处理器 {handler_name(handler)} 出现异常: {e}", exc_info=True)
+        else:
+            self.stats.record(handler, time.perf_counter() - start)
+
+    async def _dispatch(self, event_instance: EventBase, handlers: list) -> None:
+        """
+        在调度器的并发限制内执行消息事件的处理器。只等待 default 通道的处理器，heavy 通道的处理器在后台运行。
+        """
+        waits = []
+        for handler in handlers:
+            task = asyncio.create_task(self.scheduler.run_handler(
+                handler, lambda handler=handler: self._run_handler(handler, event_instance)))
+            if self.scheduler.lane_of(handler) == DEFAULT_LANE:
+                waits.append(task)
+            else:
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+        await asyncio.gather(*waits)
+        if report := self.stats.pop_slow_report():
+            self.logger.warning(report)
+
+    async def emit(self, event_instance: EventBase) -> None:
+        if handlers := self.select_handlers(event_instance):
+            if not hasattr(event_instance, "pure_text"):
+                # 通知、请求、元事件数量少，且不少插件在 lifecycle 事件里常驻循环，不占用调度名额
+                tasks = [asyncio.create_task(self._run_handler(handler, event_instance)) for handler in handlers]
+                await asyncio.gather(*tasks)
+            elif (group_id := getattr(event_instance, "group_id", None)) is not None:
+                # 群消息进入该群的有界队列，积压时按策略丢弃
+                self.scheduler.submit(group_id, event_instance,
+                                      lambda event, handlers=handlers: self._dispatch(event, handlers))
+            else:
+                await self._dispatch(event_instance, handlers)
         else:
             pass
             #print(f"未找到处理 {event_type} 的监听器")
@@ -43,14 +117,27 @@ class EventBus:
 
 
 class WebSocketBot:
-    def __init__(self, uri: str,blocked_loggers=None):
+    def __init__(self, uri: str,blocked_loggers=None,scheduler: Optional[EventScheduler]=None,api_mux: Optional[ApiMultiplexer]=None):
         self.uri = uri
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
         self.logger = get_logger(blocked_loggers)
-        self.event_bus = EventBus()
-        self.response_callbacks: Dict[str, asyncio.Future] = {}
+        self.event_bus = EventBus(self.logger, scheduler)
+        self.api_mux = api_mux or ApiMultiplexer(logger=self.logger)
+        self.response_callbacks: Dict[str, asyncio.Future] = self.api_mux.pending
         self.receive_task: Optional[asyncio.Task] = None
+        self.heartbeat_count = 0
+        self.last_heartbeat: Optional[float] = None
+        self.shutdown_callbacks: list[Callable[[], Awaitable[Any]]] = []
 
+    def _skip_heartbeat(self, response) -> bool:
+        """
+        心跳帧且没有处理器订阅心跳事件时，只计数，不解析 JSON 也不构建事件对象。
+        """
+        if classify_frame(response) != FRAME_HEARTBEAT or HeartbeatMetaEvent in self.event_bus.handlers:
+            return False
+        self.heartbeat_count += 1
+        self.last_heartbeat = time.time()
+        return True
 
     async def _receive(self):
         """
@@ -58,15 +145,14 @@ class WebSocketBot:
         """
         try:
             async for response in self.websocket:
-                data = json.loads(response)
+                if self._skip_heartbeat(response):
+                    continue
+                data = fast_json.loads(response)
                 self.logger.info_msg(f"收到服务端响应: {data}")
 
                 # 如果是响应消息
                 if "status" in data and "echo" in data:
-                    echo = data["echo"]
-                    future = self.response_callbacks.pop(echo, None)
-                    if future and not future.done():
-                        future.set_result(data)
+                    self.api_mux.resolve(data)
                 elif "post_type" in data:
                     event_obj = EventFactory.create_event(data)
                     try:
@@ -92,10 +178,7 @@ class WebSocketBot:
             self.logger.error(f"接收消息时发生错误: {e}", exc_info=True)
         finally:
             # 取消所有未完成的 Future
-            for future in self.response_callbacks.values():
-                if not future.done():
-                    future.cancel()
-            self.response_callbacks.clear()
+            self.api_mux.cancel_all()
             self.receive_task = None
 
     async def _connect_and_run(self):
@@ -121,43 +204,53 @@ class WebSocketBot:
     async def _call_api(self, action: str, params: dict, timeout: int = 20) -> dict:
         """
         发送请求并异步等待响应，确保 bot 不被阻塞，同时 api调用 仍然能 await 拿到结果。
+        并发上限、按 action 限流与超时由 ApiMultiplexer 处理。
         """
         if self.websocket is None:
             self.logger.warning("WebSocket 未连接，无法调用 API。")
             return {"status": "failed", "retcode": -1, "data": None, "echo": str(uuid.uuid4())}
 
-        echo = str(uuid.uuid4())
-        message = {"action": action, "params": params, "echo": echo}
+        return await self.api_mux.call(self.websocket.send, action, params, timeout)
 
-        # 创建 Future，用于等待 API 响应
-        future = asyncio.Future()
-        self.response_callbacks[echo] = future
-        await self.websocket.send(json.dumps(message))
 
-        async def wait_for_response():
-            try:
-                return await asyncio.wait_for(future, timeout=timeout)
-            except asyncio.TimeoutError:
-                self.logger.error(f"调用 API 超时: {action}")
-                if echo in self.response_callbacks:
-                    del self.response_callbacks[echo]
-                return {"status": "failed", "retcode": 98, "data": None, "msg": "API call timeout", "echo": echo}
 
-        return await asyncio.create_task(wait_for_response())
 
+    def on_shutdown(self, func: Callable[[], Awaitable[Any]]):
+        """
+        注册退出时执行的协程函数，在事件循环关闭前按注册的相反顺序执行（与 atexit 相同），
+        因此插件注册的落盘操作会先于框架注册的关闭连接池执行。
+        """
+        self.shutdown_callbacks.append(func)
+        return func
 
+    async def _shutdown(self):
+        for callback in reversed(self.shutdown_callbacks):
+            try:
+                await callback()
+            except Exception as e:
+                self.logger.error(f"退出时执行 {callback} 出错: {e}")
 
+    async def _main(self):
+        try:
+            await self._connect_and_run()
+        finally:
+            await self._shutdown()
 
     def run(self):
         if sys.platform == 'win32':  #asyncio 默认事件循环策略与 Playwright 的兼容性问题
             asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-        asyncio.run(self._connect_and_run())
+        asyncio.run(self._main())
 
-    def on(self, event: Type[EventBase]):
+    def on(self, event: Type[EventBase], **options):
         """
         用于订阅事件的装饰器。
+        消息事件可声明触发条件，只有可能命中的消息才会分发给该处理器，例如
+        @bot.on(GroupMessageEvent, exact="随机忍术", prefix="查询忍术")
+        可用条件：exact 精确文本，prefix 前缀，regex 正则，needs 需要的消息段类型(image/reply/at等)。
+        不声明条件时，处理器会收到所有该类型事件。
+        调度选项：lane="heavy" 把图片渲染、下载等重任务放入独立通道，concurrency=N 限制该处理器的并发数。
         """
-        return self.event_bus.on(event)
+        return self.event_bus.on(event, **options)
 
 
     """
@@ -71,3 +71,28 @@ class EventFactory:
 
 
         return event_class(**data)
+
+
+# 基准：回放一段 OneBot 群消息上报，对比只读 pure_text 与完整解析消息链的耗时
+# 在仓库根目录运行：python -m developTools.event.eventFactory
+if __name__ == "__main__":
+    import timeit
+
+    payload = {
+        "self_id": 3377428814, "user_id": 1840094972, "time": 1735098202, "message_id": 1285474386,
+        "message_seq": 1285474386, "real_id": 1285474386, "message_type": "group",
+        "sender": {"user_id": 1840094972, "nickname": "Eridanus", "card": "", "role": "owner"},
+        "raw_message": "[CQ:reply,id=1285474385]查询忍术 火遁[CQ:image,file=A1B2C3.jpg,url=https://multimedia.nt.qq.com.cn/download?appid=1407&amp;fileid=x]",
+        "font": 14, "sub_type": "normal",
+        "message": [
+            {"type": "reply", "data": {"id": "1285474385"}},
+            {"type": "text", "data": {"text": "查询忍术 火遁"}},
+            {"type": "image", "data": {"file": "A1B2C3.jpg", "url": "https://multimedia.nt.qq.com.cn/download?appid=1407&fileid=x"}},
+        ],
+        "message_format": "array", "post_type": "message", "group_id": 879886836,
+    }
+    number = 5000
+    cost = timeit.timeit(lambda: EventFactory.create_event(payload).pure_text, number=number)
+    print(f"构建事件并读取 pure_text: {cost / number * 1e6:.1f} us/次")
+    cost = timeit.timeit(lambda: EventFactory.create_event(payload).message_chain, number=number)
+    print(f"构建事件并解析 message_chain: {cost / number * 1e6:.1f} us/次")
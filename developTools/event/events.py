@@ -1,7 +1,7 @@
 # pyright: reportIncompatibleVariableOverride=false
 from typing import Literal, Optional, Dict, Union, List, Any
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 from pydantic.v1 import validator
 
 from developTools.event.base import EventBase
@@ -91,11 +91,12 @@ class MessageEvent(BaseModel):
     to_me: bool = False
     reply: Optional[Reply] = None
 
-    processed_message: List[Dict[str, Union[str, Dict]]] = []
-
-    message_chain: MessageChain=[]
     pure_text: str = ""
 
+    # processed_message 与 message_chain 在首次访问时才解析，大部分处理器只需要 pure_text
+    _processed_message: Optional[List[Dict[str, Union[str, Dict]]]] = PrivateAttr(default=None)
+    _message_chain: Optional[MessageChain] = PrivateAttr(default=None)
+
     model_config = ConfigDict(extra="allow",arbitrary_types_allowed=True)
 
 
@@ -106,22 +107,40 @@ class MessageEvent(BaseModel):
     @raw_message.setter
     def raw_message(self, value: str):
         self._raw_message = value
-        if value == "":
-            self.processed_message = parse_message_2processed_message(self.message)
-        else:
-            self.processed_message = parse_message_with_cq_codes_to_list(value)
+        self._processed_message = None  # 下次访问时按新的 raw_message 重新解析
+
+    @property
+    def processed_message(self) -> List[Dict[str, Union[str, Dict]]]:
+        if self._processed_message is None:
+            try:
+                raw_message = self.raw_message
+            except AttributeError:
+                raw_message = None
+            if raw_message is None:
+                self._processed_message = []
+            elif raw_message == "":
+                self._processed_message = parse_message_2processed_message(self.message)
+            else:
+                self._processed_message = parse_message_with_cq_codes_to_list(raw_message)
+        return self._processed_message
+
+    @processed_message.setter
+    def processed_message(self, value: List[Dict[str, Union[str, Dict]]]):
+        self._processed_message = value
+
+    @property
+    def message_chain(self) -> MessageChain:
+        if self._message_chain is None:
+            self._message_chain = MessageChain(self.message)
+        return self._message_chain
+
+    @message_chain.setter
+    def message_chain(self, value: MessageChain):
+        self._message_chain = value
 
-    # 可选的，确保 processed_message 始终跟随 raw_message 更新
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 如果 raw_message 在初始化时已经赋值，确保 processed_message 被设置
-        if hasattr(self, 'raw_message'):
-            if self.raw_message == "":
-                self.processed_message = parse_message_2processed_message(self.message)
-            else:
-                self.processed_message = parse_message_with_cq_codes_to_list(self.raw_message)
-        self.message_chain=MessageChain(self.message)
-        self.pure_text=self.message_chain.fetch_text()
+        self.pure_text = MessageChain.fetch_text_from_dicts(self.message)
     def get(self, message_type: str):
         """
         按指定类型获取 processed_message 中的消息。
@@ -0,0 +1,121 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Optional
+
+# 耗时直方图的桶上界（毫秒），最后一个桶收集超过 30 秒的调用
+LATENCY_BUCKETS_MS = (5, 20, 50, 100, 250, 500, 1000, 5000, 30000, float("inf"))
+
+
+def handler_name(handler: Callable) -> str:
+    """模块名 + 函数名，用于区分各个插件的处理器"""
+    return f"{getattr(handler, '__module__', '?')}.{getattr(handler, '__qualname__', repr(handler))}"
+
+
+class HandlerStats:
+    __slots__ = ("name", "calls", "errors", "cancelled", "total_time", "max_time", "buckets", "last_error")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.last_error: Optional[str] = None
+
+    def observe(self, elapsed: float):
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed * 1000)] += 1
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def percentile(self, q: float) -> float:
+        """根据直方图估算分位数（秒），返回所在桶的上界"""
+        if not self.calls:
+            return 0.0
+        target = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target:
+                return (bound if bound != float("inf") else self.max_time * 1000) / 1000
+        return self.max_time
+
+
+class HandlerStatsRegistry:
+    """
+    进程内的处理器统计表：调用次数、耗时直方图、异常与取消次数。
+    """
+
+    def __init__(self, slow_threshold: float = 5.0, report_interval: float = 600.0):
+        self.stats: dict[str, HandlerStats] = {}
+        self.slow_threshold = slow_threshold  # 单次调用超过该秒数视为慢调用
+        self.report_interval = report_interval  # 慢处理器汇总日志的间隔（秒）
+        self._last_report = time.monotonic()
+        self._slow_since_report: dict[str, int] = {}
+
+    def get(self, handler: Callable) -> HandlerStats:
+        name = handler_name(handler)
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = HandlerStats(name)
+        return stats
+
+    def record(self, handler: Callable, elapsed: float, error: Optional[BaseException] = None, cancelled: bool = False):
+        stats = self.get(handler)
+        stats.observe(elapsed)
+        if cancelled:
+            stats.cancelled += 1
+        elif error is not None:
+            stats.errors += 1
+            stats.last_error = f"{type(error).__name__}: {error}"
+        if elapsed >= self.slow_threshold:
+            self._slow_since_report[stats.name] = self._slow_since_report.get(stats.name, 0) + 1
+
+    def pop_slow_report(self) -> Optional[str]:
+        """距上次汇总超过 report_interval 且期间出现过慢调用时，返回一行汇总并清空计数"""
+        now = time.monotonic()
+        if now - self._last_report < self.report_interval:
+            return None
+        self._last_report = now
+        if not self._slow_since_report:
+            return None
+        slow = sorted(self._slow_since_report.items(), key=lambda item: item[1], reverse=True)
+        self._slow_since_report = {}
+        return "慢处理器(>{:.0f}s): ".format(self.slow_threshold) + ", ".join(
+            f"{name} x{count} (max {self.stats[name].max_time:.1f}s)" for name, count in slow[:5])
+
+    def dump(self, top: int = 15, sort_by: str = "total") -> str:
+        """
+        文本形式的统计报表。
+        :param sort_by: total 总耗时, avg 平均耗时, calls 调用次数, errors 异常次数
+        """
+        keys = {
+            "total": lambda s: s.total_time,
+            "avg": lambda s: s.avg_time,
+            "calls": lambda s: s.calls,
+            "errors": lambda s: s.errors,
+        }
+        ordered = sorted(self.stats.values(), key=keys.get(sort_by, keys["total"]), reverse=True)[:top]
+        if not ordered:
+            return "暂无处理器统计数据"
+        lines = [f"处理器统计（按 {sort_by} 排序，前 {len(ordered)} 个）"]
+        for s in ordered:
+            lines.append(
+                f"{s.name}\n"
+                f"  调用 {s.calls} 次 | 总耗时 {s.total_time:.2f}s | 平均 {s.avg_time * 1000:.1f}ms | "
+                f"p95≈{s.percentile(0.95) * 1000:.0f}ms | 最大 {s.max_time * 1000:.0f}ms | "
+                f"异常 {s.errors} | 取消 {s.cancelled}"
+                + (f"\n  最近异常: {s.last_error}" if s.last_error else "")
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        self.stats.clear()
+        self._slow_since_report.clear()
@@ -0,0 +1,121 @@
+import re
+from typing import Any, Callable, Iterable, Optional, Union
+
+# get_img 能取到图片的消息段：图片、商城表情、引用（取被引用消息里的图片）
+IMAGE_SEGMENTS = ("image", "mface", "reply")
+
+
+class _TrieNode:
+    __slots__ = ("children", "handlers")
+
+    def __init__(self):
+        self.children: dict[str, "_TrieNode"] = {}
+        self.handlers: list[Callable] = []
+
+
+class CommandRouter:
+    """
+    消息事件的指令路由表。
+
+    处理器可在注册时声明触发条件（精确文本、前缀、正则、需要某种消息段），
+    路由表会把这些条件编译成 精确匹配字典 + 前缀字典树 + 合并正则，
+    每条消息只会分发给可能命中的处理器。未声明任何条件的处理器进入兜底列表，每条消息都会分发。
+    多个触发条件之间是“或”的关系。
+    """
+
+    def __init__(self):
+        self._exact: dict[str, list[Callable]] = {}
+        self._prefix_root = _TrieNode()
+        self._regex: list[tuple[re.Pattern, Callable]] = []
+        self._combined_regex: Optional[re.Pattern] = None
+        self._segments: dict[str, list[Callable]] = {}
+        self._fallback: list[Callable] = []
+        self._order: dict[Callable, int] = {}
+
+    def add(self, handler: Callable,
+            exact: Union[str, Iterable[str], None] = None,
+            prefix: Union[str, Iterable[str], None] = None,
+            regex: Union[str, re.Pattern, Iterable[Union[str, re.Pattern]], None] = None,
+            needs: Union[str, Iterable[str], None] = None) -> None:
+        """
+        注册处理器。
+        :param handler: 处理器
+        :param exact: 精确匹配的 pure_text
+        :param prefix: pure_text 的前缀
+        :param regex: 对 pure_text 进行 search 的正则
+        :param needs: 消息中需要包含的消息段类型，例如 image、reply、at
+        """
+        if handler in self._order:
+            return
+        self._order[handler] = len(self._order)
+        exact, prefix, regex, needs = (_as_tuple(exact), _as_tuple(prefix), _as_tuple(regex), _as_tuple(needs))
+        if not (exact or prefix or regex or needs):
+            self._fallback.append(handler)
+            return
+        for text in exact:
+            self._exact.setdefault(text, []).append(handler)
+        for text in prefix:
+            node = self._prefix_root
+            for char in text:
+                node = node.children.setdefault(char, _TrieNode())
+            node.handlers.append(handler)
+        if regex:
+            for pattern in regex:
+                self._regex.append((re.compile(pattern), handler))
+            self._combined_regex = re.compile("|".join(f"(?:{p.pattern})" for p, _ in self._regex))
+        for seg_type in needs:
+            self._segments.setdefault(seg_type, []).append(handler)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, handler: Callable) -> bool:
+        return handler in self._order
+
+    def match(self, text: str, segment_types: Iterable[str] = ()) -> list[Callable]:
+        """
+        返回可能处理该消息的处理器，按注册顺序排列，兜底处理器始终包含在内。
+        """
+        matched = set(self._fallback)
+        if text:
+            if handlers := self._exact.get(text):
+                matched.update(handlers)
+            node = self._prefix_root
+            for char in text:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                if node.handlers:
+                    matched.update(node.handlers)
+            if self._combined_regex is not None and self._combined_regex.search(text):
+                # 合并正则只用于快速排除，命中后再逐个确认
+                for pattern, handler in self._regex:
+                    if handler not in matched and pattern.search(text):
+                        matched.add(handler)
+        if self._segments:
+            for seg_type in segment_types:
+                if handlers := self._segments.get(seg_type):
+                    matched.update(handlers)
+        return sorted(matched, key=self._order.__getitem__)
+
+
+def segment_types_of(event: Any) -> set[str]:
+    """取出消息事件中出现过的消息段类型，不触发消息链解析。"""
+    message = getattr(event, "message", None) or []
+    types = set()
+    for segment in message:
+        if isinstance(segment, dict):
+            seg_type = segment.get("type")
+            if seg_type:
+                types.add(seg_type)
+    if getattr(event, "reply", None) is not None:
+        types.add("reply")
+    return types
+
+
+def _as_tuple(value) -> tuple:
+    if value is None:
+        return ()
+    if isinstance(value, (str, re.Pattern)):
+        return (value,)
+    return tuple(value)
@@ -0,0 +1,265 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from developTools.event.handler_stats import handler_name
+from developTools.utils.logger import get_logger
+
+# 处理器默认进入 default 通道；图片渲染、下载、LLM 等重任务声明 lane="heavy"，
+# 两个通道各自限流，重任务占满时普通指令依然有空位。
+DEFAULT_LANE = "default"
+HEAVY_LANE = "heavy"
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "coalesce")
+
+
+class HandlerOptions:
+    __slots__ = ("lane", "concurrency")
+
+    def __init__(self, lane: str = DEFAULT_LANE, concurrency: Optional[int] = None):
+        self.lane = lane
+        self.concurrency = concurrency  # 该处理器同时运行的最大实例数，None 为不限制
+
+
+class _GroupQueue:
+    __slots__ = ("events", "inflight", "wakeup", "worker", "dropped", "coalesced")
+
+    def __init__(self):
+        self.events: deque = deque()
+        self.inflight = 0  # 正在处理的事件数
+        self.wakeup: Optional[asyncio.Future] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.coalesced = 0
+
+
+class EventScheduler:
+    """
+    事件总线的调度层。
+
+    - 每个群一个有界队列，同一个群同时处理的事件数不超过 group_concurrency，
+      积压超过 group_queue_size 时按 overflow_policy 丢弃：
+      drop_oldest 丢弃最早的积压，drop_newest 丢弃新事件，coalesce 先合并同一用户的重复消息，仍然满则丢弃最早的。
+    - 每个通道（lane）一个全局并发上限，处理器还可以单独限制并发数。
+      default 通道的调用只排队等待、不丢弃，积压由每个群的事件队列按消息控制；
+      heavy 等通道的处理器在后台运行，排队等待的调用超过 lane_queue_size 时丢弃新的调用并记录日志。
+    - 群名额只由 default 通道的处理器占用，heavy 通道的处理器在后台继续运行，不会堵住该群后续的普通指令。
+    """
+
+    def __init__(self, lane_limits: Optional[dict[str, int]] = None, group_queue_size: int = 30,
+                 group_concurrency: int = 8, overflow_policy: str = "coalesce", lane_queue_size: int = 200,
+                 logger=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的 overflow_policy: {overflow_policy}，可选 {OVERFLOW_POLICIES}")
+        lane_limits = {DEFAULT_LANE: 64, HEAVY_LANE: 8, **(lane_limits or {})}
+        self.lane_limits = lane_limits
+        self.lanes = {lane: asyncio.Semaphore(limit) for lane, limit in lane_limits.items()}
+        self.lane_queue_size = lane_queue_size
+        self.lane_waiting = {lane: 0 for lane in lane_limits}
+        self.lane_dropped = {lane: 0 for lane in lane_limits}
+        self.lane_active = {lane: 0 for lane in lane_limits}
+        self.group_queue_size = group_queue_size
+        self.group_concurrency = group_concurrency
+        self.overflow_policy = overflow_policy
+        self.options: dict[Callable, HandlerOptions] = {}
+        self._handler_semaphores: dict[Callable, asyncio.Semaphore] = {}
+        self.groups: dict[Hashable, _GroupQueue] = {}
+        self.logger = logger or get_logger()
+
+    def configure(self, handler: Callable, lane: Optional[str] = None, concurrency: Optional[int] = None):
+        lane = lane or DEFAULT_LANE
+        if lane not in self.lanes:
+            raise ValueError(f"未知的通道: {lane}，可选 {tuple(self.lanes)}")
+        self.options[handler] = HandlerOptions(lane, concurrency)
+        if concurrency:
+            self._handler_semaphores[handler] = asyncio.Semaphore(concurrency)
+
+    def lane_of(self, handler: Callable) -> str:
+        options = self.options.get(handler)
+        return options.lane if options else DEFAULT_LANE
+
+    async def run_handler(self, handler: Callable, run: Callable[[], Awaitable[Any]]):
+        """
+        在处理器自身的并发限制与所属通道的并发限制内执行 run。
+        先占处理器的名额再占通道名额，避免排队中的处理器白白占用通道。
+        """
+        lane_name = self.lane_of(handler)
+        lane = self.lanes[lane_name]
+        handler_semaphore = self._handler_semaphores.get(handler)
+        if lane_name != DEFAULT_LANE and (lane.locked() or (handler_semaphore and handler_semaphore.locked())) \
+                and self.lane_waiting[lane_name] >= self.lane_queue_size:
+            self.lane_dropped[lane_name] += 1
+            if self.lane_dropped[lane_name] % 100 == 1:  # 持续积压时避免刷屏
+                self.logger.warning(f"{lane_name} 通道排队的调用超过 {self.lane_queue_size} 个，丢弃 {handler_name(handler)}，"
+                                    f"累计丢弃 {self.lane_dropped[lane_name]} 次")
+            return None
+        self.lane_waiting[lane_name] += 1
+        try:
+            if handler_semaphore is not None:
+                await handler_semaphore.acquire()
+            try:
+                await lane.acquire()
+            except BaseException:
+                if handler_semaphore is not None:
+                    handler_semaphore.release()
+                raise
+        finally:
+            self.lane_waiting[lane_name] -= 1
+        self.lane_active[lane_name] += 1
+        try:
+            return await run()
+        finally:
+            self.lane_active[lane_name] -= 1
+            lane.release()
+            if handler_semaphore is not None:
+                handler_semaphore.release()
+
+    def submit(self, group_id: Hashable, event: Any, dispatch: Callable[[Any], Awaitable[Any]]) -> bool:
+        """
+        把群事件放入该群的队列。
+        :return: False 表示事件因积压被丢弃
+        """
+        queue = self.groups.get(group_id)
+        if queue is None:
+            queue = self.groups[group_id] = _GroupQueue()
+
+        # 快速路径：没有积压且还有名额时直接分发
+        if not queue.events and queue.inflight < self.group_concurrency:
+            self._start(queue, event, dispatch)
+            return True
+
+        if self.overflow_policy == "coalesce" and self._coalesce(queue, event):
+            return False
+        if len(queue.events) >= self.group_queue_size:
+            queue.dropped += 1
+            if queue.dropped % 100 == 1:  # 持续积压时避免刷屏
+                self.logger.warning(f"群{group_id}积压事件过多，按 {self.overflow_policy} 策略丢弃，累计丢弃 {queue.dropped} 条")
+            if self.overflow_policy == "drop_newest":
+                return False
+            queue.events.popleft()
+        queue.events.append((event, dispatch))
+        if queue.worker is None:
+            queue.worker = asyncio.create_task(self._drain(queue))
+        return True
+
+    def _coalesce(self, queue: _GroupQueue, event: Any) -> bool:
+        key = (getattr(event, "user_id", None), getattr(event, "pure_text", None))
+        if key[1] is None:
+            return False
+        for queued, _ in queue.events:
+            if (getattr(queued, "user_id", None), getattr(queued, "pure_text", None)) == key:
+                queue.coalesced += 1
+                return True
+        return False
+
+    def _start(self, queue: _GroupQueue, event: Any, dispatch: Callable[[Any], Awaitable[Any]]):
+        queue.inflight += 1
+        task = asyncio.create_task(dispatch(event))
+        task.add_done_callback(lambda _: self._finish(queue))
+
+    @staticmethod
+    def _finish(queue: _GroupQueue):
+        queue.inflight -= 1
+        if queue.wakeup is not None and not queue.wakeup.done():
+            queue.wakeup.set_result(None)
+
+    async def _drain(self, queue: _GroupQueue):
+        try:
+            while queue.events:
+                if queue.inflight >= self.group_concurrency:
+                    queue.wakeup = asyncio.get_running_loop().create_future()
+                    await queue.wakeup
+                    continue
+                event, dispatch = queue.events.popleft()
+                self._start(queue, event, dispatch)
+        finally:
+            queue.wakeup = None
+            queue.worker = None
+
+    def summary(self) -> str:
+        backlog = sum(len(q.events) for q in self.groups.values())
+        dropped = sum(q.dropped for q in self.groups.values())
+        coalesced = sum(q.coalesced for q in self.groups.values())
+        lanes = ", ".join(
+            f"{lane} {self.lane_active[lane]}/{self.lane_limits[lane]}"
+            f"(排队 {self.lane_waiting[lane]}, 丢弃 {self.lane_dropped[lane]})"
+            for lane in self.lanes)
+        return f"调度器：通道占用 {lanes} | 积压 {backlog} | 丢弃 {dropped} | 合并 {coalesced}"
+
+
+# 压测：一个群突发 2000 条消息，其中一半触发 0.5s 的重任务，观察普通指令的 p99 延迟
+# 在仓库根目录运行：python -m developTools.event.scheduler
+if __name__ == "__main__":
+    import random
+    import time
+
+    class _Event:
+        def __init__(self, i):
+            self.user_id = i % 50
+            self.pure_text = f"msg{i}"
+            self.created = time.perf_counter()
+
+    async def _load_test(use_lanes: bool):
+        scheduler = EventScheduler(lane_limits={DEFAULT_LANE: 16, HEAVY_LANE: 4}, group_queue_size=200,
+                                   group_concurrency=32, overflow_policy="drop_oldest")
+        latencies = []
+
+        async def cheap(event):
+            latencies.append(time.perf_counter() - event.created)
+
+        async def heavy(event):
+            await asyncio.sleep(0.5)
+
+        scheduler.configure(cheap)
+        scheduler.configure(heavy, lane=HEAVY_LANE if use_lanes else DEFAULT_LANE)
+
+        background = set()
+
+        async def dispatch(event):
+            # 与 EventBus 一致：只等待 default 通道的处理器，heavy 通道在后台运行
+            handlers = [cheap, heavy] if random.random() < 0.5 else [cheap]
+            waits = []
+            for h in handlers:
+                task = asyncio.create_task(scheduler.run_handler(h, lambda h=h: h(event)))
+                if scheduler.lane_of(h) == DEFAULT_LANE:
+                    waits.append(task)
+                else:
+                    background.add(task)
+                    task.add_done_callback(background.discard)
+            await asyncio.gather(*waits)
+
+        for i in range(2000):
+            scheduler.submit(879886836, _Event(i), dispatch)
+            if i % 100 == 0:
+                await asyncio.sleep(0.01)
+        while any(q.events or q.worker for q in scheduler.groups.values()):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(1)
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        print(f"{'分通道' if use_lanes else '单通道'}: 处理 {len(latencies)} 条，普通指令 p99 延迟 {p99 * 1000:.0f}ms，{scheduler.summary()}")
+
+    random.seed(10571)
+    asyncio.run(_load_test(False))
+    asyncio.run(_load_test(True))
+
+    # 默认参数下一个群连续 20 条消息、每条交给 75 个各耗时 10ms 的普通处理器：全部执行，不丢弃
+    async def _burst(messages=20, handlers=75):
+        scheduler = EventScheduler()
+        calls = [0]
+
+        async def handler(event):
+            await asyncio.sleep(0.01)
+            calls[0] += 1
+
+        async def dispatch(event):
+            await asyncio.gather(*(scheduler.run_handler(handler, lambda: handler(event)) for _ in range(handlers)))
+
+        for i in range(messages):
+            scheduler.submit(879886836, _Event(i), dispatch)
+        while any(q.events or q.worker or q.inflight for q in scheduler.groups.values()):
+            await asyncio.sleep(0.05)
+        print(f"突发 {messages} 条 × {handlers} 个处理器: 执行 {calls[0]} 次，{scheduler.summary()}")
+        assert calls[0] == messages * handlers
+
+    asyncio.run(_burst())
@@ -1,4 +1,6 @@
-from typing import Union
+import asyncio
+import random
+from typing import Optional, Union
 
 import httpx
 import requests
@@ -9,27 +11,74 @@ from developTools.message.message_components import MessageComponent, Text, Repl
 from developTools.utils.logger import get_logger
 
 
+# 请求尚未发出时的错误，任何接口都可以安全重试
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# 长连接在响应途中被关闭时协议端可能已经处理了请求，只对 get_*/can_* 等只读接口重试，
+# 发消息、撤回、禁言、点赞等会改变状态的接口不重试，以免重复执行
+RETRY_ERRORS = CONNECT_ERRORS + (httpx.RemoteProtocolError,)
+READ_ONLY_PREFIXES = ("get_", "can_")
+
+
 class http_mailman:
-    def __init__(self, http_server, access_token=""):
+    def __init__(self, http_server, access_token="", max_connections=20, max_keepalive_connections=10,
+                 keepalive_expiry=30, timeout=200, retries=2):
         self.http_server = http_server
         self.logger = get_logger()
         self.headers = {
             "Authorization": f"Bearer {access_token}"
         }
+        # 长连接复用的 httpx 客户端，首次调用时在当前事件循环中创建
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = timeout
+        self.retries = retries
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
         try:
             self.info = self.get_login_info()
         except:
             self.info = None
 
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            # 连接池绑定在事件循环上，换了事件循环（例如 HTTPBot.run 先后两次启动循环）就重新创建
+            self._client = httpx.AsyncClient(base_url=self.http_server, headers=self.headers,
+                                             timeout=self.timeout, limits=self.limits)
+            self._client_loop = loop
+        return self._client
+
+    async def _post(self, action: str, data: Optional[dict] = None) -> dict:
+        """
+        调用协议端 HTTP API。连接失败或复用的长连接已被服务端关闭时，按指数退避加随机抖动重试。
+        只读接口之外的调用不是幂等操作，只在连接阶段出错（请求确定没有发出）时重试。
+        """
+        retry_errors = RETRY_ERRORS if action.startswith(READ_ONLY_PREFIXES) else CONNECT_ERRORS
+        for attempt in range(self.retries + 1):
+            try:
+                r = await self._get_client().post(f"/{action}", json=data)
+                return r.json()
+            except retry_errors as e:
+                if attempt >= self.retries:
+                    raise
+                delay = 0.2 * (2 ** attempt) + random.uniform(0, 0.2)
+                self.logger.warning(f"调用 {action} 失败: {e!r}，{delay:.2f}秒后重试")
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
     async def get_status(self):
         """
         获取服务状态
         :return:
         """
-        url = f"{self.http_server}/get_status"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url)
-            self.logger.info(f"状态: {r.json()}")
+        r = await self._post("get_status")
+        self.logger.info(f"状态: {r}")
 
     """
     消息发送
@@ -59,10 +108,7 @@ class http_mailman:
             "messages": message.to_dict(),
         }
         self.logger.info(f"发送消息: {data}")
-        url = f"{self.http_server}/send_group_forward_msg"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json=data)  # 使用 `json=data`
-            return r.json()
+        return await self._post("send_group_forward_msg", data)
 
     async def send_private_forward_msg(self, user_id: int, components: Union[str, list[Union[MessageComponent, str]]]):
         """
@@ -88,10 +134,7 @@ class http_mailman:
             "messages": message.to_dict(),
         }
         self.logger.info(f"发送消息: {data}")
-        url = f"{self.http_server}/send_private_forward_msg"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json=data)  # 使用 `json=data`
-            return r.json()
+        return await self._post("send_private_forward_msg", data)
 
     async def send_to_server(self, event: EventBase, message: Union[MessageChain, dict]):
         """
@@ -108,7 +151,7 @@ class http_mailman:
                     r = await self.send_group_forward_msg(event.group_id, message)
                     return r
                 else:
-                    url = f"{self.http_server}/send_group_msg"
+                    action = "send_group_msg"
             else:
                 data = {
                     "user_id": event.user_id,
@@ -118,12 +161,9 @@ class http_mailman:
                     r = await self.send_private_forward_msg(event.user_id, message)
                     return r
                 else:
-                    url = f"{self.http_server}/send_private_msg"
+                    action = "send_private_msg"
             self.logger.info(f"发送消息: {data}")
-            async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-                r = await client.post(url, json=data)  # 使用 `json=data` 代替 `data=data`
-                #print(r.json())
-                return r.json()
+            return await self._post(action, data)
         except Exception as e:
             self.logger.error(f"发送消息时出现错误: {e}", exc_info=True)
 
@@ -172,10 +212,7 @@ class http_mailman:
             "message": message.to_dict(),
         }
         self.logger.info(f"发送消息: {data}")
-        url = f"{self.http_server}/send_private_msg"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json=data)  # 使用 `json=data`
-            return r.json()
+        return await self._post("send_private_msg", data)
             #print(r.json())
 
     async def send_group_message(self, group_id: int, components: Union[str, list[Union[MessageComponent, str]]]):
@@ -202,10 +239,7 @@ class http_mailman:
             "message": message.to_dict(),
         }
         self.logger.info(f"发送消息: {data}")
-        url = f"{self.http_server}/send_group_msg"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json=data)  # 使用 `json=data`
-            return r.json()
+        return await self._post("send_group_msg", data)
             #print(r.json())
 
     """
@@ -218,10 +252,7 @@ class http_mailman:
         :param message_id:
         :return:
         """
-        url = f"{self.http_server}/delete_msg"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"message_id": message_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("delete_msg", {"message_id": message_id})
 
     async def send_like(self, user_id):
         """
@@ -229,10 +260,7 @@ class http_mailman:
         :param user_id:
         :return:
         """
-        url = f"{self.http_server}/send_like"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"user_id": user_id, "times": 10})  # 使用 `json=data`
-            return r.json()
+        return await self._post("send_like", {"user_id": user_id, "times": 10})
 
     """
     私聊相关
@@ -243,10 +271,7 @@ class http_mailman:
         获取好友列表
         :return:
         """
-        url = f"{self.http_server}/get_friend_list"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, data={"no_cache": False})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_friend_list", {"no_cache": False})
 
     async def delete_friend(self, user_id):
         """
@@ -255,10 +280,7 @@ class http_mailman:
         :return:
         """
         #删好友
-        url = f"{self.http_server}/delete_friend"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"user_id": user_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("delete_friend", {"user_id": user_id})
 
     async def handle_friend_request(self, flag: str, approve: bool, remark: str):
         """
@@ -268,10 +290,7 @@ class http_mailman:
         :param remark:
         :return:
         """
-        url = f"{self.http_server}/set_friend_add_request"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"flag": flag, "approve": approve, "remark": remark})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_friend_add_request", {"flag": flag, "approve": approve, "remark": remark})
 
     async def set_friend_remark(self, user_id: int, remark: str):
         """
@@ -280,10 +299,7 @@ class http_mailman:
         :param remark:
         :return:
         """
-        url = f"{self.http_server}/set_friend_remark"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"user_id": user_id, "remark": remark})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_friend_remark", {"user_id": user_id, "remark": remark})
 
     async def set_friend_category(self, user_id: int, category_id: int):
         """
@@ -292,10 +308,7 @@ class http_mailman:
         :param category_id:
         :return:
         """
-        url = f"{self.http_server}/set_friend_category"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"user_id": user_id, "category_id": category_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_friend_category", {"user_id": user_id, "category_id": category_id})
 
     async def get_stranger_info(self, user_id: int):
         """
@@ -303,10 +316,7 @@ class http_mailman:
         :param user_id:
         :return:
         """
-        url = f"{self.http_server}/get_stranger_info"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"user_id": user_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_stranger_info", {"user_id": user_id})
 
     async def set_qq_avatar(self, file: str):
         """
@@ -314,16 +324,10 @@ class http_mailman:
         :param file:
         :return:
         """
-        url = f"{self.http_server}/set_qq_avatar"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"file": file})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_qq_avatar", {"file": file})
 
     async def friend_poke(self, user_id: int):
-        url = f"{self.http_server}/friend_poke"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"user_id": user_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("friend_poke", {"user_id": user_id})
 
     async def upload_private_file(self, user_id: int, file: str, name: str):
         """
@@ -339,10 +343,7 @@ class http_mailman:
         :param name:
         :return:
         """
-        url = f"{self.http_server}/upload_private_file"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"user_id": user_id, "file": file, "name": name})  # 使用 `json=data`
-            return r.json()
+        return await self._post("upload_private_file", {"user_id": user_id, "file": file, "name": name})
 
     """
     群聊相关
@@ -353,10 +354,7 @@ class http_mailman:
         获取群列表
         :return:
         """
-        url = f"{self.http_server}/get_group_list"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"no_cache": False})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_list", {"no_cache": False})
 
     async def get_group_info(self, group_id: int):
         """
@@ -364,10 +362,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/get_group_info"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_info", {"group_id": group_id})
 
     async def get_group_member_list(self, group_id: int):
         """
@@ -375,10 +370,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/get_group_member_list"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "no_cache": True})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_member_list", {"group_id": group_id, "no_cache": True})
 
     async def get_group_member_info(self, group_id: int, user_id: int):
         """
@@ -387,10 +379,7 @@ class http_mailman:
         :param user_id:
         :return:
         """
-        url = f"{self.http_server}/get_group_member_info"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "user_id": user_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_member_info", {"group_id": group_id, "user_id": user_id})
 
     async def group_poke(self, group_id: int, user_id: int):
         """
@@ -399,10 +388,7 @@ class http_mailman:
         :param user_id:
         :return:
         """
-        url = f"{self.http_server}/group_poke"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "user_id": user_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("group_poke", {"group_id": group_id, "user_id": user_id})
 
     async def set_group_add_request(self, flag: str, approve: bool, reason: str):
         """
@@ -412,10 +398,7 @@ class http_mailman:
         :param reason:
         :return:
         """
-        url = f"{self.http_server}/set_group_add_request"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"flag": flag, "approve": approve, "reason": reason})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_add_request", {"flag": flag, "approve": approve, "reason": reason})
 
     async def quit(self, group_id: int):
         """
@@ -423,10 +406,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/set_group_leave"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_leave", {"group_id": group_id})
 
     async def set_group_admin(self, group_id: int, user_id: int, enable: bool):
         """
@@ -436,11 +416,7 @@ class http_mailman:
         :param enable: 设置/取消
         :return:
         """
-        url = f"{self.http_server}/set_group_admin"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url,
-                                  json={"group_id": group_id, "user_id": user_id, "enable": enable})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_admin", {"group_id": group_id, "user_id": user_id, "enable": enable})
 
     async def set_group_card(self, group_id: int, user_id: int, card: str):
         """
@@ -450,10 +426,7 @@ class http_mailman:
         :param card:
         :return:
         """
-        url = f"{self.http_server}/set_group_card"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "user_id": user_id, "card": card})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_card", {"group_id": group_id, "user_id": user_id, "card": card})
 
     async def mute(self, group_id: int, user_id: int, duration: int):
         """
@@ -463,11 +436,7 @@ class http_mailman:
         :param duration: 秒，0为解除禁言
         :return:
         """
-        url = f"{self.http_server}/set_group_ban"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "user_id": user_id,
-                                             "duration": duration})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_ban", {"group_id": group_id, "user_id": user_id, "duration": duration})
 
     async def set_group_whole_ban(self, group_id: int, enable: bool):
         """
@@ -476,10 +445,7 @@ class http_mailman:
         :param enable:
         :return:
         """
-        url = f"{self.http_server}/set_group_whole_ban"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "enable": enable})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_whole_ban", {"group_id": group_id, "enable": enable})
 
     async def set_group_name(self, group_id: int, group_name: str):
         """
@@ -488,10 +454,7 @@ class http_mailman:
         :param group_name:
         :return:
         """
-        url = f"{self.http_server}/set_group_name"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "group_name": group_name})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_name", {"group_id": group_id, "group_name": group_name})
 
     async def set_group_special_title(self, group_id: int, user_id: int, special_title: str):
         """
@@ -501,11 +464,7 @@ class http_mailman:
         :param special_title:
         :return:
         """
-        url = f"{self.http_server}/set_group_special_title"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "user_id": user_id,
-                                             "special_title": special_title})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_special_title", {"group_id": group_id, "user_id": user_id, "special_title": special_title})
 
     async def set_group_kick(self, group_id: int, user_id: int, reject_add_request: bool = True):
         """
@@ -515,11 +474,7 @@ class http_mailman:
         :param reject_add_request:
         :return:
         """
-        url = f"{self.http_server}/set_group_kick"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "user_id": user_id,
-                                             "reject_add_request": reject_add_request})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_group_kick", {"group_id": group_id, "user_id": user_id, "reject_add_request": reject_add_request})
 
     async def get_group_honor_info(self, group_id: int):
         """
@@ -527,10 +482,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/get_group_honor_info"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_honor_info", {"group_id": group_id})
 
     async def get_essence_msg_list(self, group_id: int):
         """
@@ -538,10 +490,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/get_essence_msg_list"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_essence_msg_list", {"group_id": group_id})
 
     async def set_essence_msg(self, message_id: int):
         """
@@ -549,10 +498,7 @@ class http_mailman:
         :param message_id:
         :return:
         """
-        url = f"{self.http_server}/set_essence_msg"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"message_id": message_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("set_essence_msg", {"message_id": message_id})
 
     async def delete_essence_msg(self, message_id: int):
         """
@@ -560,10 +506,7 @@ class http_mailman:
         :param message_id:
         :return:
         """
-        url = f"{self.http_server}/delete_essence_msg"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"message_id": message_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("delete_essence_msg", {"message_id": message_id})
 
     async def get_group_root_files(self, group_id: int):
         """
@@ -571,10 +514,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/get_group_root_files"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_root_files", {"group_id": group_id})
 
     async def upload_group_file(self, group_id: int, file: str, name: str):
         """
@@ -584,10 +524,7 @@ class http_mailman:
         :param name:
         :return:
         """
-        url = f"{self.http_server}/upload_group_file"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "file": file, "name": name})  # 使用 `json=data`
-            return r.json()
+        return await self._post("upload_group_file", {"group_id": group_id, "file": file, "name": name})
 
     async def delete_group_file(self, group_id: int, file_id: str):
         """
@@ -596,10 +533,7 @@ class http_mailman:
         :param file_id:
         :return:
         """
-        url = f"{self.http_server}/delete_group_file"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "file_id": file_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("delete_group_file", {"group_id": group_id, "file_id": file_id})
 
     async def create_group_file_folder(self, group_id: int, name: str):
         """
@@ -608,10 +542,7 @@ class http_mailman:
         :param name:
         :return:
         """
-        url = f"{self.http_server}/create_group_file_folder"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "name": name})  # 使用 `json=data`
-            return r.json()
+        return await self._post("create_group_file_folder", {"group_id": group_id, "name": name})
 
     async def delete_group_folder(self, group_id: int, folder_id: str):
         """
@@ -620,10 +551,7 @@ class http_mailman:
         :param folder_id:
         :return:
         """
-        url = f"{self.http_server}/delete_group_folder"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id, "folder_id": folder_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("delete_group_folder", {"group_id": group_id, "folder_id": folder_id})
 
     async def get_group_file_url(self, file_id: str):
         """
@@ -631,10 +559,7 @@ class http_mailman:
         :param file_id:
         :return:
         """
-        url = f"{self.http_server}/get_group_file_url"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"file_id": file_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_file_url", {"file_id": file_id})
 
     async def _send_group_notice(self, group_id: int, content: str, image: str):
         """
@@ -644,11 +569,7 @@ class http_mailman:
         :param image:  支持http://, file://, base64://
         :return:
         """
-        url = f"{self.http_server}/_send_group_notice"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url,
-                                  json={"group_id": group_id, "content": content, "image": image})  # 使用 `json=data`
-            return r.json()
+        return await self._post("_send_group_notice", {"group_id": group_id, "content": content, "image": image})
 
     async def _get_group_notice(self, group_id: int):
         """
@@ -656,10 +577,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/_get_group_notice"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("_get_group_notice", {"group_id": group_id})
 
     async def get_group_ignore_add_request(self, group_id: int):
         """
@@ -667,10 +585,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/get_group_ignore_add_request"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_group_ignore_add_request", {"group_id": group_id})
 
     async def send_group_sign(self, group_id: int):
         """
@@ -678,10 +593,7 @@ class http_mailman:
         :param group_id:
         :return:
         """
-        url = f"{self.http_server}/send_group_sign"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"group_id": group_id})  # 使用 `json=data`
-            return r.json()
+        return await self._post("send_group_sign", {"group_id": group_id})
 
     def get_login_info(self):
         """
@@ -694,14 +606,63 @@ class http_mailman:
         self.nickname = r.json()["data"]["nickname"]
 
     async def get_record(self, file: str, out_format="mp3"):
-        url = f"{self.http_server}/get_record"
-        async with httpx.AsyncClient(headers=self.headers, timeout=200) as client:
-            r = await client.post(url, json={"file": file, "out_format": out_format})  # 使用 `json=data`
-            return r.json()
+        return await self._post("get_record", {"file": file, "out_format": out_format})
 
     async def get_video(self, url: str, path: str):
+        # 外部下载地址，不携带协议端的鉴权头，也不占用协议端的连接池
         async with httpx.AsyncClient(timeout=200) as client:
             r = await client.get(url)
             with open(path, "wb") as f:
                 f.write(r.content)
             return path
+
+
+# 基准：本地模拟协议端，对比每次新建客户端与复用连接池的调用耗时
+# 在仓库根目录运行：python -m developTools.interface.http_sendMes
+if __name__ == "__main__":
+    import time
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        body = b'{"status": "ok", "retcode": 0, "data": null}'
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _bench():
+        server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+        number = 500
+        data = {"group_id": 879886836, "message": [{"type": "text", "data": {"text": "你好"}}]}
+
+        start = time.perf_counter()
+        for _ in range(number):
+            async with httpx.AsyncClient(timeout=200) as client:
+                (await client.post(f"{url}/send_group_msg", json=data)).json()
+        per_call = time.perf_counter() - start
+
+        mailman = await asyncio.to_thread(http_mailman, url, "bench")
+        start = time.perf_counter()
+        for _ in range(number):
+            await mailman._post("send_group_msg", data)
+        pooled = time.perf_counter() - start
+        await mailman.close()
+
+        server.close()
+        await server.wait_closed()
+        print(f"每次新建客户端: {number / per_call:.0f} 次/秒")
+        print(f"复用连接池: {number / pooled:.0f} 次/秒")
+
+    asyncio.run(_bench())
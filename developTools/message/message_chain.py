@@ -109,4 +109,38 @@ class MessageChain(list):
         if self.has(Text) and not self.has(At):
             return self.get(Text)[0].text.strip()
         else:
-            return ""
\ No newline at end of file
+            return ""
+
+    @classmethod
+    def fetch_text_from_dicts(cls, messages: List[Dict[str, Any]]) -> str:
+        """
+        与 fetch_text 结果一致，但直接读取原始消息段字典，不构建消息组件。
+        未知类型的消息段在解析时会被转为 Text，这里同样视为文本。
+        """
+        text = None
+        for msg in messages:
+            if not isinstance(msg, dict):
+                continue
+            msg_type = msg.get("type")
+            if msg_type == "at":
+                return ""
+            if text is None:
+                if msg_type == "text":
+                    text = msg.get("data", {}).get("text")
+                elif msg_type not in cls._type_map:
+                    text = str(msg)
+        return text.strip() if isinstance(text, str) else ""
+
+# 基准：统计每秒可序列化的消息链数量
+# 在仓库根目录运行：python -m developTools.message.message_chain
+if __name__ == "__main__":
+    import timeit
+
+    text_chain = MessageChain([Text("你好"), At(qq=1840094972), Image(file="https://example.com/a.jpg")])
+    forward_chain = MessageChain([
+        Node(content=[Text(f"第{i}条"), Image(file="https://example.com/a.jpg")]) for i in range(30)
+    ])
+    for name, chain in (("普通消息链", text_chain), ("30节点合并转发", forward_chain)):
+        number = 2000
+        cost = timeit.timeit(chain.to_dict, number=number)
+        print(f"{name}: {number / cost:.0f} 条/秒")
@@ -22,19 +22,45 @@ class MessageComponent(BaseModel, ABC):
 
     @model_serializer
     def to_dict(self, *args, **kwargs) -> dict[str, Any]:
-        data = {}
-        for k, v in self:
-            if k in [ "comp_type"]:
-                continue
-
-            field_info = self.model_fields[k]
-            # 检查 OnlySend 是否在元数据中
-            if any(arg is OnlySend for arg in field_info.metadata):
-                continue
-
-            data[k] = TypeAdapter(type(v)).dump_python(v, mode="json")
-
-        return {"type": self.comp_type, "data": data}
+        return {"type": self.comp_type, "data": {k: _dump_value(getattr(self, k)) for k in _serializable_fields(type(self))}}
+
+
+# 每个组件类需要序列化的字段只计算一次，避免每次发送都检查字段元数据
+_fields_cache: dict[type, tuple[str, ...]] = {}
+# 非常见类型的值才会用到 TypeAdapter，按类型缓存
+_type_adapter_cache: dict[type, TypeAdapter] = {}
+
+
+def _serializable_fields(cls: type) -> tuple[str, ...]:
+    fields = _fields_cache.get(cls)
+    if fields is None:
+        fields = tuple(
+            k for k, field_info in cls.model_fields.items()
+            if k != "comp_type" and not any(arg is OnlySend for arg in field_info.metadata)  # 跳过 OnlySend 字段
+        )
+        _fields_cache[cls] = fields
+    return fields
+
+
+def _dump_value(v: Any) -> Any:
+    if v is None or type(v) in (str, int, float, bool):
+        return v
+    if isinstance(v, str):  # 配置文件读出的 ScalarString 等子类
+        return str(v)
+    if isinstance(v, int):
+        return int(v)
+    if isinstance(v, float):
+        return float(v)
+    if isinstance(v, MessageComponent):
+        return v.to_dict()
+    if isinstance(v, (list, tuple)):
+        # 合并转发节点的 content 是组件列表，递归序列化，不经过 TypeAdapter
+        return [_dump_value(item) for item in v]
+    adapter = _type_adapter_cache.get(type(v))
+    if adapter is None:
+        adapter = TypeAdapter(type(v))
+        _type_adapter_cache[type(v)] = adapter
+    return adapter.dump_python(v, mode="json")
 
 class File(MessageComponent):
     comp_type: str = "file"
@@ -1,56 +1,86 @@
 import re
-import html
 from typing import List, Dict, Union
 
+_CQ_HEAD = "[CQ:"
+_cq_type_pattern = re.compile(r"\w+")
+_unescape_pattern = re.compile(r"&(?:amp|#91|#93|#44);")
+_unescape_map = {"&amp;": "&", "&#91;": "[", "&#93;": "]", "&#44;": ","}
+
+
 # 定义通用解析 CQ 码的函数
 def parse_message_with_cq_codes_to_list(message: str) -> List[Dict[str, Union[str, Dict]]]:
-    cq_pattern = r'\[CQ:(\w+),(.*?)\]'
-    parsed_result = []
-    last_end = 0
+    """
+    单次扫描解析 CQ 码字符串。
+    文本段为 {"text": 文本}，CQ 码段为 {类型: {参数..., "type": 类型}}。
+    CQ 码内部的 ] 和 , 必然被转义，因此遇到的第一个 ] 就是 CQ 码结尾。
+    """
+    result = []
+    length = len(message)
+    text_start = 0  # 尚未输出的文本起点
+    pos = 0
+    while pos < length:
+        start = message.find(_CQ_HEAD, pos)
+        if start == -1:
+            break
+        end = message.find("]", start)
+        if end == -1:
+            break
+        cq_type, _, cq_params = message[start + 4:end].partition(",")
+        if not _cq_type_pattern.fullmatch(cq_type):
+            # 不是合法的 CQ 码，作为普通文本保留
+            pos = start + 1
+            continue
 
-    for match in re.finditer(cq_pattern, message):
-        start, end = match.span()
-        cq_type = match.group(1)
-        cq_params = match.group(2)
-        params = dict(param.split('=', 1) for param in cq_params.split(',') if '=' in param)
+        params = {}
+        if cq_params:
+            for param in cq_params.split(","):
+                key, sep, value = param.partition("=")
+                if sep:
+                    params[key] = unescape_cq_value(value)
+        params["type"] = cq_type
 
+        if start > text_start:
+            result.append({"text": unescape_cq_value(message[text_start:start])})
+        result.append({cq_type: params})
+        pos = text_start = end + 1
 
-        for key, value in params.items():
-            params[key] = unescape_cq_value(value)
+    if text_start < length:
+        result.append({"text": unescape_cq_value(message[text_start:])})
+    return result
 
-        if start > last_end:
-            parsed_result.append({
-                "type": "text",
-                "text": unescape_cq_value(message[last_end:start])
-            })
 
-        params["type"] = cq_type
+def unescape_cq_value(text: str) -> str:
+    """反转义 CQ 码中的 &, [, ] 和 ,"""
+    if "&" not in text:
+        return text
+    return _unescape_pattern.sub(lambda m: _unescape_map[m.group()], text)
 
-        parsed_result.append(params)
-        last_end = end
 
-    if last_end < len(message):
-        parsed_result.append({
-            "type": "text",
-            "text": unescape_cq_value(message[last_end:])
-        })
+def escape_cq_text(text: str) -> str:
+    """转义 CQ 码外的纯文本"""
+    return text.replace("&", "&amp;").replace("[", "&#91;").replace("]", "&#93;")
 
-    result = []
-    for item in parsed_result:
-        if item['type'] == "text":
-            result.append({"text": item["text"]})
-        else:
-            cq_type = item['type']
-            result.append({cq_type: item})
 
-    return result
+def escape_cq_value(value: str) -> str:
+    """转义 CQ 码参数值"""
+    return escape_cq_text(value).replace(",", "&#44;")
+
+
+def processed_message_to_cq_codes(processed_message: List[Dict[str, Union[str, Dict]]]) -> str:
+    """
+    parse_message_with_cq_codes_to_list 的逆过程，把消息段列表序列化回 CQ 码字符串。
+    """
+    parts = []
+    for item in processed_message:
+        if "text" in item and isinstance(item["text"], str):
+            parts.append(escape_cq_text(item["text"]))
+            continue
+        for cq_type, params in item.items():
+            args = "".join(f",{key}={escape_cq_value(str(value))}" for key, value in params.items() if key != "type")
+            parts.append(f"[CQ:{cq_type}{args}]")
+    return "".join(parts)
+
 
-def unescape_cq_value(text: str) -> str:
-    """反转义 CQ 码中的 &, [, ] 和 ,"""
-    text = text.replace("[", "[")
-    text = text.replace("]", "]")
-    text = text.replace(",", ",")
-    return html.unescape(text)
 def parse_message_2processed_message(message: dict) -> List[Dict[str, Union[str, Dict]]]:
     result = []
     for item in message:
@@ -59,4 +89,50 @@ def parse_message_2processed_message(message: dict) -> List[Dict[str, Union[str,
             result.append({"text": item["data"]["text"]})
         else:
             result.append({type: item["data"]})
-    return result
\ No newline at end of file
+    return result
+
+
+# 往返测试语料 + 吞吐基准
+# 在仓库根目录运行：python -m developTools.utils.cq_code_handler
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    corpus = [
+        "",
+        "纯文本",
+        "[CQ:at,qq=1840094972] 你好",
+        "[CQ:reply,id=123][CQ:image,file=a.jpg,url=https://x.com/a?b=1&amp;c=2]看图",
+        "转义 &amp; &#91;不是CQ码&#93; 逗号,保留",
+        "[CQ:face,id=14][CQ:face,id=15]",
+        "[CQ:shake]",
+        "[CQ:json,data={\"app\":\"com.tencent\"&#44;\"k\":&#91;1&#44;2&#93;}]",
+        "[CQ 不是CQ码] [CQ:] 末尾[CQ:at,qq=all]",
+    ]
+    alphabet = ["a", "中", " ", "&", "[", "]", ",", "=", "&amp;", "&#91;", "&#93;", "&#44;"]
+    rng = random.Random(10571)
+    for _ in range(500):
+        segments = []
+        for _ in range(rng.randint(1, 6)):
+            if rng.random() < 0.5:
+                segments.append({"text": "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 8)))})
+            else:
+                value = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+                segments.append({"image": {"file": value, "url": "https://x.com/" + value, "type": "image"}})
+        merged = []
+        for segment in segments:  # 相邻文本段序列化后会合并
+            if merged and "text" in segment and "text" in merged[-1]:
+                merged[-1] = {"text": merged[-1]["text"] + segment["text"]}
+            else:
+                merged.append(segment)
+        encoded = processed_message_to_cq_codes(merged)
+        assert parse_message_with_cq_codes_to_list(encoded) == merged, (merged, encoded)
+    for message in corpus:
+        parsed = parse_message_with_cq_codes_to_list(message)
+        assert parse_message_with_cq_codes_to_list(processed_message_to_cq_codes(parsed)) == parsed, message
+    print("往返测试通过")
+
+    long_message = "".join(f"[CQ:at,qq={i}]第{i}张图[CQ:image,file={i}.jpg,url=https://x.com/{i}.jpg?a=1&amp;b=2]" for i in range(200))
+    number = 200
+    cost = timeit.timeit(lambda: parse_message_with_cq_codes_to_list(long_message), number=number)
+    print(f"{len(long_message)} 字符的转发消息: {number / cost:.0f} 条/秒")
@@ -0,0 +1,28 @@
+import json
+from typing import Any, Union
+
+# 可选依赖：安装了 orjson 时使用 orjson 解析/序列化，否则回退到标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+backend = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """序列化为 str（websocket 文本帧）。orjson 无法处理的对象（如超过 64 位的整数）回退到标准库。"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False)
@@ -0,0 +1,25 @@
+import re
+from typing import Union
+
+# 帧预分类：在不解析 JSON 的情况下识别心跳帧。
+# 键名前必须是 { 或 , ，因此消息文本中被转义的 \"meta_event_type\" 不会误判。
+HEARTBEAT_MAX_SIZE = 2048  # 心跳帧通常只有两三百字节，更大的帧直接走完整解析
+
+FRAME_HEARTBEAT = "heartbeat"
+FRAME_OTHER = "other"
+
+_heartbeat_pattern_str = re.compile(r'[{,]\s*"meta_event_type"\s*:\s*"heartbeat"')
+_heartbeat_pattern_bytes = re.compile(rb'[{,]\s*"meta_event_type"\s*:\s*"heartbeat"')
+
+
+def classify_frame(frame: Union[str, bytes]) -> str:
+    """
+    对原始帧做廉价分类。
+    :return: FRAME_HEARTBEAT 或 FRAME_OTHER
+    """
+    if len(frame) > HEARTBEAT_MAX_SIZE:
+        return FRAME_OTHER
+    pattern = _heartbeat_pattern_str if isinstance(frame, str) else _heartbeat_pattern_bytes
+    if pattern.search(frame):
+        return FRAME_HEARTBEAT
+    return FRAME_OTHER
@@ -1,18 +1,25 @@
 import asyncio
 import datetime
-import json
 import os
-import pickle
 import platform
 import subprocess
 import time
+import zipfile
 
-import aiosqlite
 import redis
 
 from developTools.utils.logger import get_logger
+from framework_common.database_util import db_pool, migrations
+from framework_common.database_util.cache import MISSING, TwoTierCache
 
 dbpath = "data/dataBase/user_management.db"
+# get_user 的查询，签到日期从 sign_ins 表按主键顺序聚合为 JSON 列表
+USER_SELECT = """
+SELECT users.*, (SELECT json_group_array(date) FROM sign_ins WHERE sign_ins.user_id = users.user_id) AS sign_in_dates
+FROM users WHERE user_id = ?
+"""
+# 按 sign_ins 重新统计累计签到天数，用于（重新）创建用户行
+SIGN_IN_COUNT = "SELECT COUNT(*) FROM sign_ins WHERE user_id = ?"
 def is_running_in_docker():
     return os.path.exists("/.dockerenv") or os.environ.get("IN_DOCKER") == "1"
 
@@ -26,12 +33,24 @@ REDIS_ZIP_PATH = os.path.join("data", "Redis-x64-5.0.14.1.zip")
 REDIS_FOLDER = os.path.join("data", "redis_extracted")
 
 logger = get_logger()
-redis_client = None
+# 进程内 LRU + Redis 两级缓存，缓存的是用户字段组成的 dict
+user_cache = TwoTierCache("user", REDIS_URL, maxsize=4096, local_ttl=30, redis_ttl=REDIS_CACHE_TTL)
 
 
 
+def extract_redis_from_local_zip():
+    """从本地 zip 解压 Redis 到指定目录"""
+    if not os.path.exists(REDIS_FOLDER) and os.path.exists(REDIS_ZIP_PATH):
+        os.makedirs(REDIS_FOLDER)
+        logger.info("📦 正在从本地压缩包解压 Redis...")
+        with zipfile.ZipFile(REDIS_ZIP_PATH, 'r') as zip_ref:
+            zip_ref.extractall(REDIS_FOLDER)
+        logger.info("✅ Redis 解压完成")
+
+
 def start_redis_background():
     """在后台启动 Redis（仅支持 Windows）"""
+    extract_redis_from_local_zip()
     redis_path = os.path.join(REDIS_FOLDER, REDIS_EXECUTABLE)
     if not os.path.exists(redis_path):
         logger.error(f"❌ 找不到 redis-server.exe 于 {redis_path}")
@@ -41,12 +60,12 @@ def start_redis_background():
     subprocess.Popen([redis_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 def init_redis():
-    global redis_client
-    if redis_client is not None:
-        return
+    """
+    启动时检查一次 Redis，Windows 下未运行则尝试自动启动。
+    Redis 不可用时用户缓存只使用进程内缓存，user_cache 会定期重试连接。
+    """
     try:
-        redis_client = redis.StrictRedis.from_url(REDIS_URL)
-        redis_client.ping()
+        redis.StrictRedis.from_url(REDIS_URL, socket_connect_timeout=1).ping()
         logger.info("✅ Redis 连接成功（数据库 db1）")
     except redis.exceptions.ConnectionError:
         logger.warning("⚠️ Redis 未运行，尝试自动启动 Redis...")
@@ -54,43 +73,16 @@ def init_redis():
             start_redis_background()
             time.sleep(2)
             try:
-                redis_client = redis.StrictRedis.from_url(REDIS_URL)
-                redis_client.ping()
+                redis.StrictRedis.from_url(REDIS_URL, socket_connect_timeout=1).ping()
                 logger.info("✅ Redis 已自动启动并连接成功（数据库 db1）")
             except Exception as e:
-                logger.error(f"❌ Redis 启动失败：{e}")
-                redis_client = None
+                logger.error(f"❌ Redis 启动失败：{e}，用户缓存仅使用进程内缓存")
         else:
-            logger.error("❌ 非 Windows 系统，请手动安装并启动 Redis")
-            redis_client = None
+            logger.warning("⚠️ 非 Windows 系统，请手动安装并启动 Redis，在此之前用户缓存仅使用进程内缓存")
 
-# 初始化数据库，新增注册时间字段
+# 初始化数据库，表结构的变更见 migrations.USER_MIGRATIONS
 async def initialize_db():
-    async with aiosqlite.connect(dbpath) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            nickname TEXT,
-            card TEXT,
-            sex TEXT DEFAULT '0',
-            age INTEGER DEFAULT 0,
-            city TEXT DEFAULT '通辽',
-            permission INTEGER DEFAULT 0,
-            signed_days TEXT,
-            registration_date TEXT,
-            ai_token_record INTEGER DEFAULT 0,
-            user_portrait TEXT DEFAULT '',
-            portrait_update_time TEXT DEFAULT ''
-        )
-        """)
-        async with db.execute("PRAGMA table_info(users);") as cursor:
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            if 'user_portrait' not in column_names:
-                await db.execute("ALTER TABLE users ADD COLUMN user_portrait TEXT DEFAULT '';")
-            if 'portrait_update_time' not in column_names:
-                await db.execute("ALTER TABLE users ADD COLUMN portrait_update_time TEXT DEFAULT '';")
-        await db.commit()
+    await migrations.migrate(dbpath, migrations.USER_MIGRATIONS)
 
 
 # User 类
@@ -119,7 +111,7 @@ class User:
 
 
 async def add_user(user_id, nickname, card, sex="0", age=0, city="通辽", permission=0, ai_token_record=0):
-    async with aiosqlite.connect(dbpath) as db:
+    async with db_pool.writer(dbpath) as db:
         async with db.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)) as cursor:
             if await cursor.fetchone():
                 return f"✅ 用户 {user_id} 已存在，无法重复注册。"
@@ -129,14 +121,13 @@ async def add_user(user_id, nickname, card, sex="0", age=0, city="通辽", permi
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (user_id, nickname, card, sex, age, city, permission, "[]", registration_date, ai_token_record))
         await db.commit()
-        # 清除缓存
-        if redis_client:
-            redis_client.delete(f"user:{user_id}")
-        return f"✅ 用户 {user_id} 注册成功。"
+    # 清除缓存
+    await user_cache.delete(user_id)
+    return f"✅ 用户 {user_id} 注册成功。"
 
 # 更新用户信息
 async def update_user(user_id, **kwargs):
-    async with aiosqlite.connect(dbpath) as db:
+    async with db_pool.writer(dbpath) as db:
         for key, value in kwargs.items():
             if key in ["nickname", "card", "sex", "age", "city", "permission", 'ai_token_record', 'user_portrait','portrait_update_time']:
                 await db.execute(f"UPDATE users SET {key} = ? WHERE user_id = ?", (value, user_id))
@@ -145,22 +136,17 @@ async def update_user(user_id, **kwargs):
         await db.commit()
 
     # 清除缓存
-    if redis_client:
-        redis_client.delete(f"user:{user_id}")
+    await user_cache.delete(user_id)
     logger.info(f"✅ 用户 {user_id} 的信息已更新：{kwargs}")
     return f"✅ 用户 {user_id} 的信息已更新：{kwargs}"
 
 
 async def get_user(user_id, nickname="") -> User:
     try:
-        init_redis()
-        cache_key = f"user:{user_id}"
-        # 检查 Redis 缓存
-        if redis_client:
-            cached_user = redis_client.get(cache_key)
-            if cached_user:
-                #logger.info(f"缓存命中用户 {user_id}")
-                return pickle.loads(cached_user)
+        # 检查缓存
+        cached_user = await user_cache.get(user_id)
+        if cached_user is not MISSING:
+            return User(**cached_user)
 
         default_user = {
             "user_id": user_id,
@@ -176,128 +162,147 @@ async def get_user(user_id, nickname="") -> User:
             "user_portrait": "",
             "portrait_update_time": ""
         }
-        async with aiosqlite.connect(dbpath) as db:
-            async with db.execute("PRAGMA table_info(users);") as cursor:
-                columns = await cursor.fetchall()
-                column_names = [col[1] for col in columns]
-                for key in default_user.keys():
-                    if key not in column_names:
-                        await db.execute(f"ALTER TABLE users ADD COLUMN {key} TEXT DEFAULT '';")
-                        await db.commit()
-                        logger.info(f"列 {key} 已成功添加至 'users' 表中。")
-
-            async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
+        async with db_pool.reader(dbpath) as db:
+            async with db.execute(USER_SELECT, (user_id,)) as cursor:
                 result = await cursor.fetchone()
-                if result:
-                    column_names = [description[0] for description in cursor.description]
-                    existing_user = dict(zip(column_names, result))
-                    missing_keys = [key for key in default_user if key not in existing_user]
-                    if missing_keys:
-                        for key in missing_keys:
-                            existing_user[key] = default_user[key]
-                        update_query = f"UPDATE users SET {', '.join(f'{key} = ?' for key in missing_keys)} WHERE user_id = ?"
-                        update_values = [existing_user[key] for key in missing_keys] + [user_id]
-                        await db.execute(update_query, update_values)
-                        await db.commit()
-                    user_obj = User(
-                        existing_user['user_id'],
-                        existing_user['nickname'],
-                        existing_user['card'],
-                        existing_user['sex'],
-                        existing_user['age'],
-                        existing_user['city'],
-                        existing_user['permission'],
-                        existing_user['signed_days'],
-                        existing_user['registration_date'],
-                        existing_user['ai_token_record'],
-                        existing_user.get('user_portrait', ""),
-                        existing_user.get('portrait_update_time', "")  # 修复：获取数据库中的 portrait_update_time
-                    )
-                    # 存储到 Redis 缓存
-                    if redis_client:
-                        redis_client.setex(cache_key, REDIS_CACHE_TTL, pickle.dumps(user_obj))
-                    return user_obj
-
-            await db.execute("""
-            INSERT INTO users (user_id, nickname, card, sex, age, city, permission, signed_days, registration_date, ai_token_record, user_portrait, portrait_update_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                column_names = [description[0] for description in cursor.description]
+
+        if result:
+            existing_user = dict(zip(column_names, result))
+            existing_user['signed_days'] = existing_user.pop('sign_in_dates')
+            user_obj = User(
+                existing_user['user_id'],
+                existing_user['nickname'],
+                existing_user['card'],
+                existing_user['sex'],
+                existing_user['age'],
+                existing_user['city'],
+                existing_user['permission'],
+                existing_user['signed_days'],
+                existing_user['registration_date'],
+                existing_user['ai_token_record'],
+                existing_user.get('user_portrait', ""),
+                existing_user.get('portrait_update_time', "")  # 修复：获取数据库中的 portrait_update_time
+            )
+            # 存入缓存
+            await user_cache.set(user_id, dict(vars(user_obj)))
+            return user_obj
+
+        async with db_pool.writer(dbpath) as db:
+            # 并发的 get_user 可能已经插入了同一用户；出错后重建的用户保留 sign_ins 中的签到记录，累计天数按记录重新计算
+            await db.execute(f"""
+            INSERT OR IGNORE INTO users (user_id, nickname, card, sex, age, city, permission, signed_days, registration_date, ai_token_record, user_portrait, portrait_update_time, sign_in_days)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ({SIGN_IN_COUNT}))
             """, (user_id, default_user["nickname"], default_user["card"], default_user["sex"],
                   default_user["age"], default_user["city"], default_user["permission"],
                   default_user["signed_days"], default_user["registration_date"], default_user["ai_token_record"],
-                  default_user["user_portrait"], default_user["portrait_update_time"]))
+                  default_user["user_portrait"], default_user["portrait_update_time"], user_id))
             await db.commit()
-            logger.info(f"用户 {user_id} 不在数据库中，已创建默认用户。")
-            user_obj = User(
-                default_user['user_id'],
-                default_user['nickname'],
-                default_user['card'],
-                default_user['sex'],
-                default_user['age'],
-                default_user['city'],
-                default_user['permission'],
-                default_user['signed_days'],
-                default_user['registration_date'],
-                default_user['ai_token_record'],
-                default_user['user_portrait'],
-                default_user['portrait_update_time']
-            )
-            # 存储到 Redis 缓存
-            if redis_client:
-                redis_client.setex(cache_key, REDIS_CACHE_TTL, pickle.dumps(user_obj))
-            return user_obj
+        logger.info(f"用户 {user_id} 不在数据库中，已创建默认用户。")
+        user_obj = User(
+            default_user['user_id'],
+            default_user['nickname'],
+            default_user['card'],
+            default_user['sex'],
+            default_user['age'],
+            default_user['city'],
+            default_user['permission'],
+            default_user['signed_days'],
+            default_user['registration_date'],
+            default_user['ai_token_record'],
+            default_user['user_portrait'],
+            default_user['portrait_update_time']
+        )
+        # 存入缓存
+        await user_cache.set(user_id, dict(vars(user_obj)))
+        return user_obj
     except Exception as e:
         logger.error(f"获取用户 {user_id} 时出错：{e}")
-        async with aiosqlite.connect(dbpath) as db:
+        async with db_pool.writer(dbpath) as db:
             async with db.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)) as cursor:
                 if await cursor.fetchone():
                     await db.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
                     await db.commit()
         # 清除缓存
-        if redis_client:
-            redis_client.delete(f"user:{user_id}")
+        await user_cache.delete(user_id)
         return await get_user(user_id)
 
+# 签到记录保存在 sign_ins 表中，每次签到一行；users.sign_in_days 是累计签到天数，签到时同步加一
+# users.signed_days 为旧版字段，仅用于迁移，不再写入
+async def get_signed_days(user_id) -> list[str]:
+    async with db_pool.reader(dbpath) as db:
+        async with db.execute("SELECT date FROM sign_ins WHERE user_id = ? ORDER BY date", (user_id,)) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
 
-# 获取签到记录
-async def get_signed_days(user_id):
-    async with aiosqlite.connect(dbpath) as db:
-        async with db.execute("SELECT signed_days FROM users WHERE user_id = ?", (user_id,)) as cursor:
-            result = await cursor.fetchone()
-            return eval(result[0]) if result else []
 
 # 记录签到并更新缓存
 async def record_sign_in(user_id, nickname="DefaultUser", card="00000"):
-    async with aiosqlite.connect(dbpath) as db:
-        async with db.execute("SELECT signed_days FROM users WHERE user_id = ?", (user_id,)) as cursor:
-            result = await cursor.fetchone()
-            if not result:
-                registration_date = datetime.date.today().isoformat()
-                await db.execute("""
-                INSERT INTO users (user_id, nickname, card, signed_days, registration_date)
-                VALUES (?, ?, ?, ?, ?)
-                """, (user_id, nickname, card, "[]", registration_date))
-                await db.commit()
-                print(f"用户 {user_id} 不存在，已创建新用户。")
-                signed_days = []
-            else:
-                signed_days = json.loads(result[0])
+    today = datetime.date.today().isoformat()
+    async with db_pool.writer(dbpath) as db:
+        cursor = await db.execute(f"""
+        INSERT OR IGNORE INTO users (user_id, nickname, card, signed_days, registration_date, sign_in_days)
+        VALUES (?, ?, ?, ?, ?, ({SIGN_IN_COUNT}))
+        """, (user_id, nickname, card, "[]", today, user_id))
+        if cursor.rowcount:
+            logger.info(f"用户 {user_id} 不存在，已创建新用户。")
+        cursor = await db.execute("INSERT OR IGNORE INTO sign_ins (user_id, date) VALUES (?, ?)", (user_id, today))
+        signed = cursor.rowcount > 0
+        if signed:
+            await db.execute("UPDATE users SET sign_in_days = sign_in_days + 1 WHERE user_id = ?", (user_id,))
+        await db.commit()
+    if signed:
+        # 清除缓存
+        await user_cache.delete(user_id)
+        return f"用户 {user_id} 签到成功，日期：{today}"
+    else:
+        return f"用户 {user_id} 今天已经签到过了！"
 
-        today = datetime.date.today().isoformat()
-        if today not in signed_days:
-            signed_days.append(today)
-            signed_days.sort()
-            await db.execute("UPDATE users SET signed_days = ? WHERE user_id = ?", (json.dumps(signed_days), user_id))
-            await db.commit()
-            # 清除缓存
-            if redis_client:
-                redis_client.delete(f"user:{user_id}")
-            return f"用户 {user_id} 签到成功，日期：{today}"
-        else:
-            return f"用户 {user_id} 今天已经签到过了！"
+
+async def get_sign_in_total(user_id) -> int:
+    """累计签到天数"""
+    async with db_pool.reader(dbpath) as db:
+        async with db.execute("SELECT sign_in_days FROM users WHERE user_id = ?", (user_id,)) as cursor:
+            result = await cursor.fetchone()
+            return (result[0] or 0) if result else 0
+
+
+async def get_sign_in_streak(user_id, today: datetime.date | None = None) -> int:
+    """截至今天的连续签到天数，今天还没签到时从昨天算起"""
+    today = today or datetime.date.today()
+    # 连续的日期减去各自的序号得到相同的值，取最近一段连续签到
+    async with db_pool.reader(dbpath) as db:
+        async with db.execute("""
+        WITH days AS (
+            SELECT date, julianday(date) - ROW_NUMBER() OVER (ORDER BY date) AS grp
+            FROM sign_ins WHERE user_id = ? AND date <= ?
+        )
+        SELECT COUNT(*), MAX(date) FROM days WHERE grp = (SELECT grp FROM days ORDER BY date DESC LIMIT 1)
+        """, (user_id, today.isoformat())) as cursor:
+            count, last_date = await cursor.fetchone()
+    if not count or last_date < (today - datetime.timedelta(days=1)).isoformat():
+        return 0
+    return count
+
+
+async def get_daily_sign_in_counts(days: int = 30) -> dict[str, int]:
+    """最近 days 天每天的签到人数"""
+    since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+    async with db_pool.reader(dbpath) as db:
+        async with db.execute("SELECT date, COUNT(*) FROM sign_ins WHERE date >= ? GROUP BY date ORDER BY date",
+                              (since,)) as cursor:
+            return {date: count for date, count in await cursor.fetchall()}
+
+
+async def get_sign_in_ranking(limit: int = 10) -> list[tuple[int, int]]:
+    """累计签到天数排行，返回 [(user_id, 天数), ...]"""
+    async with db_pool.reader(dbpath) as db:
+        async with db.execute("SELECT user_id, sign_in_days FROM users WHERE sign_in_days > 0 "
+                              "ORDER BY sign_in_days DESC LIMIT ?", (limit,)) as cursor:
+            return [(user_id, days) for user_id, days in await cursor.fetchall()]
 
 # 查找权限高于指定值的用户
 async def get_users_with_permission_above(permission_value):
-    async with aiosqlite.connect(dbpath) as db:
+    async with db_pool.reader(dbpath) as db:
         async with db.execute("SELECT user_id FROM users WHERE permission > ?", (permission_value,)) as cursor:
             result = await cursor.fetchall()
             return [user[0] for user in result]
@@ -305,3 +310,4 @@ async def get_users_with_permission_above(permission_value):
 
 
 asyncio.run(initialize_db())
+init_redis()
@@ -0,0 +1,118 @@
+"""
+对话记录中的图片、语音等内联 base64 数据按内容哈希单独存放在 blobs 表，对话记录中只保留引用：
+
+- gemini: {"inline_data": {"mime_type": ..., "data": <base64>}} -> {"inline_data": {"mime_type": ..., "blob": <hash>}}
+- openai: {"image_url": {"url": "data:<mime>;base64,<base64>"}} -> {"image_url": {"blob_url": <hash>, "blob_mime": <mime>}}
+
+读取时再还原成原来的格式，最近用到的 base64 缓存在进程内，同一张图片不必反复查库和编码。
+表结构与引用计数触发器见 migrations.CONVERSATION_MIGRATIONS。
+"""
+
+import base64
+import binascii
+import hashlib
+import re
+from typing import Any
+
+import aiosqlite
+
+from developTools.utils.logger import get_logger
+from framework_common.database_util.cache import MISSING, TTLCache
+
+logger = get_logger()
+
+DATA_URL_PATTERN = re.compile(r"^data:([a-zA-Z0-9]+/[a-zA-Z0-9-.+]+);base64,([A-Za-z0-9+/=]+)$")
+MIN_BLOB_SIZE = 1024  # 短于此长度的内联数据不值得单独存放
+PAYLOAD_CACHE_SIZE = 32  # 单张图片的 base64 可达数 MB，只缓存最近的少量
+
+payload_cache = TTLCache(maxsize=PAYLOAD_CACHE_SIZE, ttl=3600)
+
+
+def _store(data: str, blobs: dict[str, bytes]):
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    digest = hashlib.sha256(raw).hexdigest()
+    blobs[digest] = raw
+    payload_cache.set(digest, data)
+    return digest
+
+
+def dehydrate(obj: Any, blobs: dict[str, bytes]) -> Any:
+    """返回把内联数据换成引用后的副本，取出的数据按哈希放入 blobs"""
+    if isinstance(obj, list):
+        return [dehydrate(item, blobs) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    data = obj.get("data")
+    if isinstance(data, str) and len(data) >= MIN_BLOB_SIZE and "mime_type" in obj:
+        digest = _store(data, blobs)
+        if digest:
+            return {**{k: v for k, v in obj.items() if k != "data"}, "blob": digest}
+    url = obj.get("url")
+    if isinstance(url, str) and len(url) >= MIN_BLOB_SIZE:
+        match = DATA_URL_PATTERN.match(url)
+        digest = _store(match.group(2), blobs) if match else None
+        if digest:
+            return {**{k: v for k, v in obj.items() if k != "url"}, "blob_url": digest, "blob_mime": match.group(1)}
+    return {key: dehydrate(value, blobs) for key, value in obj.items()}
+
+
+def _collect(obj: Any, refs: set[str]):
+    if isinstance(obj, list):
+        for item in obj:
+            _collect(item, refs)
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in ("blob", "blob_url"):
+                refs.add(value)
+            else:
+                _collect(value, refs)
+
+
+def _fill(obj: Any, payloads: dict[str, str]) -> Any:
+    if isinstance(obj, list):
+        return [_fill(item, payloads) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    if "blob" in obj:
+        return {**{k: v for k, v in obj.items() if k != "blob"}, "data": payloads.get(obj["blob"], "")}
+    if "blob_url" in obj:
+        rest = {k: v for k, v in obj.items() if k not in ("blob_url", "blob_mime")}
+        return {**rest, "url": f"data:{obj['blob_mime']};base64,{payloads.get(obj['blob_url'], '')}"}
+    return {key: _fill(value, payloads) for key, value in obj.items()}
+
+
+async def rehydrate(db: aiosqlite.Connection, messages: list) -> list:
+    """把引用还原为内联 base64，缓存未命中的从 blobs 表读取"""
+    refs: set[str] = set()
+    _collect(messages, refs)
+    if not refs:
+        return messages
+    payloads = {}
+    missing = []
+    for digest in refs:
+        payload = payload_cache.get(digest)
+        if payload is MISSING:
+            missing.append(digest)
+        else:
+            payloads[digest] = payload
+    if missing:
+        cursor = await db.execute(f"SELECT hash, data FROM blobs WHERE hash IN ({', '.join('?' for _ in missing)})", missing)
+        for digest, raw in await cursor.fetchall():
+            payloads[digest] = base64.b64encode(raw).decode("ascii")
+            payload_cache.set(digest, payloads[digest])
+        lost = refs - payloads.keys()
+        if lost:
+            logger.warning(f"对话记录引用的 {len(lost)} 个媒体数据已不存在")
+    return _fill(messages, payloads)
+
+
+async def save_blobs(db: aiosqlite.Connection, user_id: int, seq: int, blobs: dict[str, bytes]):
+    """写入一条对话记录引用的数据，已存在的相同内容只记录引用"""
+    if not blobs:
+        return
+    await db.executemany("INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)", blobs.items())
+    await db.executemany("INSERT OR IGNORE INTO turn_blobs (user_id, seq, hash) VALUES (?, ?, ?)",
+                         [(user_id, seq, digest) for digest in blobs])
@@ -0,0 +1,189 @@
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from developTools.utils import fast_json
+from developTools.utils.logger import get_logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # 未安装 redis 时只使用进程内缓存
+    aioredis = None
+
+logger = get_logger()
+
+MISSING = object()
+
+
+class TTLCache:
+    """进程内的 LRU 缓存，条目超过 ttl 秒后失效"""
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+        expire_at, value = item
+        if expire_at < time.monotonic():
+            self._data.pop(key, None)
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# 所有 TwoTierCache，退出时由 close_all 关闭各自的 Redis 客户端
+_two_tier_caches: "weakref.WeakSet[TwoTierCache]" = weakref.WeakSet()
+
+
+class TwoTierCache:
+    """
+    两级缓存：进程内 TTLCache 在前，Redis 在后（可选）。
+
+    - 值以 JSON 存入 Redis，只缓存 dict/list 等可序列化的数据，不使用 pickle
+    - Redis 不可用时自动降级为只用进程内缓存，retry_interval 秒后再尝试连接
+    - 写入数据库后调用 delete 让两级缓存同时失效
+    """
+
+    def __init__(self, namespace: str, redis_url: Optional[str] = None, maxsize: int = 4096,
+                 local_ttl: float = 30, redis_ttl: int = 60, retry_interval: float = 60,
+                 encode: Callable[[Any], str] = fast_json.dumps, decode: Callable[[Any], Any] = fast_json.loads):
+        self.namespace = namespace
+        self.redis_url = redis_url if aioredis is not None else None
+        self.local = TTLCache(maxsize, local_ttl)
+        self.redis_ttl = redis_ttl
+        self.retry_interval = retry_interval
+        self.encode = encode
+        self.decode = decode
+        # redis.asyncio 的连接与事件循环绑定，主 bot 与 WebUI bot 各用各的客户端
+        self._clients: dict[asyncio.AbstractEventLoop, Any] = {}
+        self._retry_at = 0.0
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+        _two_tier_caches.add(self)
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def _redis(self):
+        if self.redis_url is None or time.monotonic() < self._retry_at:
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = aioredis.from_url(self.redis_url, socket_connect_timeout=1, socket_timeout=1)
+            try:
+                await client.ping()
+            except Exception as e:
+                self._redis_failed(e)
+                await client.aclose()
+                return None
+            self._clients[loop] = client
+        return client
+
+    def _redis_failed(self, error: Exception):
+        self.redis_errors += 1
+        self._clients.pop(asyncio.get_running_loop(), None)
+        self._retry_at = time.monotonic() + self.retry_interval
+        logger.warning(f"Redis 不可用（{error}），{self.namespace} 缓存暂时只使用进程内缓存")
+
+    async def get(self, key: Hashable) -> Any:
+        """命中时返回缓存值，未命中返回 MISSING"""
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.local_hits += 1
+            return value
+        client = await self._redis()
+        if client is not None:
+            try:
+                raw = await client.get(self._key(key))
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw is not None:
+                try:
+                    value = self.decode(raw)
+                except ValueError:  # 旧版本写入的 pickle 数据，当作未命中
+                    value = MISSING
+                if value is not MISSING:
+                    self.redis_hits += 1
+                    self.local.set(key, value)
+                    return value
+        self.misses += 1
+        return MISSING
+
+    async def set(self, key: Hashable, value: Any):
+        self.local.set(key, value)
+        client = await self._redis()
+        if client is not None:
+            try:
+                await client.set(self._key(key), self.encode(value), ex=self.redis_ttl)
+            except Exception as e:
+                self._redis_failed(e)
+
+    async def delete(self, key: Hashable):
+        self.local.delete(key)
+        client = await self._redis()
+        if client is not None:
+            try:
+                await client.delete(self._key(key))
+            except Exception as e:
+                self._redis_failed(e)
+
+    async def close(self):
+        """关闭当前事件循环的 Redis 客户端"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def summary(self) -> str:
+        total = self.local_hits + self.redis_hits + self.misses
+        hit_rate = (self.local_hits + self.redis_hits) / total * 100 if total else 0
+        redis_state = "未启用" if self.redis_url is None else ("降级中" if time.monotonic() < self._retry_at else "可用")
+        return (f"{self.namespace} 缓存：命中率 {hit_rate:.1f}% | 本地命中 {self.local_hits} | Redis 命中 {self.redis_hits} | "
+                f"未命中 {self.misses} | 本地条目 {len(self.local)} | Redis {redis_state}（出错 {self.redis_errors} 次）")
+
+
+
+async def close_all():
+    """关闭所有两级缓存在当前事件循环中的 Redis 客户端"""
+    for cache in list(_two_tier_caches):
+        await cache.close()
+
+
+# 基准：Redis 关闭时本地缓存的读取吞吐
+# 在仓库根目录运行：python -m framework_common.database_util.cache
+if __name__ == "__main__":
+    async def _bench(number=200000):
+        cache = TwoTierCache("bench")
+        for i in range(1000):
+            await cache.set(i, {"user_id": i, "nickname": f"user{i}"})
+        start = time.perf_counter()
+        for i in range(number):
+            await cache.get(i % 1200)
+        cost = time.perf_counter() - start
+        print(f"{number / cost:.0f} 次/秒，{cache.summary()}")
+
+    asyncio.run(_bench())
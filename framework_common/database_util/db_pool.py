@@ -0,0 +1,194 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiosqlite
+
+from developTools.utils.logger import get_logger
+
+logger = get_logger()
+
+# 每个连接打开时执行一次的设置
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",  # 读写互不阻塞
+    "PRAGMA synchronous=NORMAL;",  # WAL 下 NORMAL 足够安全，且少一半 fsync
+    "PRAGMA cache_size=-8000;",  # 页缓存 8MB
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA busy_timeout=5000;",  # 与其他进程（如 WebUI）争锁时等待而不是立即报 database is locked
+)
+STATEMENT_CACHE_SIZE = 256  # 每个连接缓存的预编译语句数
+DEFAULT_READERS = 4
+
+
+async def connect(path: str, readonly: bool = False) -> aiosqlite.Connection:
+    """
+    打开一个已应用 PRAGMAS 的连接。
+    启动时的建表等一次性操作直接使用它，运行期间请使用 reader/writer。
+    """
+    connector = aiosqlite.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
+    # 池中的连接长期存在，其工作线程设为守护线程，避免未正常关闭的连接池（如 WebUI bot 所在的守护线程）阻塞进程退出。
+    # 新版 aiosqlite 的线程在 _thread 属性上，旧版 Connection 本身就是 Thread
+    getattr(connector, "_thread", connector).daemon = True
+    db = await connector
+    for pragma in PRAGMAS:
+        await db.execute(pragma)
+    if readonly:
+        await db.execute("PRAGMA query_only=1;")
+    return db
+
+
+class SQLitePool:
+    """
+    单个数据库文件的连接池：一个写连接加若干只读连接。
+
+    - writer: 所有写操作排队使用同一个连接，退出时提交，出错时回滚
+    - reader: 最多 readers 个只读连接并发读取，WAL 模式下不会被写操作阻塞
+    """
+
+    def __init__(self, path: str, readers: int = DEFAULT_READERS):
+        self.path = path
+        self.max_readers = readers
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._reader_slots = asyncio.Semaphore(readers)
+        self._idle_readers: list[aiosqlite.Connection] = []
+        self.closed = False
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        async with self._write_lock:
+            if self._writer is None:
+                self._writer = await connect(self.path)
+            db = self._writer
+            try:
+                yield db
+            except BaseException:
+                if db.in_transaction:
+                    try:
+                        await db.rollback()
+                    except Exception as e:
+                        logger.warning(f"回滚 {self.path} 失败: {e}")
+                raise
+            if db.in_transaction:
+                await db.commit()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        async with self._reader_slots:
+            db = self._idle_readers.pop() if self._idle_readers else await connect(self.path, readonly=True)
+            try:
+                yield db
+            finally:
+                if self.closed:
+                    await db.close()
+                else:
+                    self._idle_readers.append(db)
+
+    async def close(self):
+        self.closed = True
+        readers, self._idle_readers = self._idle_readers, []
+        for db in readers:
+            await db.close()
+        async with self._write_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+
+
+# aiosqlite 连接与创建它的事件循环绑定，主 bot 与 WebUI bot 各自运行在不同线程的事件循环中，因此按 (路径, 事件循环) 区分连接池
+_pools: dict[tuple[str, asyncio.AbstractEventLoop], SQLitePool] = {}
+
+
+def get_pool(path: str) -> SQLitePool:
+    key = (path, asyncio.get_running_loop())
+    pool = _pools.get(key)
+    if pool is None or pool.closed:
+        pool = _pools[key] = SQLitePool(path)
+    return pool
+
+
+def reader(path: str):
+    """
+    用法：
+    async with db_pool.reader(dbpath) as db:
+        async with db.execute("SELECT ...") as cursor: ...
+    """
+    return get_pool(path).reader()
+
+
+def writer(path: str):
+    """
+    用法：
+    async with db_pool.writer(dbpath) as db:
+        await db.execute("UPDATE ...")
+    """
+    return get_pool(path).writer()
+
+
+async def close_all():
+    """关闭当前事件循环中的所有连接池"""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _pools if key[1] is loop]:
+        await _pools.pop(key).close()
+
+
+# 基准：对比每次操作新建连接与使用连接池时，get_user 式读取与 add_to_group 式写入的每秒操作数
+# 在仓库根目录运行：python -m framework_common.database_util.db_pool
+if __name__ == "__main__":
+    import json
+    import os
+    import tempfile
+    import time
+
+    async def _prepare(path):
+        db = await connect(path)
+        await db.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, nickname TEXT, signed_days TEXT)")
+        await db.execute("""CREATE TABLE group_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, group_id INTEGER NOT NULL,
+                            message TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+        await db.executemany("INSERT INTO users VALUES (?, ?, '[]')", [(i, f"user{i}") for i in range(1000)])
+        await db.commit()
+        await db.close()
+
+    async def _add_to_group(db, group_id, message):
+        cursor = await db.execute("SELECT COUNT(*) FROM group_messages WHERE group_id = ?", (group_id,))
+        count = (await cursor.fetchone())[0]
+        if count >= 50:
+            await db.execute("DELETE FROM group_messages WHERE id IN (SELECT id FROM group_messages WHERE group_id = ? "
+                             "ORDER BY timestamp ASC LIMIT ?)", (group_id, count - 49))
+        await db.execute("INSERT INTO group_messages (group_id, message) VALUES (?, ?)", (group_id, json.dumps(message)))
+        await db.commit()
+
+    async def _bench(path, number=2000):
+        message = {"user_name": "测试", "user_id": 1, "message": [{"text": "你好"}]}
+
+        async def get_user_direct(i):
+            async with aiosqlite.connect(path) as db:
+                async with db.execute("SELECT * FROM users WHERE user_id = ?", (i % 1000,)) as cursor:
+                    await cursor.fetchone()
+
+        async def get_user_pooled(i):
+            async with reader(path) as db:
+                async with db.execute("SELECT * FROM users WHERE user_id = ?", (i % 1000,)) as cursor:
+                    await cursor.fetchone()
+
+        async def add_direct(i):
+            async with aiosqlite.connect(path) as db:
+                await _add_to_group(db, i % 20, message)
+
+        async def add_pooled(i):
+            async with writer(path) as db:
+                await _add_to_group(db, i % 20, message)
+
+        for name, op in (("get_user 新建连接", get_user_direct), ("get_user 连接池", get_user_pooled),
+                         ("add_to_group 新建连接", add_direct), ("add_to_group 连接池", add_pooled)):
+            start = time.perf_counter()
+            # 模拟多个群同时来消息：每批 20 个并发
+            for batch in range(0, number, 20):
+                await asyncio.gather(*(op(i) for i in range(batch, batch + 20)), return_exceptions=True)
+            print(f"{name}: {number / (time.perf_counter() - start):.0f} 次/秒")
+        await close_all()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        asyncio.run(_prepare(db_path))
+        asyncio.run(_bench(db_path))
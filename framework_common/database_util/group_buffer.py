@@ -0,0 +1,221 @@
+import asyncio
+from collections import deque
+from typing import Optional
+
+from developTools.utils.logger import get_logger
+from framework_common.database_util import db_pool
+
+logger = get_logger()
+
+# 三种 prompt 格式各自缓存处理结果的字段
+PROCESSED_FIELDS = ("processed_message", "new_openai_processed_message", "old_openai_processed_message")
+
+# 一条语句裁剪所有涉及的群：每个群只保留最新的 n 条
+TRIM_SQL = """
+WITH keep(group_id, n) AS (VALUES {values})
+DELETE FROM group_messages WHERE id IN (
+    SELECT id FROM (
+        SELECT m.id, k.n, ROW_NUMBER() OVER (PARTITION BY m.group_id ORDER BY m.id DESC) AS rn
+        FROM group_messages m JOIN keep k ON m.group_id = k.group_id
+    ) WHERE rn > n
+)
+"""
+
+
+class BufferedMessage:
+    __slots__ = ("id", "raw", "processed")
+
+    def __init__(self, raw: str, id: Optional[int] = None, processed: Optional[dict[str, str]] = None):
+        self.id = id  # 落库前为 None
+        self.raw = raw  # 添加时就序列化好的 JSON，之后对原消息的修改不会影响记录
+        self.processed = processed or {}
+
+
+class GroupMessageBuffer:
+    """
+    群消息的写回缓冲。
+
+    - 每个群在内存中保留最近 capacity 条消息，读取直接走内存，首次访问某个群时从数据库载入
+    - 新消息先进入待写队列，每 flush_interval 秒或积累 flush_batch 条时，在一个事务中批量写入，
+      并用一条窗口函数 DELETE 把涉及的群裁剪到各自的上限
+    - 退出前调用 flush 落盘
+    """
+
+    def __init__(self, db_path: str, capacity: int = 50, flush_interval: float = 3.0, flush_batch: int = 100):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.groups: dict[int, deque[BufferedMessage]] = {}
+        self.pending: list[tuple[int, BufferedMessage]] = []
+        self.keep: dict[int, int] = {}  # 每个群在数据库中保留的条数
+        self._loading: dict[int, asyncio.Future] = {}
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _group(self, group_id: int) -> deque:
+        queue = self.groups.get(group_id)
+        if queue is not None:
+            return queue
+        loading = self._loading.get(group_id)
+        if loading is None:
+            loading = self._loading[group_id] = asyncio.ensure_future(self._load(group_id))
+        return await asyncio.shield(loading)
+
+    async def _load(self, group_id: int) -> deque:
+        loaded = []
+        try:
+            async with db_pool.reader(self.db_path) as db:
+                cursor = await db.execute(
+                    f"SELECT id, message, {', '.join(PROCESSED_FIELDS)} FROM group_messages "
+                    f"WHERE group_id = ? ORDER BY id DESC LIMIT ?", (group_id, self.capacity))
+                rows = await cursor.fetchall()
+            loaded = [BufferedMessage(row[1], row[0], {field: value for field, value in zip(PROCESSED_FIELDS, row[2:]) if value})
+                      for row in reversed(rows)]
+        except Exception as e:
+            logger.warning(f"载入群 {group_id} 的历史消息失败: {e}")
+        finally:
+            self._loading.pop(group_id, None)
+        # 载入期间新增的消息更新，放在后面
+        queue = self.groups[group_id] = deque([*loaded, *self.groups.get(group_id, ())], maxlen=self.capacity)
+        return queue
+
+    async def add(self, group_id: int, raw: str, keep: int = 50):
+        queue = await self._group(group_id)
+        entry = BufferedMessage(raw)
+        queue.append(entry)
+        self.pending.append((group_id, entry))
+        self.keep[group_id] = keep
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self.pending) >= self.flush_batch:
+            self._wakeup.set()
+
+    async def recent(self, group_id: int, limit: Optional[int]) -> list[BufferedMessage]:
+        """最近的 limit 条消息，新的在前"""
+        if limit is None or limit > self.capacity:
+            # 超出内存窗口，先落盘再查数据库
+            await self.flush()
+            async with db_pool.reader(self.db_path) as db:
+                query = f"SELECT id, message, {', '.join(PROCESSED_FIELDS)} FROM group_messages WHERE group_id = ? ORDER BY id DESC"
+                params = (group_id,)
+                if limit is not None:
+                    query += " LIMIT ?"
+                    params += (limit,)
+                cursor = await db.execute(query, params)
+                rows = await cursor.fetchall()
+            return [BufferedMessage(row[1], row[0], {field: value for field, value in zip(PROCESSED_FIELDS, row[2:]) if value})
+                    for row in rows]
+        queue = await self._group(group_id)
+        return list(reversed(queue))[:limit]
+
+    async def set_processed(self, entry: BufferedMessage, field: str, value: str):
+        """记录某条消息转换后的 prompt；已落库的消息同时更新数据库，未落库的随批量写入一起保存"""
+        entry.processed[field] = value
+        if entry.id is not None:
+            async with db_pool.writer(self.db_path) as db:
+                await db.execute(f"UPDATE group_messages SET {field} = ? WHERE id = ?", (value, entry.id))
+
+    async def clear(self, group_id: int):
+        self.groups[group_id] = deque(maxlen=self.capacity)
+        self.pending = [(gid, entry) for gid, entry in self.pending if gid != group_id]
+        async with db_pool.writer(self.db_path) as db:
+            await db.execute("DELETE FROM group_messages WHERE group_id = ?", (group_id,))
+
+    async def _flush_loop(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, []
+            try:
+                async with db_pool.writer(self.db_path) as db:
+                    for group_id, entry in batch:
+                        cursor = await db.execute(
+                            f"INSERT INTO group_messages (group_id, message, {', '.join(PROCESSED_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+                            (group_id, entry.raw, *(entry.processed.get(field) for field in PROCESSED_FIELDS)))
+                        entry.id = cursor.lastrowid
+                    groups = {group_id for group_id, _ in batch}
+                    await db.execute(TRIM_SQL.format(values=", ".join("(?, ?)" for _ in groups)),
+                                     [value for group_id in groups for value in (group_id, self.keep.get(group_id, self.capacity))])
+            except Exception as e:
+                # 写入失败时放回队列，下次重试
+                for _, entry in batch:
+                    entry.id = None
+                self.pending = batch + self.pending
+                logger.error(f"群消息批量写入失败（{len(batch)} 条），稍后重试: {e}")
+
+
+# 缓冲区中的 asyncio 对象与事件循环绑定，主 bot 与 WebUI bot 各用各的缓冲区
+_buffers: dict[tuple[str, asyncio.AbstractEventLoop], GroupMessageBuffer] = {}
+
+
+def get_buffer(db_path: str) -> GroupMessageBuffer:
+    key = (db_path, asyncio.get_running_loop())
+    buffer = _buffers.get(key)
+    if buffer is None:
+        buffer = _buffers[key] = GroupMessageBuffer(db_path)
+    return buffer
+
+
+async def flush_all():
+    """把当前事件循环中所有缓冲区的群消息写入数据库，退出前调用"""
+    loop = asyncio.get_running_loop()
+    for (_, buffer_loop), buffer in list(_buffers.items()):
+        if buffer_loop is loop:
+            await buffer.flush()
+
+
+# 基准：对比逐条 COUNT/DELETE/INSERT/COMMIT 与写回缓冲的每秒消息数
+# 在仓库根目录运行：python -m framework_common.database_util.group_buffer
+if __name__ == "__main__":
+    import json
+    import os
+    import tempfile
+    import time
+
+    from framework_common.database_util import migrations
+
+    async def _bench(path, number=5000, groups=20):
+        await migrations.migrate(path, migrations.GROUP_MESSAGE_MIGRATIONS)
+        message = json.dumps({"user_name": "测试", "user_id": 1, "message": [{"text": "你好"}]})
+
+        start = time.perf_counter()
+        for i in range(number):
+            group_id = i % groups
+            async with db_pool.writer(path) as db:
+                cursor = await db.execute("SELECT COUNT(*) FROM group_messages WHERE group_id = ?", (group_id,))
+                count = (await cursor.fetchone())[0]
+                if count >= 50:
+                    await db.execute("DELETE FROM group_messages WHERE id IN (SELECT id FROM group_messages WHERE group_id = ? "
+                                     "ORDER BY timestamp ASC LIMIT ?)", (group_id, count - 49))
+                await db.execute("INSERT INTO group_messages (group_id, message) VALUES (?, ?)", (group_id, message))
+                await db.commit()
+        print(f"逐条写入: {number / (time.perf_counter() - start):.0f} 条/秒")
+
+        buffer = get_buffer(path)
+        start = time.perf_counter()
+        for i in range(number):
+            await buffer.add(1000 + i % groups, message)
+        await buffer.flush()
+        print(f"写回缓冲: {number / (time.perf_counter() - start):.0f} 条/秒")
+
+        async with db_pool.reader(path) as db:
+            cursor = await db.execute("SELECT group_id, COUNT(*) FROM group_messages WHERE group_id >= 1000 GROUP BY group_id")
+            counts = {row[1] for row in await cursor.fetchall()}
+        assert counts == {50}, counts
+        recent = await buffer.recent(1000, 20)
+        assert len(recent) == 20 and all(entry.id for entry in recent)
+        await db_pool.close_all()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(_bench(os.path.join(tmp, "group_messages.db")))
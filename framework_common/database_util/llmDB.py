@@ -1,13 +1,15 @@
 import asyncio
 import base64
 import html
-import json
 import os
 import re
+from typing import Optional
 
-import aiosqlite
 from PIL import Image
 
+from developTools.utils import fast_json
+from framework_common.database_util import blob_store, db_pool, migrations
+from framework_common.database_util.migrations import conversation_turn
 from framework_common.framework_util.yamlLoader import YAMLManager
 
 same_manager = YAMLManager.get_instance()
@@ -16,6 +18,7 @@ if local_config["llm"]["model"] == "gemini":
     DATABASE_FILE = "data/dataBase/conversation.db"
 else:
     DATABASE_FILE = "data/dataBase/openai_conversation.db"
+CHARA_DATABASE_FILE = "data/dataBase/charas.db"
 
 
 async def use_folder_chara(file_name):
@@ -98,27 +101,13 @@ def silly_tavern_card(image_path, clear_html=False):
 # --- 异步数据库操作 ---
 
 async def init_db():
-    """初始化数据库"""
-    async with aiosqlite.connect(DATABASE_FILE) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS conversation_history (
-                user_id INTEGER PRIMARY KEY,
-                history TEXT
-            )
-        """)
-        await db.commit()
+    """初始化数据库，表结构的变更见 migrations.CONVERSATION_MIGRATIONS"""
+    await migrations.migrate(DATABASE_FILE, migrations.CONVERSATION_MIGRATIONS)
 
 
 async def init_charas_db():
-    """初始化角色数据库"""
-    async with aiosqlite.connect('data/dataBase/charas.db') as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_chara (
-                user_id INTEGER PRIMARY KEY,
-                chara TEXT
-            )
-        """)
-        await db.commit()
+    """初始化角色数据库，表结构的变更见 migrations.CHARA_MIGRATIONS"""
+    await migrations.migrate(CHARA_DATABASE_FILE, migrations.CHARA_MIGRATIONS)
 
 
 asyncio.run(init_charas_db())
@@ -136,7 +125,7 @@ async def change_folder_chara(file_name, user_id, folder_path='data/system/chara
             if chara.startswith("错误"):
                 return chara
             await delete_user_history(user_id)
-            async with aiosqlite.connect('data/dataBase/charas.db') as db:
+            async with db_pool.writer(CHARA_DATABASE_FILE) as db:
                 # 更新用户的角色信息
                 await db.execute("INSERT OR REPLACE INTO user_chara (user_id, chara) VALUES (?, ?)",
                                  (user_id, chara))
@@ -164,13 +153,13 @@ async def set_all_users_chara(file_name, folder_path='data/system/chara'):
         if chara.startswith("错误"):
             return chara
 
-        await clear_all_history()
-
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            cursor = await db.execute("SELECT user_id FROM conversation_history")
+        async with db_pool.reader(DATABASE_FILE) as db:
+            cursor = await db.execute("SELECT DISTINCT user_id FROM conversation_turns")
             history_users = await cursor.fetchall()
 
-        async with aiosqlite.connect('data/dataBase/charas.db') as db:
+        await clear_all_history()
+
+        async with db_pool.writer(CHARA_DATABASE_FILE) as db:
             cursor = await db.execute("SELECT user_id FROM user_chara")
             chara_users = await cursor.fetchall()
 
@@ -193,7 +182,7 @@ async def clear_all_users_chara():
     """
     try:
         await clear_all_history()
-        async with aiosqlite.connect('data/dataBase/charas.db') as db:
+        async with db_pool.writer(CHARA_DATABASE_FILE) as db:
             await db.execute("DELETE FROM user_chara")
             await db.commit()
         return "所有用户的人设已清空"
@@ -213,7 +202,7 @@ async def clear_user_chara(user_id):
     """
     try:
         await delete_user_history(user_id)
-        async with aiosqlite.connect('data/dataBase/charas.db') as db:
+        async with db_pool.writer(CHARA_DATABASE_FILE) as db:
             await db.execute("DELETE FROM user_chara WHERE user_id = ?", (user_id,))
             await db.commit()
 
@@ -228,7 +217,7 @@ async def read_chara(user_id, chara_str):  # 这里的chara_str是一个字符
     if not isinstance(chara_str, str):
         raise ValueError("chara_str 必须是字符串类型")
 
-    async with aiosqlite.connect('data/dataBase/charas.db') as db:
+    async with db_pool.reader(CHARA_DATABASE_FILE) as db:
         cursor = await db.execute("SELECT chara FROM user_chara WHERE user_id = ?", (user_id,))
         result = await cursor.fetchone()
         if result is None:
@@ -237,42 +226,279 @@ async def read_chara(user_id, chara_str):  # 这里的chara_str是一个字符
             return result[0]
 
 
-async def get_user_history(user_id)->list:
-    """获取用户历史对话"""
-    async with aiosqlite.connect(DATABASE_FILE) as db:
-        async with db.execute("SELECT history FROM conversation_history WHERE user_id = ?", (user_id,)) as cursor:
-            result = await cursor.fetchone()
-            if result:
-                return json.loads(result[0])
-            else:
-                return []
+def _load_turn(role: str, parts: str) -> dict:
+    return {"role": role, **fast_json.loads(parts)}
+
+
+async def get_user_history(user_id, last: Optional[int] = None) -> list:
+    """获取用户历史对话，last 为只取最近的若干条"""
+    async with db_pool.reader(DATABASE_FILE) as db:
+        if last is None:
+            cursor = await db.execute("SELECT role, parts FROM conversation_turns WHERE user_id = ? ORDER BY seq",
+                                      (user_id,))
+            rows = await cursor.fetchall()
+        else:
+            cursor = await db.execute("SELECT role, parts FROM conversation_turns WHERE user_id = ? ORDER BY seq DESC LIMIT ?",
+                                      (user_id, last))
+            rows = list(reversed(await cursor.fetchall()))
+        return await blob_store.rehydrate(db, [_load_turn(role, parts) for role, parts in rows])
+
+
+# 每个用户历史记录的 (条数, token 数)，随写入增减，裁剪时不必每轮重新统计。只在 writer 内读写
+_totals: dict[tuple[str, int], list[int]] = {}
+
+
+async def _history_totals(db, user_id) -> list[int]:
+    totals = _totals.get((DATABASE_FILE, user_id))
+    if totals is None:
+        cursor = await db.execute("SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM conversation_turns WHERE user_id = ?",
+                                  (user_id,))
+        totals = _totals[(DATABASE_FILE, user_id)] = list(await cursor.fetchone())
+    return totals
+
+
+def _forget_totals(user_id=None):
+    if user_id is None:
+        for key in [key for key in _totals if key[0] == DATABASE_FILE]:
+            del _totals[key]
+    else:
+        _totals.pop((DATABASE_FILE, user_id), None)
+
+
+async def _insert_turns(db, user_id, first_seq: int, messages):
+    rows = []
+    for seq, message in enumerate(messages, start=first_seq):
+        blobs = {}
+        rows.append((user_id, seq, *conversation_turn(message, blobs)))
+        await blob_store.save_blobs(db, user_id, seq, blobs)
+    await db.executemany("INSERT INTO conversation_turns (user_id, seq, role, parts, tokens) VALUES (?, ?, ?, ?, ?)", rows)
+    totals = _totals.get((DATABASE_FILE, user_id))
+    if totals is not None:
+        totals[0] += len(rows)
+        totals[1] += sum(row[-1] for row in rows)
+
+
+async def append_history(user_id, *messages: dict):
+    """在用户历史对话末尾追加若干条，只写入新增的行"""
+    async with db_pool.writer(DATABASE_FILE) as db:
+        cursor = await db.execute("SELECT COALESCE(MAX(seq), 0) FROM conversation_turns WHERE user_id = ?", (user_id,))
+        await _insert_turns(db, user_id, (await cursor.fetchone())[0] + 1, messages)
+
+
+async def prepend_history(user_id, *messages: dict):
+    """在用户历史对话开头插入若干条（如人设 prompt），seq 可以为负数"""
+    async with db_pool.writer(DATABASE_FILE) as db:
+        cursor = await db.execute("SELECT MIN(seq) FROM conversation_turns WHERE user_id = ?", (user_id,))
+        first = (await cursor.fetchone())[0]
+        await _insert_turns(db, user_id, (1 if first is None else first) - len(messages), messages)
+
+
+async def history_checkpoint(user_id) -> int:
+    """当前最后一条记录的 seq，出错时配合 rollback_history 撤销之后追加的记录"""
+    async with db_pool.reader(DATABASE_FILE) as db:
+        cursor = await db.execute("SELECT COALESCE(MAX(seq), 0) FROM conversation_turns WHERE user_id = ?", (user_id,))
+        return (await cursor.fetchone())[0]
+
+
+async def rollback_history(user_id, checkpoint: int):
+    async with db_pool.writer(DATABASE_FILE) as db:
+        await db.execute("DELETE FROM conversation_turns WHERE user_id = ? AND seq > ?", (user_id, checkpoint))
+        _forget_totals(user_id)
+
+
+async def history_tokens(user_id, since: Optional[int] = None) -> int:
+    """历史记录的 token 数，since 为 history_checkpoint 的返回值时只统计之后追加的记录（即本轮对话的用量）"""
+    async with db_pool.reader(DATABASE_FILE) as db:
+        if since is None:
+            cursor = await db.execute("SELECT COALESCE(SUM(tokens), 0) FROM conversation_turns WHERE user_id = ?",
+                                      (user_id,))
+        else:
+            cursor = await db.execute("SELECT COALESCE(SUM(tokens), 0) FROM conversation_turns WHERE user_id = ? AND seq > ?",
+                                      (user_id, since))
+        return (await cursor.fetchone())[0]
+
+
+async def truncate_history(user_id, max_turns: Optional[int] = None, max_tokens: Optional[int] = None) -> int:
+    """
+    超出条数或 token 上限时删除最早的记录，保留的部分从一条用户消息开始，
+    避免留下没有对应调用的函数结果。未超出时只比较缓存的总数；超出时只读取 seq/role/tokens，不解析对话内容。
+    :return: 删除的条数
+    """
+    async with db_pool.writer(DATABASE_FILE) as db:
+        turns, tokens = await _history_totals(db, user_id)
+        if (not max_turns or turns <= max_turns) and (not max_tokens or tokens <= max_tokens):
+            return 0
+        cursor = await db.execute("SELECT seq, role, tokens FROM conversation_turns WHERE user_id = ? ORDER BY seq DESC",
+                                  (user_id,))
+        rows = await cursor.fetchall()
+        total = 0
+        cutoff = None
+        for index, (seq, role, tokens) in enumerate(rows):
+            if (max_turns and index >= max_turns) or (max_tokens and total + tokens > max_tokens):
+                break
+            total += tokens
+            if role == "user":
+                cutoff = seq
+        else:
+            return 0
+        if cutoff is None:
+            # 最近一轮就已超出上限，至少保留这一轮
+            cutoff = next((seq for seq, role, _ in rows[index:] if role == "user"), None)
+            if cutoff is None:
+                return 0
+        cursor = await db.execute("DELETE FROM conversation_turns WHERE user_id = ? AND seq < ?", (user_id, cutoff))
+        kept = [tokens for seq, _, tokens in rows if seq >= cutoff]
+        _totals[(DATABASE_FILE, user_id)] = [len(kept), sum(kept)]
+        return cursor.rowcount
+
 
 async def delete_latest2_history(user_id):
-    user_history=await get_user_history(user_id)
-    user_history=user_history[:-2]
-    await update_user_history(user_id, user_history)
+    async with db_pool.writer(DATABASE_FILE) as db:
+        await db.execute("DELETE FROM conversation_turns WHERE user_id = ? AND seq IN "
+                         "(SELECT seq FROM conversation_turns WHERE user_id = ? ORDER BY seq DESC LIMIT 2)",
+                         (user_id, user_id))
+        _forget_totals(user_id)
+
 
 async def update_user_history(user_id, history):
-    """更新用户历史对话"""
-    async with aiosqlite.connect(DATABASE_FILE) as db:
-        await db.execute("INSERT OR REPLACE INTO conversation_history (user_id, history) VALUES (?, ?)",
-                         (user_id, json.dumps(history)))
-        await db.commit()
+    """整体替换用户历史对话，日常追加请使用 append_history"""
+    async with db_pool.writer(DATABASE_FILE) as db:
+        await db.execute("DELETE FROM conversation_turns WHERE user_id = ?", (user_id,))
+        await _insert_turns(db, user_id, 1, history)
+        _forget_totals(user_id)
 
 
 async def delete_user_history(user_id):
     """删除指定用户的聊天记录"""
-    async with aiosqlite.connect(DATABASE_FILE) as db:
-        await db.execute("DELETE FROM conversation_history WHERE user_id = ?", (user_id,))
+    async with db_pool.writer(DATABASE_FILE) as db:
+        await db.execute("DELETE FROM conversation_turns WHERE user_id = ?", (user_id,))
         await db.commit()
+        _forget_totals(user_id)
 
 
 async def clear_all_history():
     """清理所有用户的聊天记录"""
-    async with aiosqlite.connect(DATABASE_FILE) as db:
-        await db.execute("DELETE FROM conversation_history")
+    async with db_pool.writer(DATABASE_FILE) as db:
+        await db.execute("DELETE FROM conversation_turns")
         await db.commit()
+        _forget_totals()
         print("所有用户的对话记录已清理。")
 
 
 asyncio.run(init_db())
+
+
+# 基准：模拟一轮对话（追加用户消息、追加回复、按上限裁剪），对比整段 JSON 读改写与按行追加
+# 在仓库根目录运行：python -m framework_common.database_util.llmDB
+if __name__ == "__main__":
+    import json
+    import tempfile
+    import time
+
+    from framework_common.utils.token_counter import estimate_message_tokens
+
+    async def _blob_turn(db, user_id, messages, max_length):
+        for message in messages:
+            cursor = await db.execute("SELECT history FROM conversation_history WHERE user_id = ?", (user_id,))
+            row = await cursor.fetchone()
+            history = json.loads(row[0]) if row else []
+            if len(history) > max_length:
+                del history[0]
+                del history[0]
+            history.append(message)
+            await db.execute("INSERT OR REPLACE INTO conversation_history (user_id, history) VALUES (?, ?)",
+                             (user_id, json.dumps(history)))
+            await db.commit()
+        cursor = await db.execute("SELECT history FROM conversation_history WHERE user_id = ?", (user_id,))
+        history = json.loads((await cursor.fetchone())[0])
+        while len(history) > max_length and history[0]["role"] != "user":
+            del history[0]
+        await db.execute("INSERT OR REPLACE INTO conversation_history (user_id, history) VALUES (?, ?)",
+                         (user_id, json.dumps(history)))
+        await db.commit()
+
+    async def _bench(rounds=500, max_length=40):
+        global DATABASE_FILE
+        text = "喵" * 200 + " hello world " * 20
+        messages = [{"role": "user", "parts": [{"text": text}]}, {"role": "model", "parts": [{"text": text}]}]
+        with tempfile.TemporaryDirectory() as tmp:
+            DATABASE_FILE = os.path.join(tmp, "conversation.db")
+            await migrations.migrate(DATABASE_FILE, migrations.CONVERSATION_MIGRATIONS)
+            async with db_pool.writer(DATABASE_FILE) as db:
+                await db.execute("CREATE TABLE conversation_history (user_id INTEGER PRIMARY KEY, history TEXT)")
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                async with db_pool.writer(DATABASE_FILE) as db:
+                    await _blob_turn(db, 1, messages, max_length)
+            print(f"整段 JSON 读改写: {rounds / (time.perf_counter() - start):.0f} 轮/秒")
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for message in messages:
+                    await append_history(2, message)
+                await truncate_history(2, max_length)
+            print(f"按行追加: {rounds / (time.perf_counter() - start):.0f} 轮/秒")
+
+            history = await get_user_history(2)
+            assert len(history) == max_length and history[0] == messages[0] and history[-1] == messages[1]
+            assert await get_user_history(2, last=3) == history[-3:]
+            checkpoint = await history_checkpoint(2)
+            await append_history(2, messages[0])
+            await rollback_history(2, checkpoint)
+            assert await get_user_history(2) == history
+            await prepend_history(2, {"role": "system", "content": "人设"})
+            assert (await get_user_history(2))[0]["role"] == "system"
+            # token 上限比条数上限更严时按 token 裁剪，且仍从用户消息开始
+            await truncate_history(2, max_length, max_tokens=2000)
+            history = await get_user_history(2)
+            assert history[0]["role"] == "user" and len(history) < max_length
+            # 未超出上限时：比较缓存的总数 vs 每轮读出整段 seq/role/tokens 重新累加
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await truncate_history(2, max_length, max_tokens=2000)
+            cached = rounds / (time.perf_counter() - start)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                _forget_totals(2)
+                await truncate_history(2, max_length, max_tokens=2000)
+            print(f"未超出上限的裁剪检查: 重新统计 {rounds / (time.perf_counter() - start):.0f} 次/秒，增量总数 {cached:.0f} 次/秒")
+            # 增量维护的条数与 token 总数和实际一致
+            assert _totals[(DATABASE_FILE, 2)] == [len(history), await history_tokens(2)]
+            assert await history_tokens(2, since=await history_checkpoint(2) - 1) == estimate_message_tokens(history[-1])
+
+            # 每轮都带同一张约 300KB 的图片（如反复引用的表情包）：对比整段 JSON 与按内容哈希存放的读写速度和文件大小
+            image = base64.b64encode(os.urandom(225 * 1024)).decode()
+            messages = [{"role": "user", "parts": [{"text": text}, {"inline_data": {"mime_type": "image/jpeg", "data": image}}]},
+                        {"role": "model", "parts": [{"text": text}]}]
+            rounds = 100
+            start = time.perf_counter()
+            for _ in range(rounds):
+                async with db_pool.writer(DATABASE_FILE) as db:
+                    await _blob_turn(db, 3, messages, max_length)
+                    cursor = await db.execute("SELECT history FROM conversation_history WHERE user_id = 3")
+                    json.loads((await cursor.fetchone())[0])
+            print(f"带图片 整段 JSON: {rounds / (time.perf_counter() - start):.0f} 轮/秒")
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for message in messages:
+                    await append_history(4, message)
+                await truncate_history(4, max_length)
+                await get_user_history(4)
+            print(f"带图片 按行追加 + 内容寻址: {rounds / (time.perf_counter() - start):.0f} 轮/秒")
+            history = await get_user_history(4)
+            assert history[-2] == messages[0] and len(history) == max_length
+            async with db_pool.reader(DATABASE_FILE) as db:
+                cursor = await db.execute("SELECT SUM(LENGTH(history)) FROM conversation_history")
+                blob_size = (await cursor.fetchone())[0]
+                cursor = await db.execute("SELECT (SELECT SUM(LENGTH(parts)) FROM conversation_turns WHERE user_id = 4) + "
+                                          "(SELECT SUM(LENGTH(data)) FROM blobs)")
+                row_size = (await cursor.fetchone())[0]
+            print(f"带图片 存储大小: 整段 JSON {blob_size / 1024:.0f}KB，按内容寻址 {row_size / 1024:.0f}KB")
+            await delete_user_history(4)
+            async with db_pool.reader(DATABASE_FILE) as db:
+                cursor = await db.execute("SELECT COUNT(*) FROM blobs")
+                assert (await cursor.fetchone())[0] == 0
+            await db_pool.close_all()
+
+    asyncio.run(_bench())
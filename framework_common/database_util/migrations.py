@@ -0,0 +1,402 @@
+import ast
+import datetime
+import json
+from typing import Awaitable, Callable, Optional
+
+import aiosqlite
+
+from developTools.utils import fast_json
+from developTools.utils.logger import get_logger
+from framework_common.database_util import blob_store, db_pool
+from framework_common.utils.token_counter import estimate_message_tokens
+
+logger = get_logger()
+
+# (版本号, 说明, 迁移函数)。版本号只增不改，已发布的迁移不要修改，新的改动追加新版本。
+# 迁移函数在同一个事务内执行，需要兼容没有 schema_version 表的旧数据库（版本视为 0），因此建表与加列都要可重入。
+Migration = tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+async def table_columns(db: aiosqlite.Connection, table: str) -> list[str]:
+    async with db.execute(f"PRAGMA table_info({table});") as cursor:
+        return [col[1] for col in await cursor.fetchall()]
+
+
+async def add_column_if_missing(db: aiosqlite.Connection, table: str, column: str, declaration: str):
+    if column not in await table_columns(db, table):
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration};")
+
+
+async def current_version(db: aiosqlite.Connection) -> int:
+    async with db.execute("SELECT MAX(version) FROM schema_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0] or 0
+
+
+async def migrate(path: str, migrations: list[Migration]) -> int:
+    """
+    把 path 对应的数据库升级到最新版本，每个迁移一个事务，失败时回滚并抛出异常。
+    启动时调用一次即可，运行期间的读写不再检查表结构。
+    :return: 升级后的版本号
+    """
+    db = await db_pool.connect(path)
+    try:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
+            )
+        """)
+        await db.commit()
+        version = await current_version(db)
+        for target, description, step in sorted(migrations, key=lambda m: m[0]):
+            if target <= version:
+                continue
+            try:
+                await db.execute("BEGIN")
+                await step(db)
+                await db.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                                 (target, description, datetime.datetime.now().isoformat(timespec="seconds")))
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                logger.error(f"❌ 数据库 {path} 升级到版本 {target}（{description}）失败")
+                raise
+            version = target
+            logger.info(f"数据库 {path} 已升级到版本 {target}：{description}")
+        return version
+    finally:
+        await db.close()
+
+
+# ======================= user_management.db =======================
+async def _users_v1(db):
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        nickname TEXT,
+        card TEXT,
+        sex TEXT DEFAULT '0',
+        age INTEGER DEFAULT 0,
+        city TEXT DEFAULT '通辽',
+        permission INTEGER DEFAULT 0,
+        signed_days TEXT,
+        registration_date TEXT,
+        ai_token_record INTEGER DEFAULT 0
+    )
+    """)
+    # 早期版本的表缺少部分字段
+    for column, declaration in (("card", "TEXT"), ("sex", "TEXT DEFAULT '0'"), ("age", "INTEGER DEFAULT 0"),
+                                ("city", "TEXT DEFAULT '通辽'"), ("permission", "INTEGER DEFAULT 0"),
+                                ("signed_days", "TEXT DEFAULT '[]'"), ("registration_date", "TEXT DEFAULT ''"),
+                                ("ai_token_record", "INTEGER DEFAULT 0")):
+        await add_column_if_missing(db, "users", column, declaration)
+
+
+async def _users_v2(db):
+    await add_column_if_missing(db, "users", "user_portrait", "TEXT DEFAULT ''")
+    await add_column_if_missing(db, "users", "portrait_update_time", "TEXT DEFAULT ''")
+
+
+async def _users_v3(db):
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_permission ON users (permission)")
+
+
+def _parse_signed_days(raw) -> list[str]:
+    """旧版 signed_days 是 JSON 列表，更早的数据可能是 Python 列表的 repr"""
+    if not raw:
+        return []
+    try:
+        days = json.loads(raw)
+    except ValueError:
+        try:
+            days = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return []
+    return [day for day in days if isinstance(day, str)] if isinstance(days, (list, tuple, set)) else []
+
+
+async def _users_v4(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS sign_ins (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (user_id, date)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_sign_ins_date ON sign_ins (date)")
+    await add_column_if_missing(db, "users", "sign_in_days", "INTEGER DEFAULT 0")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_sign_in_days ON users (sign_in_days)")
+    async with db.execute("SELECT user_id, signed_days FROM users WHERE signed_days IS NOT NULL AND signed_days != '[]'") as cursor:
+        rows = await cursor.fetchall()
+    await db.executemany("INSERT OR IGNORE INTO sign_ins (user_id, date) VALUES (?, ?)",
+                         [(user_id, day) for user_id, raw in rows for day in _parse_signed_days(raw)])
+    await db.execute("UPDATE users SET sign_in_days = (SELECT COUNT(*) FROM sign_ins WHERE sign_ins.user_id = users.user_id)")
+
+
+USER_MIGRATIONS: list[Migration] = [
+    (1, "创建 users 表", _users_v1),
+    (2, "用户画像字段", _users_v2),
+    (3, "permission 索引", _users_v3),
+    (4, "签到记录迁移到 sign_ins 表", _users_v4),
+]
+
+
+# ======================= group_messages.db =======================
+async def _group_messages_v1(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS group_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            processed_message TEXT
+        )
+    """)
+
+
+async def _group_messages_v2(db):
+    await add_column_if_missing(db, "group_messages", "new_openai_processed_message", "TEXT")
+    await add_column_if_missing(db, "group_messages", "old_openai_processed_message", "TEXT")
+
+
+async def _group_messages_v3(db):
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_group_messages_group_time ON group_messages (group_id, timestamp)")
+
+
+GROUP_MESSAGE_MIGRATIONS: list[Migration] = [
+    (1, "创建 group_messages 表", _group_messages_v1),
+    (2, "openai 格式的 prompt 缓存字段", _group_messages_v2),
+    (3, "按群与时间的索引", _group_messages_v3),
+]
+
+
+# ======================= conversation.db / openai_conversation.db =======================
+async def _conversation_v1(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_history (
+            user_id INTEGER PRIMARY KEY,
+            history TEXT
+        )
+    """)
+
+
+def conversation_turn(message: dict, blobs: Optional[dict[str, bytes]] = None) -> tuple[str, str, int]:
+    """
+    一条对话记录在 conversation_turns 中的 (role, parts, tokens)，parts 为去掉 role 后的其余字段。
+    传入 blobs 时内联的 base64 数据换成引用，取出的数据放入 blobs，见 blob_store
+    """
+    parts = {key: value for key, value in message.items() if key != "role"}
+    if blobs is not None:
+        parts = blob_store.dehydrate(parts, blobs)
+    return message.get("role") or "", fast_json.dumps(parts), estimate_message_tokens(message)
+
+
+async def _conversation_v2(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_turns (
+            user_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            parts TEXT NOT NULL,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, seq)
+        )
+    """)
+    async with db.execute("SELECT user_id, history FROM conversation_history") as cursor:
+        rows = await cursor.fetchall()
+    for user_id, raw in rows:
+        try:
+            history = json.loads(raw) if raw else []
+        except ValueError:
+            logger.warning(f"用户 {user_id} 的对话记录无法解析，已丢弃")
+            continue
+        await db.executemany(
+            "INSERT OR REPLACE INTO conversation_turns (user_id, seq, role, parts, tokens) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, seq, *conversation_turn(message))
+             for seq, message in enumerate((m for m in history if isinstance(m, dict)), start=1)])
+    await db.execute("DROP TABLE conversation_history")
+
+
+async def _conversation_v3(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS turn_blobs (
+            user_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (user_id, seq, hash)
+        ) WITHOUT ROWID
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_turn_blobs_hash ON turn_blobs (hash)")
+    # 引用计数：删除对话记录时释放其引用，最后一个引用消失时删除数据
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_conversation_turns_release AFTER DELETE ON conversation_turns
+        BEGIN
+            DELETE FROM turn_blobs WHERE user_id = old.user_id AND seq = old.seq;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_turn_blobs_release AFTER DELETE ON turn_blobs
+        WHEN NOT EXISTS (SELECT 1 FROM turn_blobs WHERE hash = old.hash)
+        BEGIN
+            DELETE FROM blobs WHERE hash = old.hash;
+        END
+    """)
+    async with db.execute("SELECT user_id, seq, parts FROM conversation_turns "
+                          "WHERE parts LIKE '%\"data\"%' OR parts LIKE '%base64,%'") as cursor:
+        rows = await cursor.fetchall()
+    for user_id, seq, raw in rows:
+        blobs = {}
+        parts = blob_store.dehydrate(fast_json.loads(raw), blobs)
+        if blobs:
+            await db.execute("UPDATE conversation_turns SET parts = ? WHERE user_id = ? AND seq = ?",
+                             (fast_json.dumps(parts), user_id, seq))
+            await blob_store.save_blobs(db, user_id, seq, blobs)
+
+
+CONVERSATION_MIGRATIONS: list[Migration] = [
+    (1, "创建 conversation_history 表", _conversation_v1),
+    (2, "对话记录拆分为每轮一行的 conversation_turns 表", _conversation_v2),
+    (3, "图片等内联数据按内容哈希存入 blobs 表", _conversation_v3),
+]
+
+
+# ======================= charas.db =======================
+async def _charas_v1(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_chara (
+            user_id INTEGER PRIMARY KEY,
+            chara TEXT
+        )
+    """)
+
+
+CHARA_MIGRATIONS: list[Migration] = [
+    (1, "创建 user_chara 表", _charas_v1),
+]
+
+
+# 升级检查：用各个历史版本的表结构建出旧数据库文件，确认迁移后结构完整、数据保留，且重复执行不会再次迁移
+# 在仓库根目录运行：python -m framework_common.database_util.migrations
+if __name__ == "__main__":
+    import asyncio
+    import base64
+    import os
+    import sqlite3
+    import tempfile
+
+    LEGACY_USERS = {
+        # 最早的版本：只有基础字段，没有 ai_token_record
+        "初版": """CREATE TABLE users (user_id INTEGER PRIMARY KEY, nickname TEXT, card TEXT, sex TEXT DEFAULT '0',
+                   age INTEGER DEFAULT 0, city TEXT DEFAULT '通辽', permission INTEGER DEFAULT 0,
+                   signed_days TEXT, registration_date TEXT)""",
+        # 加入 ai_token_record，尚无用户画像
+        "ai_token_record": """CREATE TABLE users (user_id INTEGER PRIMARY KEY, nickname TEXT, card TEXT, sex TEXT DEFAULT '0',
+                   age INTEGER DEFAULT 0, city TEXT DEFAULT '通辽', permission INTEGER DEFAULT 0,
+                   signed_days TEXT, registration_date TEXT, ai_token_record INTEGER DEFAULT 0)""",
+        # 引入迁移之前的最终结构
+        "用户画像": """CREATE TABLE users (user_id INTEGER PRIMARY KEY, nickname TEXT, card TEXT, sex TEXT DEFAULT '0',
+                   age INTEGER DEFAULT 0, city TEXT DEFAULT '通辽', permission INTEGER DEFAULT 0,
+                   signed_days TEXT, registration_date TEXT, ai_token_record INTEGER DEFAULT 0,
+                   user_portrait TEXT DEFAULT '', portrait_update_time TEXT DEFAULT '')""",
+    }
+    LEGACY_GROUP = """CREATE TABLE group_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, group_id INTEGER NOT NULL,
+                      message TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, processed_message TEXT)"""
+
+    def _columns(path, table):
+        with sqlite3.connect(path) as conn:
+            return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+    async def _check():
+        latest_users = max(m[0] for m in USER_MIGRATIONS)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, ddl in {**LEGACY_USERS, "新安装": None}.items():
+                path = os.path.join(tmp, f"users_{len(os.listdir(tmp))}.db")
+                if ddl:
+                    with sqlite3.connect(path) as conn:
+                        conn.execute(ddl)
+                        # 初版的 signed_days 按 Python repr 写入，之后是 JSON
+                        signed_days = "['2025-01-01', '2025-01-02']" if name == "初版" else '["2025-01-01", "2025-01-02"]'
+                        conn.execute("INSERT INTO users (user_id, nickname, signed_days) VALUES (1840094972, '测试', ?)",
+                                     (signed_days,))
+                assert await migrate(path, USER_MIGRATIONS) == latest_users
+                columns = _columns(path, "users")
+                for column in ("ai_token_record", "user_portrait", "portrait_update_time"):
+                    assert column in columns, (name, column)
+                with sqlite3.connect(path) as conn:
+                    rows = conn.execute("SELECT user_id, nickname FROM users").fetchall()
+                    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+                assert rows == ([(1840094972, "测试")] if ddl else []), (name, rows)
+                assert versions == list(range(1, latest_users + 1)), (name, versions)
+                with sqlite3.connect(path) as conn:
+                    sign_ins = conn.execute("SELECT user_id, date FROM sign_ins ORDER BY date").fetchall()
+                    totals = conn.execute("SELECT sign_in_days FROM users").fetchall()
+                assert sign_ins == ([(1840094972, "2025-01-01"), (1840094972, "2025-01-02")] if ddl else []), (name, sign_ins)
+                assert totals == ([(2,)] if ddl else []), (name, totals)
+                # 再次执行不会重复迁移
+                assert await migrate(path, USER_MIGRATIONS) == latest_users
+                print(f"users 表 {name}: 通过")
+
+            path = os.path.join(tmp, "group.db")
+            with sqlite3.connect(path) as conn:
+                conn.execute(LEGACY_GROUP)
+                conn.execute("INSERT INTO group_messages (group_id, message) VALUES (879886836, '{}')")
+            await migrate(path, GROUP_MESSAGE_MIGRATIONS)
+            assert "old_openai_processed_message" in _columns(path, "group_messages")
+            with sqlite3.connect(path) as conn:
+                indexes = [row[1] for row in conn.execute("PRAGMA index_list(group_messages)")]
+                assert conn.execute("SELECT COUNT(*) FROM group_messages").fetchone()[0] == 1
+            assert "idx_group_messages_group_time" in indexes
+            print("group_messages 表: 通过")
+
+            # 整段 JSON 的对话记录拆分为每轮一行，顺序与内容不变
+            path = os.path.join(tmp, "conversation.db")
+            history = [{"role": "user", "parts": [{"text": "你好"}]}, {"role": "model", "parts": [{"text": "喵"}]}]
+            # 同一张图片出现两次，迁移后只存一份
+            image = base64.b64encode(os.urandom(4096)).decode()
+            image_turn = {"role": "user", "parts": [{"text": "看图"}, {"inline_data": {"mime_type": "image/jpeg", "data": image}}]}
+            history.extend([image_turn, image_turn])
+            with sqlite3.connect(path) as conn:
+                conn.execute("CREATE TABLE conversation_history (user_id INTEGER PRIMARY KEY, history TEXT)")
+                conn.executemany("INSERT INTO conversation_history VALUES (?, ?)",
+                                 [(1840094972, json.dumps(history)), (1, "损坏的数据")])
+            assert await migrate(path, CONVERSATION_MIGRATIONS) == max(m[0] for m in CONVERSATION_MIGRATIONS)
+            with sqlite3.connect(path) as conn:
+                rows = conn.execute("SELECT user_id, seq, role, parts FROM conversation_turns ORDER BY seq").fetchall()
+                tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+                blobs = conn.execute("SELECT hash, data FROM blobs").fetchall()
+            assert [(user_id, seq) for user_id, seq, _, _ in rows] == [(1840094972, seq) for seq in range(1, 5)]
+            assert [{"role": role, **json.loads(parts)} for _, _, role, parts in rows[:2]] == history[:2], rows
+            assert all(image not in parts for *_, parts in rows)
+            assert len(blobs) == 1 and base64.b64encode(blobs[0][1]).decode() == image
+            assert "conversation_history" not in tables
+            with sqlite3.connect(path) as conn:
+                conn.execute("DELETE FROM conversation_turns WHERE seq = 3")
+                assert conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 1
+                conn.execute("DELETE FROM conversation_turns WHERE seq = 4")
+                assert conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 0
+            print("conversation_turns 表: 通过")
+
+            # 迁移失败时回滚，版本号不前进
+            async def _broken(db):
+                await db.execute("CREATE TABLE half_done (id INTEGER)")
+                raise RuntimeError("模拟迁移失败")
+
+            path = os.path.join(tmp, "broken.db")
+            try:
+                await migrate(path, CHARA_MIGRATIONS + [(2, "失败的迁移", _broken)])
+            except RuntimeError:
+                pass
+            assert "half_done" not in [row[0] for row in sqlite3.connect(path).execute(
+                "SELECT name FROM sqlite_master WHERE type='table'")]
+            assert await migrate(path, CHARA_MIGRATIONS) == 1
+            print("失败回滚: 通过")
+
+    asyncio.run(_check())
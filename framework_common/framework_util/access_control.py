@@ -0,0 +1,100 @@
+#黑白名单判断。把 common_config 中的黑白名单编译成不可变快照，配置保存后自动重建
+from typing import Any, Optional
+
+ABSENT = object()  # 事件没有 group_id / user_id 字段时使用
+
+
+class AccessSnapshot:
+    """
+    某一时刻的黑白名单快照，创建后不再修改，可以在任意协程/线程中直接读取。
+    """
+    __slots__ = ("revision", "group_logic", "user_logic", "groups", "users")
+
+    def __init__(self, revision: int, group_logic: str, user_logic: str, groups: frozenset, users: frozenset):
+        self.revision = revision
+        self.group_logic = group_logic
+        self.user_logic = user_logic
+        self.groups = groups  # 当前模式下生效的名单，blacklist 模式为黑名单，whitelist 模式为白名单
+        self.users = users
+
+    @classmethod
+    def from_config(cls, config) -> "AccessSnapshot":
+        common_config = config.common_config
+        basic_config = common_config.basic_config
+        group_logic = basic_config["group_handle_logic"]
+        user_logic = basic_config["user_handle_logic"]
+        groups = frozenset(common_config.censor_group.get(group_logic) or []) if group_logic in ("blacklist", "whitelist") else frozenset()
+        users = frozenset(common_config.censor_user.get(user_logic) or []) if user_logic in ("blacklist", "whitelist") else frozenset()
+        return cls(getattr(config, "revision", 0), group_logic, user_logic, groups, users)
+
+    def check(self, group_id: Any = ABSENT, user_id: Any = ABSENT) -> Optional[str]:
+        """
+        判断事件是否放行。
+        :return: None 表示放行，否则为拦截原因
+        """
+        if group_id is not ABSENT:
+            if self.group_logic == "blacklist":
+                if group_id in self.groups:
+                    return f"群{group_id}在黑名单中，跳过处理。"
+            elif self.group_logic == "whitelist":
+                if group_id not in self.groups:
+                    return f"群{group_id}不在白名单中，跳过处理。"
+            else:
+                return f"未知的 group_handle_logic: {self.group_logic}，跳过处理。"
+        if user_id is not ABSENT:
+            if self.user_logic == "blacklist":
+                if user_id in self.users:
+                    return f"用户{user_id}在黑名单中，跳过处理。"
+            elif self.user_logic == "whitelist":
+                if user_id not in self.users:
+                    return f"用户{user_id}不在白名单中，跳过处理。"
+            else:
+                return f"未知的 user_handle_logic: {self.user_logic}，跳过处理。"
+        return None
+
+
+class AccessControl:
+    """
+    持有当前生效的 AccessSnapshot。YAMLManager 每次保存配置都会递增 revision，
+    检测到变化时重新编译快照并整体替换引用，读者不会看到构建了一半的名单。
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._snapshot = AccessSnapshot.from_config(config)
+
+    @property
+    def snapshot(self) -> AccessSnapshot:
+        snapshot = self._snapshot
+        if snapshot.revision != getattr(self.config, "revision", 0):
+            snapshot = AccessSnapshot.from_config(self.config)
+            self._snapshot = snapshot
+        return snapshot
+
+    def check(self, group_id: Any = ABSENT, user_id: Any = ABSENT) -> Optional[str]:
+        return self.snapshot.check(group_id, user_id)
+
+    def check_event(self, event) -> Optional[str]:
+        """按事件携带的 group_id / user_id 字段判断，字段不存在时不参与判断。"""
+        return self.snapshot.check(getattr(event, "group_id", ABSENT), getattr(event, "user_id", ABSENT))
+
+
+# 微基准：名单长度从 10 增加到 100000，单次判断耗时应保持不变
+# 在仓库根目录运行：python -m framework_common.framework_util.access_control
+if __name__ == "__main__":
+    import timeit
+
+    class _Config:
+        def __init__(self, size):
+            self.revision = 0
+            self.common_config = type("common_config", (), {
+                "basic_config": {"group_handle_logic": "blacklist", "user_handle_logic": "whitelist"},
+                "censor_group": {"blacklist": list(range(size)), "whitelist": []},
+                "censor_user": {"blacklist": [], "whitelist": list(range(size))},
+            })
+
+    for size in (10, 1000, 100000):
+        access_control = AccessControl(_Config(size))
+        number = 200000
+        cost = timeit.timeit(lambda: access_control.check(size + 1, size - 1), number=number)
+        print(f"名单长度 {size:>6}: {cost / number * 1e9:.1f} ns/次")
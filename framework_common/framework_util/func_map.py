@@ -1,49 +1,38 @@
 #为func_calling提供函数映射
-import importlib
+import asyncio
+import copy
 import inspect
-import os
-import traceback
+import json
+import re
 
 from developTools.utils.logger import get_logger
+from framework_common.database_util.cache import MISSING, TTLCache
+from framework_common.framework_util.func_registry import get_registry
 
 logger=get_logger()
-PLUGIN_DIR = "run"
-dynamic_imports = {}
-
-for root, dirs, files in os.walk(PLUGIN_DIR):
-    # 检查路径中是否包含 service 文件夹
-    if "service" in root.split(os.sep):
-        continue
-
-    if "__init__.py" in files:
-        module_name = root.replace(os.sep, ".")
-        try:
-            module = importlib.import_module(module_name)
-            if hasattr(module, "dynamic_imports"):
-                dynamic_imports.update(module.dynamic_imports)
-                logger.info(f"✅ 函数调用映射加载成功: {module_name}.dynamic_imports")
-            else:
-                logger.warning(f"⚠️ {module_name} 未定义 dynamic_imports")
-        except Exception as e:
-            logger.error(f"❌ 无法导入 {module_name}: {e}")
-            traceback.print_exc()
-
-loaded_functions = {}
-
-
-# 动态导入
-for module_name, functions in dynamic_imports.items():
-    try:
-        module = importlib.import_module(module_name)  # 动态导入模块
-        for func in functions:
-            if hasattr(module, func):
-                loaded_functions[func] = getattr(module, func)  # 存入字典
-                #logger.info(f"✅ 成功加载 {module_name}.{func}")
-            else:
-                logger.warning(f"⚠️ {module_name} 中不存在 {func}")
-    except Exception as e:
-        logger.error(f"❌ 无法导入模块 {module_name}: {e}")
-        traceback.print_exc()
+
+RESULT_CACHE_SIZE = 256  # 每个可缓存函数保留的结果数
+
+# 函数名 -> 结果缓存，按各函数声明的 cache_ttl 创建
+_result_caches: dict[str, TTLCache] = {}
+# 正在执行的可缓存调用，同一轮里参数相同的调用只执行一次
+_inflight: dict[tuple, asyncio.Future] = {}
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def cache_key(func_name, params, user_id=None) -> tuple:
+    """参数去掉首尾空白、合并连续空白、忽略值为 None 的参数，并按键排序"""
+    return func_name, user_id, json.dumps(_normalize(params), sort_keys=True, ensure_ascii=False)
+
 
 async def call_quit_chat(bot, event, config):
     return False
@@ -52,6 +41,11 @@ async def call_func(bot, event, config, func_name, params):
     """
     动态调用已导入的函数。
 
+    插件可在 function_options 中为函数声明：
+        timeout: 超时秒数，超时抛出 asyncio.TimeoutError
+        cache_ttl: 结果缓存秒数，只适用于不发送消息、只返回结果的查询类函数
+        cache_per_user: 结果与调用者有关（如默认查询用户所在城市）时为 True
+
     参数:
         func_name (str): 函数名。
         params (dict): 函数参数字典。
@@ -61,11 +55,12 @@ async def call_func(bot, event, config, func_name, params):
     """
     print(f"Calling function '{func_name}' with parameters: {params}")
 
-    # **改成从 `loaded_functions` 获取函数**
-    func = loaded_functions.get(func_name)
+    registry = get_registry()
+    # 函数所在模块在第一次调用时才导入，见 func_registry
+    func = registry.resolve(func_name)
 
     if func is None:
-        raise ValueError(f"Function '{func_name}' not found in loaded_functions.")
+        raise ValueError(f"Function '{func_name}' not found in func_registry.")
 
     # 检查是否为可调用对象
     if not callable(func):
@@ -75,5 +70,108 @@ async def call_func(bot, event, config, func_name, params):
     if not inspect.iscoroutinefunction(func):
         raise TypeError(f"'{func_name}' is not an async function.")
 
-    # 调用函数并传入参数
-    return await func(bot, event, config, **params)
+    options = registry.options.get(func_name, {})
+    timeout = options.get("timeout")
+    ttl = options.get("cache_ttl")
+    if not ttl:
+        # 调用函数并传入参数
+        return await asyncio.wait_for(func(bot, event, config, **params), timeout)
+
+    cache = _result_caches.get(func_name)
+    if cache is None or cache.ttl != ttl:
+        cache = _result_caches[func_name] = TTLCache(RESULT_CACHE_SIZE, ttl)
+    key = cache_key(func_name, params, getattr(event, "user_id", None) if options.get("cache_per_user") else None)
+    result = cache.get(key)
+    if result is not MISSING:
+        logger.info(f"函数 {func_name} 命中缓存")
+        return copy.deepcopy(result)
+    future = _inflight.get(key)
+    if future is not None:
+        return copy.deepcopy(await asyncio.shield(future))
+
+    future = _inflight[key] = asyncio.get_running_loop().create_future()
+    try:
+        result = await asyncio.wait_for(func(bot, event, config, **params), timeout)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # 没有等待者时不报 "exception was never retrieved"
+        raise
+    else:
+        future.set_result(result)
+        if result:  # 失败时多返回空值，不缓存
+            cache.set(key, copy.deepcopy(result))
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
+async def call_funcs(bot, event, config, calls):
+    """
+    并发执行同一轮的多个函数调用，总耗时约等于最慢的一个。
+    :param calls: [(函数名, 参数)]，参数可以是 dict 或 JSON 字符串
+    :return: 与 calls 顺序一致的结果列表，出错的调用对应位置为异常对象
+    """
+    async def _call(func_name, params):
+        if isinstance(params, str):
+            params = json.loads(params)
+        return await call_func(bot, event, config, func_name, params)
+
+    return await asyncio.gather(*(_call(func_name, params) for func_name, params in calls), return_exceptions=True)
+
+
+# 基准：模拟一轮里模型同时调用三个查询函数（耗时 0.3/0.5/0.8 秒），对比逐个调用与并发调用，再看重复的天气、搜索命中缓存的耗时
+# 在仓库根目录运行：python -m framework_common.framework_util.func_map
+if __name__ == "__main__":
+    import time
+
+    from framework_common.framework_util import func_registry
+
+    class _Event:
+        user_id = 1
+
+    def _fake_tool(seconds):
+        async def tool(bot, event, config, query=None):
+            await asyncio.sleep(seconds)
+            calls[0] += 1
+            return {"result": f"{query} 的结果"}
+        return tool
+
+    async def _bench():
+        registry = func_registry._registry = func_registry.FuncRegistry(plugin_dir="/nonexistent", cache_file=None)
+        for name, seconds in (("weather", 0.3), ("search", 0.5), ("bangumi", 0.8)):
+            registry.loaded[name] = _fake_tool(seconds)
+        registry.loaded["slow"] = _fake_tool(5)
+        registry.options.update(weather={"cache_ttl": 60, "cache_per_user": True}, search={"cache_ttl": 60},
+                                slow={"timeout": 0.2})
+        batch = [("weather", {"query": "通辽"}), ("search", '{"query": "今天的新闻"}'), ("bangumi", {"query": "进击的巨人"})]
+
+        start = time.perf_counter()
+        for name, params in batch:
+            await call_func(None, _Event, None, name, json.loads(params) if isinstance(params, str) else params)
+        print(f"逐个调用: {time.perf_counter() - start:.2f}秒")
+        for cache in _result_caches.values():
+            cache.clear()
+
+        start = time.perf_counter()
+        results = await call_funcs(None, _Event, None, batch)
+        print(f"并发调用: {time.perf_counter() - start:.2f}秒")
+        assert [r["result"] for r in results] == ["通辽 的结果", "今天的新闻 的结果", "进击的巨人 的结果"]
+
+        calls[0] = 0
+        start = time.perf_counter()
+        await call_funcs(None, _Event, None, [("weather", {"query": " 通辽 "}), ("search", {"query": "今天的新闻", "page": None})])
+        print(f"再次提问（命中缓存）: {time.perf_counter() - start:.2f}秒")
+        assert calls[0] == 0
+
+        # 同一轮里参数相同的调用只执行一次；超时与参数错误只影响各自的调用
+        calls[0] = 0
+        results = await call_funcs(None, _Event, None, [("search", {"query": "新的问题"}), ("search", {"query": "新的问题"}),
+                                                        ("slow", {}), ("weather", "{bad json")])
+        assert calls[0] == 1 and results[0] == results[1]
+        assert isinstance(results[2], asyncio.TimeoutError) and isinstance(results[3], json.JSONDecodeError)
+
+    calls = [0]
+    asyncio.run(_bench())
@@ -0,0 +1,237 @@
+"""
+函数调用注册表，func_map（调用）与 func_map_loader（提供给模型的函数声明）共用。
+
+插件在 run/<插件>/__init__.py 中用字面量声明：
+    dynamic_imports = {"run.xxx.module": ["call_xxx", ...]}
+    function_declarations = [{"name": "call_xxx", "description": ..., "parameters": ...}]
+    function_options = {"call_xxx": {"timeout": 30, "cache_ttl": 600, "cache_per_user": True}}  # 可选，见 func_map.call_func
+启动时只解析这些文件（不执行，也不导入插件模块），函数在第一次被调用时才导入所在模块。
+解析结果与转换好的 gemini / openai 声明缓存在 CACHE_FILE，所有 __init__.py 的修改时间不变时直接读取缓存。
+"""
+
+import ast
+import copy
+import importlib
+import os
+import traceback
+from typing import Callable, Optional
+
+from developTools.utils import fast_json
+from developTools.utils.logger import get_logger
+
+logger = get_logger()
+
+PLUGIN_DIR = "run"
+CACHE_FILE = "data/dataBase/func_registry.json"
+CACHE_VERSION = 2
+MANIFEST_NAMES = ("dynamic_imports", "function_declarations", "function_options")
+
+
+def convert_gemini_to_openai(gemini_tools):
+    openai_functions = []
+
+    for tool in gemini_tools:
+        #print(tool)
+        openai_function = {
+            "type": "function",
+            "function": {
+                "name": tool.get("name"),
+                "description": tool.get("description", ""),
+                "parameters": copy.deepcopy(tool.get("parameters", {}))
+            }
+        }
+
+        # Ensure 'parameters' has all required fields for OpenAI format
+        if "parameters" in openai_function["function"].keys():
+            parameters = openai_function["function"]["parameters"]
+            parameters.setdefault("type", "object")
+            parameters.setdefault("properties", {})
+            parameters.setdefault("required", [])
+            parameters["additionalProperties"] = False
+
+        openai_functions.append(openai_function)
+
+    return openai_functions
+
+
+def find_manifests(plugin_dir: str = PLUGIN_DIR) -> dict[str, int]:
+    """插件包的 __init__.py 及其修改时间，service 目录不是插件，跳过"""
+    manifests = {}
+    for root, dirs, files in os.walk(plugin_dir):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__" and d != "service")
+        if "__init__.py" in files:
+            path = os.path.join(root, "__init__.py")
+            manifests[path] = os.stat(path).st_mtime_ns
+    return manifests
+
+
+def read_manifest(path: str) -> dict:
+    """取出 __init__.py 中的 dynamic_imports、function_declarations 与 function_options；不是字面量时退回导入该包"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    manifest = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            continue
+        for target in targets:
+            if isinstance(target, ast.Name) and target.id in MANIFEST_NAMES:
+                try:
+                    manifest[target.id] = ast.literal_eval(value)
+                except ValueError:
+                    module = importlib.import_module(os.path.dirname(path).replace(os.sep, "."))
+                    return {name: getattr(module, name) for name in MANIFEST_NAMES if hasattr(module, name)}
+    return manifest
+
+
+class FuncRegistry:
+    def __init__(self, plugin_dir: str = PLUGIN_DIR, cache_file: Optional[str] = CACHE_FILE):
+        self.modules: dict[str, str] = {}  # 函数名 -> 所在模块
+        self.declarations: list[dict] = []
+        self.openai_declarations: list[dict] = []
+        self.options: dict[str, dict] = {}  # 函数名 -> 超时、缓存等选项
+        self.loaded: dict[str, Callable] = {}
+        self._load(plugin_dir, cache_file)
+
+    def _load(self, plugin_dir: str, cache_file: Optional[str]):
+        manifests = find_manifests(plugin_dir)
+        cached = self._read_cache(cache_file)
+        if cached is not None and cached.get("version") == CACHE_VERSION and cached.get("files") == manifests:
+            self.modules = cached["modules"]
+            self.declarations = cached["gemini"]
+            self.openai_declarations = cached["openai"]
+            self.options = cached["options"]
+            logger.info(f"函数调用映射已从缓存加载：{len(self.modules)} 个函数")
+            return
+        for path in manifests:
+            try:
+                manifest = read_manifest(path)
+            except Exception as e:
+                logger.error(f"❌ 无法读取 {path}: {e}")
+                traceback.print_exc()
+                continue
+            for module_name, functions in manifest.get("dynamic_imports", {}).items():
+                for func in functions:
+                    self.modules[func] = module_name
+            self.declarations.extend(manifest.get("function_declarations", []))
+            self.options.update(manifest.get("function_options", {}))
+        self.openai_declarations = convert_gemini_to_openai(self.declarations)
+        logger.info(f"函数调用映射加载成功：{len(manifests)} 个插件，{len(self.modules)} 个函数")
+        if cache_file:
+            self._write_cache(cache_file, {"version": CACHE_VERSION, "files": manifests, "modules": self.modules,
+                                           "gemini": self.declarations, "openai": self.openai_declarations,
+                                           "options": self.options})
+
+    @staticmethod
+    def _read_cache(cache_file: Optional[str]) -> Optional[dict]:
+        if not cache_file or not os.path.exists(cache_file):
+            return None
+        try:
+            with open(cache_file, "rb") as f:
+                return fast_json.loads(f.read())
+        except Exception as e:
+            logger.warning(f"函数调用映射缓存无法读取，重新生成: {e}")
+            return None
+
+    @staticmethod
+    def _write_cache(cache_file: str, data: dict):
+        try:
+            os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+            tmp = f"{cache_file}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(fast_json.dumps(data))
+            os.replace(tmp, cache_file)
+        except Exception as e:
+            logger.warning(f"函数调用映射缓存写入失败: {e}")
+
+    def resolve(self, func_name: str) -> Optional[Callable]:
+        """返回函数，第一次调用时导入所在模块；未声明或模块中不存在时返回 None，模块导入失败时抛出异常"""
+        func = self.loaded.get(func_name)
+        if func is not None:
+            return func
+        module_name = self.modules.get(func_name)
+        if module_name is None:
+            return None
+        module = importlib.import_module(module_name)
+        func = getattr(module, func_name, None)
+        if func is None:
+            logger.warning(f"⚠️ {module_name} 中不存在 {func_name}")
+            return None
+        self.loaded[func_name] = func
+        return func
+
+    def gemini_tools(self) -> dict:
+        """调用方可能修改返回值（如加入表情包函数），每次返回副本"""
+        return {"function_declarations": copy.deepcopy(self.declarations)}
+
+    def openai_tools(self) -> list:
+        return copy.deepcopy(self.openai_declarations)
+
+
+_registry: Optional[FuncRegistry] = None
+
+
+def get_registry() -> FuncRegistry:
+    global _registry
+    if _registry is None:
+        _registry = FuncRegistry()
+    return _registry
+
+
+# 基准：分别在新的解释器中加载函数调用映射，对比原来导入全部插件包与函数模块、首次解析清单、读取缓存的耗时与常驻内存
+# 在仓库根目录运行：python -m framework_common.framework_util.func_registry
+if __name__ == "__main__":
+    import subprocess
+    import sys
+    import tempfile
+
+    EAGER = """
+import importlib, os
+for root, dirs, files in os.walk("run"):
+    if "__init__.py" in files:
+        try:
+            module = importlib.import_module(root.replace(os.sep, "."))
+        except Exception:
+            continue
+        for module_name in getattr(module, "dynamic_imports", {}):
+            try:
+                importlib.import_module(module_name)
+            except Exception:
+                pass
+"""
+    LAZY = """
+from framework_common.framework_util import func_registry
+registry = func_registry.FuncRegistry(cache_file={cache!r})
+registry.gemini_tools(), registry.openai_tools()
+"""
+    MEASURE = """
+import resource, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+    ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def _measure(code):
+        result = subprocess.run([sys.executable, "-c", MEASURE, code], capture_output=True, text=True,
+                                env={**os.environ, "PYTHONPATH": ROOT})
+        seconds, rss = result.stdout.strip().splitlines()[-1].split()
+        return float(seconds), int(rss) / 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, "func_registry.json")
+        for name, code in (("导入全部插件模块", EAGER), ("解析清单（无缓存）", LAZY.format(cache=cache)),
+                           ("读取缓存", LAZY.format(cache=cache))):
+            seconds, rss = _measure(code)
+            print(f"{name}: {seconds:.2f}秒，常驻内存峰值 {rss:.0f}MB")
+
+        registry = FuncRegistry(cache_file=cache)
+        fresh = FuncRegistry(cache_file=None)
+        assert registry.modules == fresh.modules and registry.openai_tools() == fresh.openai_tools()
+        assert registry.options == fresh.options and set(registry.options) <= set(registry.modules)
+        assert {tool["name"] for tool in registry.gemini_tools()["function_declarations"]} <= set(registry.modules)
+        assert not registry.loaded
@@ -1,21 +1,45 @@
 #实现黑白名单判断，后续aiReplyCore的阻断也将在这里实现
 import asyncio
-import json
 from typing import Union
 
 import websockets
 
+from developTools.adapters.api_multiplexer import ApiMultiplexer
 from developTools.adapters.websocket_adapter import WebSocketBot
 from developTools.event.base import EventBase
 from developTools.event.eventFactory import EventFactory
+from developTools.event.scheduler import EventScheduler, DEFAULT_LANE, HEAVY_LANE
 from developTools.message.message_components import MessageComponent, Reply, Text, Music, At, Poke, File, Node
+from developTools.utils import fast_json
+from framework_common.database_util import cache, db_pool, group_buffer
+from framework_common.framework_util.access_control import AccessControl
+from framework_common.utils import http_clients
 
 
 class ExtendBot(WebSocketBot):
     def __init__(self, uri: str, config, **kwargs):
-        super().__init__(uri, **kwargs)
+        scheduler_config = config.common_config.basic_config.get("event_scheduler") or {}
+        scheduler = EventScheduler(
+            lane_limits={DEFAULT_LANE: scheduler_config.get("default_lane_limit", 64),
+                         HEAVY_LANE: scheduler_config.get("heavy_lane_limit", 8)},
+            group_queue_size=scheduler_config.get("group_queue_size", 30),
+            group_concurrency=scheduler_config.get("group_concurrency", 8),
+            overflow_policy=scheduler_config.get("overflow_policy", "coalesce"),
+        )
+        api_limit_config = config.common_config.basic_config.get("api_limit") or {}
+        api_mux = ApiMultiplexer(
+            max_inflight=api_limit_config.get("max_inflight", 32),
+            rate_limits=api_limit_config.get("rate_limits"),
+        )
+        super().__init__(uri, scheduler=scheduler, api_mux=api_mux, **kwargs)
         self.config = config
+        self.access_control = AccessControl(config)
         self.id = 1000000
+        self.on_shutdown(db_pool.close_all)
+        self.on_shutdown(http_clients.close_all)
+        self.on_shutdown(cache.close_all)
+        # 按注册的相反顺序执行，群消息缓冲先于关闭连接池写入数据库
+        self.on_shutdown(group_buffer.flush_all)
 
     async def _receive(self):
         """
@@ -23,16 +47,15 @@ class ExtendBot(WebSocketBot):
         """
         try:
             async for response in self.websocket:
-                data = json.loads(response)
+                if self._skip_heartbeat(response):
+                    continue
+                data = fast_json.loads(response)
                 #self.logger.info(f"收到服务端响应: {data},{type(data)}")
-                if 'heartbeat' not in str(data):
+                if data.get("meta_event_type") != "heartbeat":
                     self.logger.info_msg(f"收到服务端响应: {data}")
                 # 如果是响应消息
                 if "status" in data and "echo" in data:
-                    echo = data["echo"]
-                    future = self.response_callbacks.pop(echo, None)
-                    if future and not future.done():
-                        future.set_result(data)
+                    self.api_mux.resolve(data)
                 elif "post_type" in data:
                     event_obj = EventFactory.create_event(data)
                     try:
@@ -44,52 +67,12 @@ class ExtendBot(WebSocketBot):
                                 self.logger.info(f"Bot ID: {self.id},{type(self.id)}")
                     except:
                         pass
-                    if hasattr(event_obj, "group_id"):
-                        if self.config.common_config.basic_config["group_handle_logic"] == "blacklist":
-                            if event_obj.group_id not in self.config.common_config.censor_group["blacklist"]:
-                                if hasattr(event_obj, "user_id"):
-                                    if self.config.common_config.basic_config["user_handle_logic"] == "blacklist":
-                                        if event_obj.user_id not in self.config.common_config.censor_user["blacklist"]:
-                                            asyncio.create_task(self.event_bus.emit(event_obj))
-                                        else:
-                                            self.logger.info(f"用户{event_obj.user_id}在黑名单中，跳过处理。")
-                                    elif self.config.common_config.basic_config["user_handle_logic"] == "whitelist":
-                                        if event_obj.user_id in self.config.common_config.censor_user["whitelist"]:
-                                            asyncio.create_task(self.event_bus.emit(event_obj))
-                                        else:
-                                            self.logger.info(f"用户{event_obj.user_id}不在白名单中，跳过处理。")
-                                else:
-                                    asyncio.create_task(self.event_bus.emit(event_obj))
-                            else:
-                                self.logger.info(f"群{event_obj.group_id}在黑名单中，跳过处理。")
-                        elif self.config.common_config.basic_config["group_handle_logic"] == "whitelist":
-                            if event_obj.group_id in self.config.common_config.censor_group["whitelist"]:
-                                if hasattr(event_obj, "user_id"):
-                                    if self.config.common_config.basic_config["user_handle_logic"] == "blacklist":
-                                        if event_obj.user_id not in self.config.common_config.censor_user["blacklist"]:
-                                            asyncio.create_task(self.event_bus.emit(event_obj))
-                                        else:
-                                            self.logger.info(f"用户{event_obj.user_id}在黑名单中，跳过处理。")
-                                    elif self.config.common_config.basic_config["user_handle_logic"] == "whitelist":
-                                        if event_obj.user_id in self.config.common_config.censor_user["whitelist"]:
-                                            asyncio.create_task(self.event_bus.emit(event_obj))
-                                        else:
-                                            self.logger.info(f"用户{event_obj.user_id}不在白名单中，跳过处理。")
-                                else:
-                                    asyncio.create_task(self.event_bus.emit(event_obj))
-                            else:
-                                self.logger.info(f"群{event_obj.group_id}不在白名单中，跳过处理。")
-                    elif hasattr(event_obj, "user_id"):
-                        if self.config.common_config.basic_config["user_handle_logic"] == "blacklist":
-                            if event_obj.user_id not in self.config.common_config.censor_user["blacklist"]:
-                                asyncio.create_task(self.event_bus.emit(event_obj))
-                            else:
-                                self.logger.info(f"用户{event_obj.user_id}在黑名单中，跳过处理。")
-                        elif self.config.common_config.basic_config["user_handle_logic"] == "whitelist":
-                            if event_obj.user_id in self.config.common_config.censor_user["whitelist"]:
-                                asyncio.create_task(self.event_bus.emit(event_obj))
-                            else:
-                                self.logger.info(f"用户{event_obj.user_id}不在白名单中，跳过处理。")
+                    if event_obj and (hasattr(event_obj, "group_id") or hasattr(event_obj, "user_id")):
+                        reject_reason = self.access_control.check_event(event_obj)
+                        if reject_reason is None:
+                            asyncio.create_task(self.event_bus.emit(event_obj))
+                        else:
+                            self.logger.info(reject_reason)
                     elif event_obj:
                         asyncio.create_task(self.event_bus.emit(event_obj))  #不能await，
                     else:
@@ -105,10 +88,7 @@ class ExtendBot(WebSocketBot):
             self.logger.error(f"接收消息时发生错误: {e}", exc_info=True)
         finally:
             # 取消所有未完成的 Future
-            for future in self.response_callbacks.values():
-                if not future.done():
-                    future.cancel()
-            self.response_callbacks.clear()
+            self.api_mux.cancel_all()
             self.receive_task = None
 
     async def send(self, event: EventBase, components: list[Union[MessageComponent, str]], Quote: bool = False):
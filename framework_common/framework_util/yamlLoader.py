@@ -16,6 +16,7 @@ class YAMLManager:
         self.yaml = YAML()
         self.data = {}  # 存储所有加载的 YAML 数据
         self.file_paths = {}  # 配置文件名到路径的映射
+        self.revision = 0  # 每次保存配置时自增，供缓存了配置派生数据的模块判断是否需要重建
 
         # 加载 run 目录下的 YAML 文件
         run_dir = os.path.join(os.getcwd(), plugins_dir or "run")
@@ -100,6 +101,7 @@ class YAMLManager:
 
         with open(file_path, 'w', encoding='utf-8') as file:
             self.yaml.dump(data, file)
+        self.revision += 1
 
     def __getattr__(self, name: str):
         """
@@ -142,7 +144,7 @@ class YAMLManager:
         :param name: 属性名（插件名或配置文件名）
         :param value: 新值
         """
-        if name in ["yaml", "data", "file_paths", "_instance", "_lock"]:
+        if name in ["yaml", "data", "file_paths", "revision", "_instance", "_lock"]:
             super().__setattr__(name, value)
         elif name in self.data and not isinstance(self.data[name], dict):  # 直接在 run 目录下的 YAML 文件
             self.data[name] = value
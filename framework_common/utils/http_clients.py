@@ -0,0 +1,115 @@
+import asyncio
+from typing import Optional
+
+import httpx
+
+from developTools.utils.logger import get_logger
+
+# 可选依赖：安装了 h2 时对支持的服务端使用 HTTP/2，否则只用 HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+logger = get_logger()
+
+CONNECT_TIMEOUT = 10  # 建立连接（含 TLS 握手、代理）的超时
+READ_TIMEOUT = 200  # 等待响应的超时，大模型生成较慢，默认给足
+# 每个客户端只对应一个服务端，因此连接数上限即单个 host 的并发上限
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+
+def timeout(read: Optional[float] = READ_TIMEOUT, connect: float = CONNECT_TIMEOUT) -> httpx.Timeout:
+    """连接与读取分开计时：服务端不可达时很快失败，生成较慢时也不会被误判超时。read 为 None 表示不限制"""
+    return httpx.Timeout(connect=connect, read=read, write=connect * 3, pool=connect * 3)
+
+
+def origin(url: str) -> str:
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.netloc.decode('ascii')}"
+
+
+# httpx 的连接池与事件循环绑定，主 bot 与 WebUI bot 各用各的客户端
+_clients: dict[tuple[str, Optional[str], asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+
+
+def get_client(url: str, proxy: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    获取 url 所在服务端共用的客户端，按 (协议+域名+端口, 代理) 区分，长连接在各次请求之间复用。
+    请求时仍传完整 url，鉴权等请求头按请求传入：
+        r = await get_client(url, proxy).post(url, json=data, headers=headers, timeout=timeout(100))
+    不要对返回的客户端使用 async with 或 aclose，退出时由 close_all 统一关闭。
+    """
+    proxy = proxy or None
+    key = (origin(url), proxy, asyncio.get_running_loop())
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        kwargs = dict(http2=HTTP2, limits=LIMITS, timeout=timeout())
+        try:
+            client = httpx.AsyncClient(proxy=proxy, **kwargs)
+        except TypeError:  # httpx < 0.26 只有 proxies 参数
+            client = httpx.AsyncClient(proxies=proxy, **kwargs)
+        _clients[key] = client
+    return client
+
+
+async def close_all():
+    """关闭当前事件循环中的所有客户端"""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _clients if key[2] is loop]:
+        client = _clients.pop(key)
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"关闭 {key[0]} 的 HTTP 客户端失败: {e}")
+
+
+# 基准：本地模拟服务端，对比每次请求新建客户端与复用共享客户端的每秒请求数
+# 在仓库根目录运行：python -m framework_common.utils.http_clients
+if __name__ == "__main__":
+    import time
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        body = b'{"choices": [{"message": {"role": "assistant", "content": "ok"}}]}'
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _bench(number=500):
+        server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/chat/completions"
+        data = {"model": "bench", "messages": [{"role": "user", "content": "你好"}]}
+        headers = {"Authorization": "Bearer bench"}
+
+        start = time.perf_counter()
+        for _ in range(number):
+            async with httpx.AsyncClient(headers=headers, timeout=200) as client:
+                (await client.post(url, json=data)).json()
+        print(f"每次新建客户端: {number / (time.perf_counter() - start):.0f} 次/秒")
+
+        start = time.perf_counter()
+        for _ in range(number):
+            (await get_client(url).post(url, json=data, headers=headers)).json()
+        print(f"共享客户端: {number / (time.perf_counter() - start):.0f} 次/秒")
+
+        assert get_client(url) is get_client(url.replace("/v1/chat/completions", "/v1/models"))
+        assert get_client(url) is not get_client(url, "http://127.0.0.1:7890")
+        await close_all()
+        assert not _clients
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_bench())
@@ -0,0 +1,137 @@
+"""
+对话 token 计数。依次尝试：
+
+1. data/system/tokenizer.json：本地的 HuggingFace tokenizers 词表（需安装 tokenizers），与所用模型一致时最准确
+2. tiktoken 的 o200k_base（需安装 tiktoken 且本地已缓存编码文件）
+3. 按字符类别估算：汉字、假名、谚文每字约 1 个 token，英文单词约 1 个，长单词与长数字按长度折算
+
+也可以用 set_counter 换成其他实现。同一段文本的结果会缓存，历史记录中反复出现的内容不会重复计数。
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from developTools.utils.logger import get_logger
+
+logger = get_logger()
+
+TOKENIZER_FILE = "data/system/tokenizer.json"
+TIKTOKEN_ENCODING = "o200k_base"
+TEXT_CACHE_SIZE = 8192
+# 图片、音视频等内联数据按固定值计（gemini 每张图片约 258 token），不按 base64 长度计
+MEDIA_TOKENS = 258
+MEDIA_KEYS = ("inline_data", "image_url", "input_audio", "file_data")
+
+# 估算用的字符类别：CJK 单字、英文字母串、数字串、其他文字（西里尔、带重音的拉丁字母等）、标点符号
+TOKEN_PATTERN = re.compile(
+    r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])|([A-Za-z]+)|(\d+)|([^\W\d_]+)|([^\s])")
+# 与 o200k / cl100k 的切分对照得到的近似值：常见英文单词多为 1 个 token，更长的每 8 个字母再加 1 个；
+# 数字每 3 位 1 个；其他文字约每 3 个字符 1 个
+WORD_LETTERS = 8
+DIGITS = 3
+OTHER_LETTERS = 3
+
+
+def estimate_text_tokens(text: str) -> int:
+    """不依赖词表的估算"""
+    tokens = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastindex
+        length = match.end() - match.start()
+        if kind == 2:
+            tokens += 1 + (length - 1) // WORD_LETTERS
+        elif kind == 3:
+            tokens += -(-length // DIGITS)
+        elif kind == 4:
+            tokens += -(-length // OTHER_LETTERS)
+        else:
+            tokens += 1
+    return tokens
+
+
+def _load_counter() -> tuple[str, Callable[[str], int]]:
+    if os.path.exists(TOKENIZER_FILE):
+        try:
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(TOKENIZER_FILE)
+            return TOKENIZER_FILE, lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+        except Exception as e:
+            logger.warning(f"加载 {TOKENIZER_FILE} 失败，改用其他方式计数: {e}")
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        return f"tiktoken {TIKTOKEN_ENCODING}", lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        pass
+    return "estimate", estimate_text_tokens
+
+
+_counter: Optional[tuple[str, Callable[[str], int]]] = None
+
+
+def set_counter(name: str, counter: Callable[[str], int]):
+    """替换文本计数实现，已缓存的结果一并清空"""
+    global _counter
+    _counter = (name, counter)
+    count_text_tokens.cache_clear()
+
+
+def counter_name() -> str:
+    global _counter
+    if _counter is None:
+        _counter = _load_counter()
+    return _counter[0]
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def count_text_tokens(text: str) -> int:
+    global _counter
+    if not text:
+        return 0
+    if _counter is None:
+        _counter = _load_counter()
+        logger.info(f"token 计数方式: {_counter[0]}")
+    return _counter[1](text)
+
+
+def estimate_message_tokens(message: Any) -> int:
+    """估算一条对话记录（openai / gemini 格式的 dict）的 token 数"""
+    if isinstance(message, str):
+        return count_text_tokens(message)
+    if isinstance(message, dict):
+        return sum(MEDIA_TOKENS if key in MEDIA_KEYS else estimate_message_tokens(value)
+                   for key, value in message.items())
+    if isinstance(message, list):
+        return sum(estimate_message_tokens(item) for item in message)
+    return 0
+
+
+# 基准：40 轮对话的历史记录，每轮新增一条后重新计算整段历史，对比原来的正则计数与带缓存的计数
+# 在仓库根目录运行：python -m framework_common.utils.token_counter
+if __name__ == "__main__":
+    import time
+
+    def _old_count(text):
+        return len(re.findall(r"\w+|[^\w\s]", text, re.UNICODE)) + len(re.findall(r"[\u4e00-\u9fff]", text))
+
+    text = "今天天气不错，我们去公园散步吧！The quick brown fox jumps over the lazy dog, version 3.11.4. " * 20
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"{i} {text}"} for i in range(40)]
+    rounds = 200
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        sum(_old_count(message["content"]) for message in history)
+    print(f"正则计数: {rounds / (time.perf_counter() - start):.0f} 次/秒")
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        sum(estimate_message_tokens(message) for message in history)
+    print(f"带缓存计数（{counter_name()}）: {rounds / (time.perf_counter() - start):.0f} 次/秒")
+
+    # 与 o200k_base 的切分对照（hello world / 中文 / 数字）
+    assert estimate_text_tokens("hello world") == 2
+    assert estimate_text_tokens("你好，世界") == 5
+    assert estimate_text_tokens("1234567") == 3
+    assert estimate_message_tokens({"role": "user", "parts": [{"inline_data": {"data": "x" * 100000}}]}) == 1 + MEDIA_TOKENS
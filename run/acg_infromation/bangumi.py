@@ -61,7 +61,7 @@ def main(bot,config):
     scheduler = BackgroundScheduler()
     scheduler.add_job(run_async_task, trigger=CronTrigger(hour=0, minute=1))
     scheduler.start()
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, regex=r"^(?=.*(?:本季|季度|top|排行|本月))(?=.*(?:新番|番剧|动画|bangumi))")
     async def bangumi_search(event: GroupMessageEvent):
         context=event.pure_text
         if ("本季" in context or "季度" in context or "top" in context or "排行" in context or "本月" in context) and ("新番" in context or "番剧" in context or "动画" in context or "bangumi" in context):
@@ -156,7 +156,7 @@ def main(bot,config):
             await bot.send(event, "获取番剧信息失败，请稍后再试")
 
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, regex=r"^(?=.*今日)(?=.*(?:新番|番剧|动画|bangumi|放送))")
     async def bangumi_search_week(event: GroupMessageEvent):
         context=event.pure_text
         if ( "今日" in context) and ("新番" in context or "番剧" in context or "动画" in context or "bangumi" in context or "放送" in context):
@@ -172,7 +172,7 @@ def main(bot,config):
 
 
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, regex="查询")
     async def bangumi_search(event: GroupMessageEvent):
         botname = config.common_config.basic_config["bot"]
         context=event.pure_text
@@ -290,7 +290,7 @@ def main(bot,config):
                     searchtask.pop(event.sender.user_id)
                     await bot.send(event, "查询超时喵～")
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="今日热门")
     async def Bilibili_today_hot(event: GroupMessageEvent):
         file_path = 'data/pictures/wife_you_want_img/'
         output_path = f'{file_path}bili_today_hot_back_out.png'
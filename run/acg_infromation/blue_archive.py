@@ -18,7 +18,7 @@ def main(bot, config):
     activated=False
 
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix=("/攻略 ", "/arona "))
     async def selectMission(event: GroupMessageEvent):
         if str(event.pure_text).startswith("/攻略 "):
             url = event.pure_text.replace("/攻略 ", "")
@@ -72,7 +72,7 @@ def main(bot, config):
                                 yaml.dump(result9, file, allow_unicode=True)
             await sleep(600)  #600秒更新一次
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="/订阅")
     async def addSUBgroup(event: GroupMessageEvent):
         if event.pure_text == "/订阅日服":
             a = "日服"
@@ -104,7 +104,7 @@ def main(bot, config):
             logger.info_func(str(event.group_id) + "新增订阅")
             await bot.send(event, "成功订阅")
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact=("/arona", "/攻略"))
     async def aronad(event):
         if event.pure_text == "/arona" or event.pure_text == "/攻略":
             url = "杂图"
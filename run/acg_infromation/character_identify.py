@@ -29,7 +29,7 @@ def main(bot ,config):
 
     image_identify_list = {}
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, regex="识别", needs=("at", "image"))
     async def startYouridentify(event :GroupMessageEvent):
         nonlocal image_identify_list
         if event.pure_text=="识别" or (event.get("at") and event.get("at")[0]["qq"] == str(bot.id) and event.get("text") is not None and "识别" in event.get("text")[0]):
@@ -10,7 +10,7 @@ from run.acg_infromation.service.galgame import Get_Access_Token,Get_Access_Toke
 from run.streaming_media.service.Link_parsing.Link_parsing import gal_PILimg
 
 def main(bot,config):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, regex="gal|Gal|新作")
     async def galgame_group_reply(event: GroupMessageEvent):
         loop = asyncio.get_running_loop()
         with ThreadPoolExecutor() as executor:
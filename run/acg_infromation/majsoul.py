@@ -7,7 +7,7 @@ from run.streaming_media.service.Link_parsing.Link_parsing import majsoul_PILimg
 def main(bot, config):
     logger=bot.logger
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="雀魂")
     async def majsoul_personal_info_regiter(event: GroupMessageEvent):
         context=event.pure_text
         user_id = str(event.sender.user_id)
@@ -37,7 +37,7 @@ def main(bot, config):
             if message:
                 await bot.send(event, f"您当前绑定的雀魂账号：{majsoul_json['uesr_name']}\n{message}")
 
-    @bot.on(GroupMessageEvent)  # 个人雀魂信息查询
+    @bot.on(GroupMessageEvent, prefix="雀魂")  # 个人雀魂信息查询
     async def check_for_majsoul_personal_info_run(event: GroupMessageEvent):
         context=event.pure_text
         user_id = str(event.sender.user_id)
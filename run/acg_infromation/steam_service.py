@@ -6,7 +6,7 @@ from run.acg_infromation.func_collection import anime_game_service_func_collecti
 
 
 def main(bot, config):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="steam查询 ")
     async def query_game(event: GroupMessageEvent):
         if event.pure_text.startswith("steam查询 "):
             game_name = event.pure_text.split(" ")[1]
@@ -5,6 +5,7 @@ from io import BytesIO
 import httpx
 from bs4 import BeautifulSoup
 
+from developTools.event.router import IMAGE_SEGMENTS
 from developTools.event.events import GroupMessageEvent
 from developTools.message.message_components import Image, Node, Text
 from run.ai_generated_art.service.modelscope_text2img import modelscope_drawer
@@ -284,7 +285,7 @@ async def nai3(bot, event, config, tag):
 def main(bot, config):
     ai_img_recognize = {}
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, regex="ai图检测", needs=("at", *IMAGE_SEGMENTS), lane="heavy", concurrency=2)
     async def search_image(event):
         try:
             if str(event.pure_text) == "ai图检测" or (
@@ -300,13 +301,13 @@ def main(bot, config):
         except Exception as e:
             pass
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="画 ", lane="heavy", concurrency=4)
     async def collection_draw(event):
         if str(event.pure_text).startswith("画 "):
             prompt = str(event.pure_text).replace("画 ", "")
             await call_text2img(bot, event, config, prompt)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="n4 ", lane="heavy", concurrency=2)
     async def naiDraw4(event):
         if str(event.pure_text).startswith("n4 ") and config.ai_generated_art.config["ai绘画"]["novel_ai画图"]:
             tag = str(event.pure_text).replace("n4 ", "")
@@ -314,7 +315,7 @@ def main(bot, config):
             await delay_recall(bot, msg)
             await nai4(bot, event, config, tag)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="n3 ", lane="heavy", concurrency=2)
     async def naiDraw3(event):
         if str(event.pure_text).startswith("n3 ") and config.ai_generated_art.config["ai绘画"]["novel_ai画图"]:
             tag = str(event.pure_text).replace("n3 ", "")
@@ -322,7 +323,7 @@ def main(bot, config):
             await delay_recall(bot, msg)
             await nai3(bot, event, config, tag)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="dan ", lane="heavy", concurrency=2)
     async def db(event):
         if str(event.pure_text).startswith("dan "):
             tag = str(event.pure_text).replace("dan ", "")
@@ -473,7 +474,7 @@ def main(bot, config):
                 await delay_recall(bot, msg)
                 bot.logger.error(f"Failed to send the compiled message to the group. Error: {e}")
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="tag", needs=IMAGE_SEGMENTS, lane="heavy", concurrency=2)
     async def tagger(event):
         global tag_user
 
@@ -523,7 +524,7 @@ def main(bot, config):
                     msg = await bot.send(event, f"反推失败: {e}", True)
                     await delay_recall(bot, msg)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="setsd ", lane="heavy")
     async def sdsettings(event):
         if str(event.pure_text).startswith("setsd "):
             global sd_user_args
@@ -537,7 +538,7 @@ def main(bot, config):
             sd_user_args[event.sender.user_id] = cmd_dict
             await bot.send(event, f"当前绘画参数设置: {sd_user_args[event.sender.user_id]}", True)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="setre ", lane="heavy")
     async def sdresettings(event):
         if str(event.pure_text).startswith("setre "):
             global sd_re_args
@@ -551,7 +552,7 @@ def main(bot, config):
             sd_re_args[event.sender.user_id] = cmd_dict
             await bot.send(event, f"当前重绘参数设置: {sd_re_args[event.sender.user_id]}", True)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="重绘", needs=IMAGE_SEGMENTS, lane="heavy", concurrency=2)
     async def sdreDrawRun(event):
         global UserGet
         global turn
@@ -630,7 +631,7 @@ def main(bot, config):
                     msg = await bot.send(event, f"sd api重绘失败。{e}", True)
                     await delay_recall(bot, msg)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact=("lora", "ckpt", "sampler", "scheduler", "interrupt", "skip"), prefix="ckpt2 ", lane="heavy")
     async def AiSdDraw(event):
         global turn
         global sd_user_args
@@ -715,7 +716,7 @@ def main(bot, config):
                 msg = await bot.send(event, f"跳过任务失败: {e}")
                 await delay_recall(bot, msg, 20)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="getwd", lane="heavy")
     async def wdcard(event):
         message = str(event.pure_text)
         if message == 'getwd':
@@ -728,7 +729,7 @@ def main(bot, config):
                 if log:
                     await bot.send(event, prompts)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="n4re", needs=IMAGE_SEGMENTS, lane="heavy", concurrency=2)
     async def n4reDrawRun(event):
         global n4re
 
@@ -791,7 +792,7 @@ def main(bot, config):
 
                 await attempt_draw()
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="n3re", needs=IMAGE_SEGMENTS, lane="heavy", concurrency=2)
     async def n3reDrawRun(event):
         global n3re
 
@@ -854,7 +855,7 @@ def main(bot, config):
 
                 await attempt_draw()
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="局部重绘", needs=IMAGE_SEGMENTS, lane="heavy", concurrency=2)
     async def sdmaskDrawRun(event):
         global UserGetm
         global turn
@@ -924,7 +925,7 @@ def main(bot, config):
                     await delay_recall(bot, msg, 20)
                 return
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="/clearre", lane="heavy")
     async def end_re(event):
         if str(event.pure_text) == "/clearre":
             global UserGet
@@ -961,7 +962,7 @@ def main(bot, config):
             msg = await bot.send(event, "已清除所有输入图片和文本缓存", True)
             await delay_recall(bot, msg, 20)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="imginfo", needs=IMAGE_SEGMENTS, lane="heavy", concurrency=2)
     async def img_info(event):
         global info_user
 
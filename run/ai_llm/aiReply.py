@@ -8,9 +8,10 @@ from framework_common.database_util.Group import clear_group_messages
 from framework_common.database_util.Group import get_group_messages
 from framework_common.database_util.User import get_user, update_user
 from framework_common.database_util.llmDB import delete_user_history, clear_all_history, change_folder_chara, \
-    get_folder_chara, set_all_users_chara, clear_all_users_chara, clear_user_chara, delete_latest2_history
+    get_folder_chara, set_all_users_chara, clear_all_users_chara, clear_user_chara, delete_latest2_history, \
+    history_checkpoint, history_tokens
 from framework_common.framework_util.func_map_loader import gemini_func_map, openai_func_map
-from run.ai_llm.service.aiReplyCore import aiReplyCore, end_chat, judge_trigger, send_text, count_tokens_approximate
+from run.ai_llm.service.aiReplyCore import aiReplyCore, end_chat, judge_trigger, send_text
 from run.ai_llm.service.auto_talk import check_message_similarity
 
 
@@ -94,7 +95,8 @@ def main(bot, config):
                                               min_list_size=config.ai_llm.config["llm"]["仁济模式"]["算法回复"][
                                                   "消息列表最小长度"],
                                               entropy_threshold=config.ai_llm.config["llm"]["仁济模式"]["算法回复"][
-                                                  "信息熵阈值"]):
+                                                  "信息熵阈值"],
+                                              group_id=event.group_id):
                 bot.logger.info(f"接受消息{event.processed_message}")
 
                 ## 权限判断
@@ -132,6 +134,7 @@ def main(bot, config):
 
                 current_event = await user_state[uid]["queue"].get()
                 try:
+                    checkpoint = await history_checkpoint(current_event.user_id)
                     reply_message = await aiReplyCore(
                         current_event.processed_message,
                         current_event.user_id,
@@ -139,20 +142,22 @@ def main(bot, config):
                         tools=tools,
                         bot=bot,
                         event=current_event,
+                        stream_reply=config.ai_llm.config["llm"].get("流式回复", False),
                     )
+                    try:
+                        # 本轮写入历史记录的用户消息、回复与函数调用的 token 数，流式回复时返回值只是结尾部分，不能据此计数
+                        tokens = await history_tokens(current_event.user_id, since=checkpoint)
+                        if tokens:
+                            await update_user(user_id=event.user_id, ai_token_record=user_info.ai_token_record + tokens)
+                    except Exception as e:
+                        bot.logger.warning(f"更新用户 {uid} 的 token 用量失败: {e}")
                     if reply_message is None or '' == str(
-                            reply_message) or 'Maximum recursion depth' in reply_message:
+                            reply_message) or 'Maximum recursion depth' in reply_message or 'Request failed' in reply_message:
                         return
                     # print(f'reply_message:{reply_message}')
                     if "call_send_mface(summary='')" in reply_message:
                         reply_message = reply_message.replace("call_send_mface(summary='')", '')
                     # print(f"{current_event.processed_message[1]['text']}\n{reply_message}")
-                    try:
-                        tokens_total = count_tokens_approximate(current_event.processed_message[1]['text'],
-                                                                reply_message, user_info.ai_token_record)
-                        await update_user(user_id=event.user_id, ai_token_record=tokens_total)
-                    except:
-                        pass
                     await send_text(bot, event, config, reply_message.strip())
                 except Exception as e:
                     bot.logger.exception(f"用户 {uid} 处理出错: {e}")
@@ -19,10 +19,13 @@ from run.ai_llm.service.aiReplyHandler.openai import openaiRequest, construct_op
     get_current_openai_prompt, construct_openai_standard_prompt_old_version, \
     openaiRequest_official
 from run.ai_llm.service.aiReplyHandler.tecentYuanQi import construct_tecent_standard_prompt, YuanQiTencent
-from framework_common.database_util.llmDB import get_user_history, update_user_history, delete_user_history, read_chara, \
-    use_folder_chara
+from run.ai_llm.service.key_pool import get_key_pool, NoRetry
+from run.ai_llm.service.streaming import SentenceSegmenter
+from framework_common.database_util.llmDB import append_history, truncate_history, history_checkpoint, rollback_history, \
+    delete_user_history, read_chara, use_folder_chara
 
 from framework_common.database_util.User import get_user, update_user
+from framework_common.utils.token_counter import count_text_tokens
 import importlib
 
 from run.ai_voice.service.tts import TTS
@@ -30,10 +33,10 @@ from run.ai_voice.service.tts import TTS
 Tts = TTS()
 
 
-def call_func(*args, **kwargs):
+def call_funcs(*args, **kwargs):
     # 运行时动态导入，避免循环导入
     func_map = importlib.import_module("framework_common.framework_util.func_map")
-    return func_map.call_func(*args, **kwargs)
+    return func_map.call_funcs(*args, **kwargs)
 
 
 last_trigger_time = defaultdict(float)
@@ -62,7 +65,11 @@ async def end_chat(user_id):
 
 
 async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None, event=None, system_instruction=None,
-                      func_result=False, recursion_times=0, do_not_read_context=False):  # 后面几个函数都是供函数调用的场景使用的
+                      func_result=False, recursion_times=0, do_not_read_context=False, stream_reply=False):  # 后面几个函数都是供函数调用的场景使用的
+    """
+    stream_reply 为 True 时 openai、gemini 边生成边按句发送，回复全部在这里发出，返回 None。
+    需要拿到完整回复的场景（如用户画像总结）不要开启。
+    """
     logger.info(f"aiReplyCore called with message: {processed_message}")
     """
     递归深度约束
@@ -75,7 +82,9 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
     """
     reply_message = ""
     original_history = []
+    checkpoint = await history_checkpoint(user_id)  # 出错时撤销本次追加的记录
     mface_files = None
+    streamer = None
     if tools is not None and config.ai_llm.config["llm"]["表情包发送"]:
         tools = await add_send_mface(tools, config)
     if not system_instruction:
@@ -133,12 +142,9 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                 p = await read_context(bot, event, config, prompt)
                 if p:
                     prompt = p
+            openai_config = config.ai_llm.config["llm"]["openai"]
             kwargs = {
                 "ask_prompt": prompt,
-                "url": config.ai_llm.config["llm"]["openai"].get("quest_url") or config.ai_llm.config["llm"][
-                    "openai"].get("base_url"),
-                "apikey": random.choice(config.ai_llm.config["llm"]["openai"]["api_keys"]),
-                "model": config.ai_llm.config["llm"]["openai"]["model"],
                 "stream": False,
                 "proxy": config.common_config.basic_config["proxy"]["http_proxy"] if config.ai_llm.config["llm"][
                     "enable_proxy"] else None,
@@ -146,13 +152,22 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                 "temperature": config.ai_llm.config["llm"]["openai"]["temperature"],
                 "max_tokens": config.ai_llm.config["llm"]["openai"]["max_tokens"]
             }
-            if config.ai_llm.config["llm"]["openai"]["enable_official_sdk"]:
-                response_message = await openaiRequest_official(**kwargs)
-            else:
-                response_message = await openaiRequest(**kwargs)
+            if stream_reply and bot is not None and event is not None:
+                streamer = ReplyStreamer(bot, event, config, openai_config["CoT"])
+                kwargs.update(stream=True, on_text=streamer.on_text)
+            request = openaiRequest_official if openai_config["enable_official_sdk"] else openaiRequest
+            # 按健康状况挑选 key，失败时换 key 退避重试，仍失败则切换到备用模型
+            key_pool = get_key_pool("openai", openai_config.get("quest_url") or openai_config.get("base_url"),
+                                    openai_config["api_keys"])
+            response_message = await pool_request(key_pool,
+                lambda url, apikey, model: stream_guard(streamer, request(url=url, apikey=apikey, model=model, **kwargs)),
+                [openai_config["model"], openai_config.get("backup_model")])
             logger.info(response_message)
             response_message=response_message["choices"][0]["message"]
-            if "content" in response_message:
+            if streamer is not None:
+                await streamer.finish(response_message.pop("reasoning_content", None))
+                reply_message, mface_files = None, []  # 表情包已随正文发出
+            elif "content" in response_message:
                 reply_message = response_message["content"]
                 if reply_message is not None:
                     reply_message, mface_files = remove_mface_filenames(reply_message, config)  # 去除表情包文件名
@@ -194,6 +209,10 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                 mface_files = []
 
             if "tool_calls" in response_message and response_message['tool_calls'] is not None:
+                # 同一轮的多个函数调用并发执行，结果仍按原顺序处理
+                calls = [(part['function']["name"], part['function']['arguments']) for part in response_message['tool_calls']
+                         if not (part['function']["name"] == "call_send_mface" and mface_files == [])]
+                results = iter(await call_funcs(bot, event, config, calls))  # 真是到处都不想相互兼容。
                 for part in response_message['tool_calls']:
                     func_name = part['function']["name"]
                     args = part['function']['arguments']
@@ -207,7 +226,9 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                         })
                     else:
                         try:
-                            r = await call_func(bot, event, config, func_name, json.loads(args))  # 真是到处都不想相互兼容。
+                            r = next(results)
+                            if isinstance(r, BaseException):
+                                raise r
                             if not r:
                                 await end_chat(user_id)
                             if r:
@@ -247,7 +268,8 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                 await prompt_database_updata(user_id, i, config)
             if func_call:
                 final_response = await aiReplyCore(None, user_id, config, tools=tools, bot=bot, event=event,
-                                                   system_instruction=system_instruction, func_result=True)
+                                                   system_instruction=system_instruction, func_result=True,
+                                                   stream_reply=stream_reply)
                 return final_response
 
             # print(response_message)
@@ -268,55 +290,71 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
             if processed_message is None:  # 防止二次递归无限循环
                 tools = None
             # 这里是需要完整报错的，不用try catch，否则会影响自动重试。
-            response_message = await geminiRequest(
-                prompt,
-                config.ai_llm.config["llm"]["gemini"]["base_url"],
-                random.choice(config.ai_llm.config["llm"]["gemini"]["api_keys"]),
-                config.ai_llm.config["llm"]["gemini"]["model"],
-                config.common_config.basic_config["proxy"]["http_proxy"] if config.ai_llm.config["llm"][
-                    "enable_proxy"] else None,
-                tools=tools,
-                system_instruction=system_instruction,
-                temperature=config.ai_llm.config["llm"]["gemini"]["temperature"],
-                maxOutputTokens=config.ai_llm.config["llm"]["gemini"]["maxOutputTokens"]
-            )
+            gemini_config = config.ai_llm.config["llm"]["gemini"]
+            if stream_reply and bot is not None and event is not None:
+                streamer = ReplyStreamer(bot, event, config)
+            key_pool = get_key_pool("gemini", gemini_config["base_url"], gemini_config["api_keys"])
+            response_message = await pool_request(key_pool,
+                lambda base_url, apikey, model: stream_guard(streamer, geminiRequest(
+                    prompt,
+                    base_url,
+                    apikey,
+                    model,
+                    config.common_config.basic_config["proxy"]["http_proxy"] if config.ai_llm.config["llm"][
+                        "enable_proxy"] else None,
+                    tools=tools,
+                    system_instruction=system_instruction,
+                    temperature=gemini_config["temperature"],
+                    maxOutputTokens=gemini_config["maxOutputTokens"],
+                    stream=streamer is not None,
+                    on_text=streamer.on_text if streamer is not None else None
+                )),
+                [gemini_config["model"], gemini_config.get("backup_model")])
             logger.info(response_message)
             response_message=response_message['candidates'][0]["content"]
             # print(response_message)
-            try:
-                reply_message = response_message["parts"][0]["text"]  # 函数调用可能不给你返回提示文本，只给你整一个调用函数。
-                reply_message, mface_files = remove_mface_filenames(reply_message, config)  # 去除表情包文件名
-            except Exception as e:
-                logger.error(f"Error occurred when processing gemini response: {e}")
-                reply_message = None
-            if reply_message is not None:
-                if reply_message == "\n" or reply_message == "" or reply_message == " ":
+            if streamer is not None:
+                # 正文已在生成过程中逐句发出，这里发送结尾
+                await streamer.finish()
+                reply_message, mface_files = None, []  # 表情包已随正文发出
+                if not streamer.sent and not any(
+                        "functionCall" in part for part in response_message["parts"]):
                     raise Exception("Empty response。Gemini API返回的文本为空。")
-            """
-            gemini返回多段回复处理
-            """
-            try:
-                text_elements = [part for part in response_message['parts'] if 'text' in part]
-                if text_elements != [] and len(text_elements) > 1:
-                    self_rep = []
-                    for i in text_elements:
-                        if i["text"] != "\n" and i["text"] != "":
-                            tep_rep_message, mface_files = remove_mface_filenames(i['text'].strip(), config)  # 去除表情包文件名
-                            self_rep.append({"text": tep_rep_message})
-                            await send_text(bot, event, config, tep_rep_message)
-                            reply_message = None
-                            if mface_files != [] and mface_files is not None:
-                                for mface_file in mface_files:
-                                    await bot.send(event, Image(file=mface_file))
-                                mface_files = []
-                    self_message = {"user_name": config.common_config.basic_config["bot"], "user_id": 0000000,
-                                    "message": self_rep}
-                    if hasattr(event, "group_id"):
-                        await add_to_group(event.group_id, self_message)
+            else:
+                try:
+                    reply_message = response_message["parts"][0]["text"]  # 函数调用可能不给你返回提示文本，只给你整一个调用函数。
+                    reply_message, mface_files = remove_mface_filenames(reply_message, config)  # 去除表情包文件名
+                except Exception as e:
+                    logger.error(f"Error occurred when processing gemini response: {e}")
                     reply_message = None
-            except Exception as e:
-                logger.error(traceback.format_exc())
-                logger.error(f"Error occurred when processing gemini response2: {e}")
+                if reply_message is not None:
+                    if reply_message == "\n" or reply_message == "" or reply_message == " ":
+                        raise Exception("Empty response。Gemini API返回的文本为空。")
+                """
+                gemini返回多段回复处理
+                """
+                try:
+                    text_elements = [part for part in response_message['parts'] if 'text' in part]
+                    if text_elements != [] and len(text_elements) > 1:
+                        self_rep = []
+                        for i in text_elements:
+                            if i["text"] != "\n" and i["text"] != "":
+                                tep_rep_message, mface_files = remove_mface_filenames(i['text'].strip(), config)  # 去除表情包文件名
+                                self_rep.append({"text": tep_rep_message})
+                                await send_text(bot, event, config, tep_rep_message)
+                                reply_message = None
+                                if mface_files != [] and mface_files is not None:
+                                    for mface_file in mface_files:
+                                        await bot.send(event, Image(file=mface_file))
+                                    mface_files = []
+                        self_message = {"user_name": config.common_config.basic_config["bot"], "user_id": 0000000,
+                                        "message": self_rep}
+                        if hasattr(event, "group_id"):
+                            await add_to_group(event.group_id, self_message)
+                        reply_message = None
+                except Exception as e:
+                    logger.error(traceback.format_exc())
+                    logger.error(f"Error occurred when processing gemini response2: {e}")
             # 检查是否存在函数调用，如果还有提示词就发
             status = False
 
@@ -335,8 +373,11 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
 
             # 在函数调用之前触发更新上下文。
             await prompt_database_updata(user_id, response_message, config)
-            # 函数调用
+            # 函数调用，同一轮的多个调用并发执行，结果仍按原顺序处理
             new_func_prompt = []
+            calls = [(part['functionCall']["name"], part['functionCall']['args']) for part in response_message["parts"]
+                     if "functionCall" in part and not (part['functionCall']["name"] == "call_send_mface" and mface_files == [])]
+            results = iter(await call_funcs(bot, event, config, calls))
             for part in response_message["parts"]:
                 if "functionCall" in part:
                     func_name = part['functionCall']["name"]
@@ -352,7 +393,9 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                         """
                         try:
 
-                            r = await call_func(bot, event, config, func_name, args)
+                            r = next(results)
+                            if isinstance(r, BaseException):
+                                raise r
                             if not r:
                                 await end_chat(user_id)
                             if r:
@@ -373,7 +416,8 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                 await prompt_database_updata(user_id, {"role": "function", "parts": new_func_prompt}, config)
                 # await add_gemini_standard_prompt({"role": "function","parts": new_func_prompt},user_id)# 更新prompt
                 final_response = await aiReplyCore(None, user_id, config, tools=tools, bot=bot, event=event,
-                                                   system_instruction=system_instruction, func_result=True)
+                                                   system_instruction=system_instruction, func_result=True,
+                                                   stream_reply=stream_reply)
                 return final_response
 
         elif config.ai_llm.config["llm"]["model"] == "腾讯元器":
@@ -401,7 +445,15 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
         logger.error(f"Error occurred: {e}")
         logger.error(traceback.format_exc())
         logger.warning(f"roll back to original history, recursion times: {recursion_times}")
-        await update_user_history(user_id, original_history)
+        await rollback_history(user_id, checkpoint)
+        if streamer is not None and streamer.sent:
+            # 已经发出了部分回复，重试会让用户收到重复的内容
+            logger.warning("流式回复中途出错，已发送部分回复，不再重试")
+            return None
+        if isinstance(e, UpstreamError):
+            # key 池已经换 key、退避并切换过备用模型；4xx 是请求本身的问题，再递归也不会成功
+            logger.warning("请求失败，不再重试")
+            return "Request failed.Please try again later."
         if recursion_times <= config.ai_llm.config["llm"]["recursion_limit"]:
 
             logger.warning(f"Recursion times: {recursion_times}")
@@ -415,21 +467,115 @@ async def aiReplyCore(processed_message, user_id, config, tools=None, bot=None,
                 await update_user(event.user_id, portrait_update_time=datetime.datetime.now().isoformat())
             return await aiReplyCore(processed_message, user_id, config, tools=tools, bot=bot, event=event,
                                      system_instruction=system_instruction, func_result=func_result,
-                                     recursion_times=recursion_times + 1, do_not_read_context=True)
+                                     recursion_times=recursion_times + 1, do_not_read_context=True,
+                                     stream_reply=stream_reply)
         else:
             return "Maximum recursion depth exceeded.Please try again later."
 
 
-async def send_text(bot, event, config, text):
+class UpstreamError(Exception):
+    """key 池放弃后抛出，__cause__ 为最后一次请求的错误"""
+
+
+async def pool_request(key_pool, send, models):
+    """aiReplyCore 的递归只用于重试回复解析等错误，key 池抛出的错误包装成 UpstreamError，不再重复重试"""
+    try:
+        return await key_pool.request(send, models)
+    except Exception as e:
+        raise UpstreamError(f"{key_pool.name} 请求失败: {e}") from e
+
+
+class ReplyStreamer:
+    """
+    流式回复：把生成中的文本按句切分后立即发送，每段单独去除表情包文件名并发送对应表情包。
+    开启 CoT 时，<think> 中的思考内容在第一段之前以转发消息发送；reasoning_content 要等生成结束才完整，在 finish 时发送。
+    是否语音回复、是否引用每条回复只决定一次：只引用第一段，语音在生成结束后整段合成。
+    """
+
+    def __init__(self, bot, event, config, cot=False):
+        self.bot = bot
+        self.event = event
+        self.config = config
+        self.cot = cot
+        self.voice = random.randint(0, 100) < config.ai_llm.config["llm"]["语音回复几率"]
+        self.quote = config.ai_llm.config["llm"]["Quote"]
+        self.spoken = []  # 语音回复时收集各段正文
+        self.segmenter = SentenceSegmenter()
+        self.sent = False  # 是否已经发出过内容
+
+    def reset(self):
+        """请求失败且尚未发出内容时，丢弃这次请求已缓冲的文本，重试从头开始"""
+        self.segmenter = SentenceSegmenter()
+        self.spoken = []
+
+    async def on_text(self, text):
+        for segment in self.segmenter.feed(text):
+            await self._send(segment)
+
+    async def _send_think(self):
+        if self.cot and self.segmenter.think:
+            self.sent = True
+            await self.bot.send(self.event, [Node(content=[Text(self.segmenter.think)])])
+        self.cot = False
+
+    async def _send(self, segment):
+        await self._send_think()
+        segment, mface_files = remove_mface_filenames(segment, self.config)
+        if segment:
+            if self.voice:
+                self.spoken.append(segment)
+            if not self.voice or self.config.ai_llm.config["llm"]["语音回复附带文本"]:
+                self.sent = True
+                await send_text(self.bot, self.event, self.config, segment, voice=False, quote=self.quote)
+                self.quote = False
+        for mface_file in mface_files:
+            self.sent = True
+            await self.bot.send(self.event, Image(file=mface_file))
+
+    async def finish(self, reasoning=None):
+        """
+        发送尚未发出的结尾部分，语音回复时再把整段回复合成语音发送
+        :param reasoning: 模型单独返回的思考内容
+        """
+        tail = self.segmenter.flush()
+        if reasoning and self.cot:
+            await self.bot.send(self.event, [Node(content=[Text(reasoning)])])
+        if tail:
+            await self._send(tail)
+        else:
+            await self._send_think()
+        if self.spoken:
+            self.sent = True
+            await tts_and_send(self.bot, self.event, self.config, "".join(self.spoken))
+
+
+async def stream_guard(streamer, request):
+    """已经发出部分回复后请求出错时不再换 key 重试，避免用户收到重复内容；尚未发出时清空缓冲再重试"""
+    try:
+        return await request
+    except Exception as e:
+        if streamer is not None and streamer.sent:
+            raise NoRetry(str(e)) from e
+        if streamer is not None:
+            streamer.reset()
+        raise
+
+
+async def send_text(bot, event, config, text, voice=None, quote=None):
+    """voice 为 None 时按语音回复几率决定是否语音回复，quote 为 None 时按配置决定是否引用"""
     text = re.sub(r'```tool_code.*?```', '', text, flags=re.DOTALL)
     text = text.replace('```', '').strip()
-    if random.randint(0, 100) < config.ai_llm.config["llm"]["语音回复几率"]:
+    if voice is None:
+        voice = random.randint(0, 100) < config.ai_llm.config["llm"]["语音回复几率"]
+    if quote is None:
+        quote = config.ai_llm.config["llm"]["Quote"]
+    if voice:
         if config.ai_llm.config["llm"]["语音回复附带文本"]:
-            await bot.send(event, text.strip(), config.ai_llm.config["llm"]["Quote"])
+            await bot.send(event, text.strip(), quote)
 
         await tts_and_send(bot, event, config, text)
     else:
-        await bot.send(event, text.strip(), config.ai_llm.config["llm"]["Quote"])
+        await bot.send(event, text.strip(), quote)
 
 
 async def tts_and_send(bot, event, config, reply_message):
@@ -447,20 +593,12 @@ async def tts_and_send(bot, event, config, reply_message):
 
 
 async def prompt_database_updata(user_id, response_message, config):
-    history = await get_user_history(user_id)
-    if len(history) > config.ai_llm.config["llm"]["max_history_length"]:
-        del history[0]
-        del history[0]
-    history.append(response_message)
-    await update_user_history(user_id, history)
+    await append_history(user_id, response_message)
 
 
 async def prompt_length_check(user_id, config):
-    history = await get_user_history(user_id)
-    if len(history) > config.ai_llm.config["llm"]["max_history_length"]:
-        while history[0]["role"] != "user":
-            del history[0]
-    await update_user_history(user_id, history)
+    await truncate_history(user_id, config.ai_llm.config["llm"]["max_history_length"],
+                           config.ai_llm.config["llm"].get("max_history_tokens"))
 
 
 async def read_context(bot, event, config, prompt):
@@ -611,26 +749,8 @@ async def add_send_mface(tools, config):
     return tools
 
 
-# asyncio.run(openaiRequest("1"))
 def count_tokens_approximate(input_text, output_text, token_ori=None):
     """
-    后续使用api调用返回的tokens计数。
+    兼容旧接口，计数方式见 framework_common.utils.token_counter。对话用量请使用 llmDB.history_tokens。
     """
-
-    def tokenize(text):
-        # 英文和数字：按空格分词，同时考虑标点符号和特殊符号
-        english_tokens = re.findall(r"\w+|[^\w\s]", text, re.UNICODE)
-        # 中文：每个汉字单独作为一个 token
-        chinese_tokens = re.findall(r'[\u4e00-\u9fff]', text)
-        # 合并英文和中文 token
-        tokens = english_tokens + chinese_tokens
-        return tokens
-
-    input_tokens = tokenize(input_text)
-    output_tokens = tokenize(output_text)
-    add_token = len(input_tokens) + len(output_tokens)
-    if token_ori is not None:
-        total_token = add_token + token_ori
-    else:
-        total_token = add_token
-    return total_token
+    return count_text_tokens(input_text) + count_text_tokens(output_text) + (token_ori or 0)
@@ -1,35 +1,32 @@
 import asyncio
 
-import httpx
+from framework_common.utils import http_clients
+from framework_common.utils.http_clients import get_client
 
 
-async def meta_llama(prompt, proxies):
+async def meta_llama(prompt, proxy):
     url = "https://apiserver.alcex.cn/v1/chat/completions"
     data = {
         "model": "meta-llama/Llama-3.3-70B-Instruct-Turbo",
         "messages": prompt,
         "stream": False
     }
-    async with httpx.AsyncClient(proxies=proxies, timeout=200) as client:
-        r = await client.post(url, json=data)
+    r = await get_client(url, proxy).post(url, json=data, timeout=http_clients.timeout(200))
+    return r.json()["choices"][0]["message"]
 
-        return r.json()["choices"][0]["message"]
 
-
-async def free_phi_3_5(prompt, proxies):
+async def free_phi_3_5(prompt, proxy):
     url = "https://apiserver.alcex.cn/v1/chat/completions"
     data = {
         "model": "phi-3.5",
         "messages": prompt,
         "stream": False
     }
-    async with httpx.AsyncClient(proxies=proxies, timeout=200) as client:
-        r = await client.post(url, json=data)
-
-        return r.json()["choices"][0]["message"]
+    r = await get_client(url, proxy).post(url, json=data, timeout=http_clients.timeout(200))
+    return r.json()["choices"][0]["message"]
 
 
-async def free_gemini(prompt, proxies):
+async def free_gemini(prompt, proxy):
     url = f"https://apiserver.alcex.cn/v1/chat/completions"
     headers = {
         "Content-Type": "application/json",
@@ -41,17 +38,15 @@ async def free_gemini(prompt, proxies):
         "stream": False
     }
 
-    async with httpx.AsyncClient(proxies=proxies, headers=headers, timeout=200) as client:
-        r = await client.post(url, json=data)
-
-        return r.json()["choices"][0]["message"]
+    r = await get_client(url, proxy).post(url, json=data, headers=headers, timeout=http_clients.timeout(200))
+    return r.json()["choices"][0]["message"]
 
 
-async def free_model_result(prompt, proxies=None):
+async def free_model_result(prompt, proxy=None):
     functions = [
-        meta_llama(prompt, proxies),
-        free_phi_3_5(prompt, proxies),
-        free_gemini(prompt, proxies)
+        meta_llama(prompt, proxy),
+        free_phi_3_5(prompt, proxy),
+        free_gemini(prompt, proxy)
     ]
 
     for future in asyncio.as_completed(functions):
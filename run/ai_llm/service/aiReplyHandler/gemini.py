@@ -4,20 +4,27 @@ import os
 import re
 import traceback
 
-import httpx
 from PIL import Image
 
 from developTools.utils.logger import get_logger
-from framework_common.database_util.llmDB import get_user_history, update_user_history
+from framework_common.database_util.llmDB import get_user_history, update_user_history, append_history
+from framework_common.utils import http_clients
+from framework_common.utils.http_clients import get_client
 from framework_common.utils.random_str import random_str
+from run.ai_llm.service.streaming import GeminiStreamAssembler, iter_sse
 
 logger=get_logger()
-async def geminiRequest(ask_prompt,base_url: str,apikey: str,model: str,proxy=None,tools=None,system_instruction=None,temperature=0.7,maxOutputTokens=2048):
-    if proxy is not None and proxy !="":
-        proxies={"http://": proxy, "https://": proxy}
+async def geminiRequest(ask_prompt,base_url: str,apikey: str,model: str,proxy=None,tools=None,system_instruction=None,temperature=0.7,maxOutputTokens=2048,stream=False,on_text=None):
+    """
+    stream 为 True 时使用 streamGenerateContent 逐块读取，每段新增正文调用一次 await on_text(text)，
+    返回值与非流式相同（candidates[0].content 由各分块拼接而成）
+    """
+    if stream:
+        url = f"{base_url}/v1beta/models/{model}:streamGenerateContent?alt=sse"
     else:
-        proxies=None
-    url = f"{base_url}/v1beta/models/{model}:generateContent?key={apikey}"
+        url = f"{base_url}/v1beta/models/{model}:generateContent"
+    # key 放在请求头里，不出现在 url 中，请求失败时异常信息与日志里不会带上 key
+    headers = {"x-goog-api-key": apikey}
     # print(requests.get(url,verify=False))
     pay_load={
         "contents": ask_prompt,
@@ -45,9 +52,18 @@ async def geminiRequest(ask_prompt,base_url: str,apikey: str,model: str,proxy=No
         pay_load["tools"] = tools
 
 
-    async with httpx.AsyncClient(proxies=proxies, timeout=100) as client:
-        r = await client.post(url, json=pay_load)
-        return r.json()
+    if stream:
+        assembler = GeminiStreamAssembler()
+        async with get_client(url, proxy).stream("POST", url, json=pay_load, headers=headers, timeout=http_clients.timeout(100)) as r:
+            r.raise_for_status()  # 429、5xx 等交给 key 池处理
+            async for chunk in iter_sse(r.aiter_lines()):
+                text = assembler.feed(chunk)
+                if text and on_text is not None:
+                    await on_text(text)
+        return {"candidates": [{"content": assembler.content()}]}
+    r = await get_client(url, proxy).post(url, json=pay_load, headers=headers, timeout=http_clients.timeout(100))
+    r.raise_for_status()  # 429、5xx 等交给 key 池处理
+    return r.json()
         #print(r.json())
         #return r.json()['candidates'][0]["content"]
 
@@ -78,22 +94,21 @@ async def gemini_prompt_elements_construct(precessed_message,bot=None,func_resul
                     continue
                 prompt_elements.append({"text": f"system提示: 当前图片的url为{url}"})
                 # 下载图片转base64
-                async with httpx.AsyncClient(timeout=60) as client:
-                    res = await client.get(url)
-                    # res.raise_for_status()  # Check for HTTP errors
-
-                    image = Image.open(io.BytesIO(res.content))
-                    image = image.convert("RGB")
-
-                    quality = 85
-                    while True:
-                        img_byte_arr = io.BytesIO()
-                        image.save(img_byte_arr, format='JPEG', quality=quality)
-                        size_kb = img_byte_arr.tell() / 1024
-                        if size_kb <= 400 or quality <= 10:
-                            break
-                        quality -= 5
-                    img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+                res = await get_client(url).get(url, timeout=http_clients.timeout(60))
+                # res.raise_for_status()  # Check for HTTP errors
+
+                image = Image.open(io.BytesIO(res.content))
+                image = image.convert("RGB")
+
+                quality = 85
+                while True:
+                    img_byte_arr = io.BytesIO()
+                    image.save(img_byte_arr, format='JPEG', quality=quality)
+                    size_kb = img_byte_arr.tell() / 1024
+                    if size_kb <= 400 or quality <= 10:
+                        break
+                    quality -= 5
+                img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
                 prompt_elements.append({"inline_data": {"mime_type": "image/jpeg", "data": img_base64}})
                 #prompt_elements.append({"type":"image_url","image_url":i["image"]["url"]})
             except Exception as e:
@@ -159,7 +174,7 @@ async def construct_gemini_standard_prompt(processed_message, user_id, bot=None,
     original_history = history.copy()  # 备份，出错的时候可以rollback
     history.append(message)
 
-    await update_user_history(user_id, history)  # 更新数据库中的历史记录
+    await append_history(user_id, message)  # 只追加新的一条
     return history, original_history
 async def query_and_insert_gemini(user_id,aim_element,insert_message):
     if insert_message=={
@@ -188,5 +203,5 @@ async def add_gemini_standard_prompt(prompt,user_id):
     original_history = history.copy()  # 备份，出错的时候可以rollback
     history.append(prompt)
 
-    await update_user_history(user_id, history)  # 更新数据库中的历史记录
+    await append_history(user_id, prompt)  # 只追加新的一条
     return history, original_history
@@ -2,11 +2,12 @@ import re
 
 import base64
 
-import httpx
-
 from developTools.utils.logger import get_logger
-from framework_common.database_util.llmDB import get_user_history, update_user_history
+from framework_common.database_util.llmDB import get_user_history, append_history, prepend_history
+from framework_common.utils import http_clients
+from framework_common.utils.http_clients import get_client
 from framework_common.utils.install_and_import import install_and_import
+from run.ai_llm.service.streaming import OpenAIStreamAssembler, iter_sse
 
 logger=get_logger()
 """
@@ -22,11 +23,11 @@ if openai:
 
 
 BASE64_PATTERN = re.compile(r"^data:([a-zA-Z0-9]+/[a-zA-Z0-9-.+]+);base64,([A-Za-z0-9+/=]+)$")
-async def openaiRequest(ask_prompt,url: str,apikey: str,model: str,stream: bool=False,proxy=None,tools=None,instructions=None,temperature=1.3,max_tokens=2560):
-    if proxy is not None and proxy !="":
-        proxies={"http://": proxy, "https://": proxy}
-    else:
-        proxies=None
+async def openaiRequest(ask_prompt,url: str,apikey: str,model: str,stream: bool=False,proxy=None,tools=None,instructions=None,temperature=1.3,max_tokens=2560,on_text=None):
+    """
+    stream 为 True 时按 SSE 逐块读取，每段新增正文调用一次 await on_text(text)，
+    返回值与非流式相同（choices[0].message 由增量拼接而成）
+    """
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {apikey}"
@@ -42,19 +43,28 @@ async def openaiRequest(ask_prompt,url: str,apikey: str,model: str,stream: bool=
     if tools is not None:
         data["tools"] = tools
         data["tool_choice"]="auto"
-    async with httpx.AsyncClient(proxies=proxies, headers=headers, timeout=200) as client:
-        r = await client.post(url, json=data)  # 使用 `json=data`
-        #print(r.json())
-        return r.json()
+    if stream:
+        assembler = OpenAIStreamAssembler()
+        async with get_client(url, proxy).stream("POST", url, json=data, headers=headers, timeout=http_clients.timeout(200)) as r:
+            r.raise_for_status()  # 429、5xx 等交给 key 池处理
+            async for chunk in iter_sse(r.aiter_lines()):
+                text = assembler.feed(chunk)
+                if text and on_text is not None:
+                    await on_text(text)
+        return {"choices": [{"message": assembler.message()}]}
+    r = await get_client(url, proxy).post(url, json=data, headers=headers, timeout=http_clients.timeout(200))
+    r.raise_for_status()  # 429、5xx 等交给 key 池处理
+    #print(r.json())
+    return r.json()
         #return r.json()["choices"][0]["message"]
-async def openaiRequest_official(ask_prompt,url: str,apikey: str,model: str,stream: bool=False,proxy=None,tools=None,instructions=None,temperature=1.3,max_tokens=2560):
+async def openaiRequest_official(ask_prompt,url: str,apikey: str,model: str,stream: bool=False,proxy=None,tools=None,instructions=None,temperature=1.3,max_tokens=2560,on_text=None):
     """
     使用官方sdk
     :param ask_prompt:
     :param url:
     :param apikey:
     :param model:
-    :param stream:
+    :param stream: 流式读取，每段新增正文调用一次 await on_text(text)
     :param proxy:
     :param tools:
     :param instructions:
@@ -77,10 +87,19 @@ async def openaiRequest_official(ask_prompt,url: str,apikey: str,model: str,stre
         kwargs["tool_choice"] = "auto"
 
 
-    client = AsyncOpenAI(api_key=apikey, base_url=url)
+    # 重试与换 key 由 aiReplyCore 的 key 池负责，SDK 自身不再重试
+    client = AsyncOpenAI(api_key=apikey, base_url=url, http_client=get_client(url, proxy), timeout=http_clients.timeout(200),
+                         max_retries=0)
 
     async def get_response():
         response =await client.chat.completions.create(**kwargs)
+        if stream:
+            assembler = OpenAIStreamAssembler()
+            async for chunk in response:
+                text = assembler.feed(chunk.model_dump())
+                if text and on_text is not None:
+                    await on_text(text)
+            return {"choices": [{"message": assembler.message()}]}
 
         #response = await client.chat.completions.create(**kwargs)
         #print(response)
@@ -116,9 +135,8 @@ async def prompt_elements_construct(precessed_message,bot=None,func_result=False
                 continue
             prompt_elements.append({"type":"text","text": f"system提示: 当前图片的url为{url}"})
             # 下载图片转base64
-            async with httpx.AsyncClient(timeout=60) as client:
-                res = await client.get(url)
-                img_base64 =base64.b64encode(res.content).decode("utf-8")
+            res = await get_client(url).get(url, timeout=http_clients.timeout(60))
+            img_base64 =base64.b64encode(res.content).decode("utf-8")
 
             prompt_elements.append({
                 "type": "image_url",
@@ -141,6 +159,7 @@ async def construct_openai_standard_prompt(processed_message,system_instruction,
     history = await get_user_history(user_id)
     original_history = history.copy()  # 备份，出错的时候可以rollback
     history.append(message)
+    await append_history(user_id, message)  # 只追加新的一条
     if system_instruction:
         full_prompt = [
 
@@ -149,10 +168,10 @@ async def construct_openai_standard_prompt(processed_message,system_instruction,
             history.index({"role": "system", "content": [{"type": "text", "text": system_instruction}]})
         except ValueError:
             full_prompt.append({"role": "system", "content": [{"type": "text", "text": system_instruction}]})
+            await prepend_history(user_id, *full_prompt)
         full_prompt.extend(history)
     else:
         full_prompt = history
-    await update_user_history(user_id, full_prompt)  # 更新数据库中的历史记录
     return full_prompt, original_history
 """
 旧版prompt都是谁在用啊，原来是你啊deepseek
@@ -162,6 +181,7 @@ async def construct_openai_standard_prompt_old_version(processed_message,system_
     history = await get_user_history(user_id)
     original_history = history.copy()  # 备份，出错的时候可以rollback
     history.append(message)
+    await append_history(user_id, message)  # 只追加新的一条
     if system_instruction:
         full_prompt = [
 
@@ -171,11 +191,11 @@ async def construct_openai_standard_prompt_old_version(processed_message,system_
         except ValueError:
             full_prompt.append({"role": "user", "content": system_instruction})
             full_prompt.append({"role": "assistant", "content": "好的，在接下来的回复中我会扮演好自己的角色"})
+            await prepend_history(user_id, *full_prompt)
 
         full_prompt.extend(history)
     else:
         full_prompt = history
-    await update_user_history(user_id, full_prompt)  # 更新数据库中的历史记录
     return full_prompt, original_history
 async def prompt_elements_construct_old_version(precessed_message,bot=None,func_result=False,event=None):
     result = "".join(item.get("text", "") for item in precessed_message)
@@ -193,5 +213,5 @@ async def add_openai_standard_prompt(prompt,user_id):
     original_history = history.copy()  # 备份，出错的时候可以rollback
     history.append(prompt)
 
-    await update_user_history(user_id, history)  # 更新数据库中的历史记录
+    await append_history(user_id, prompt)  # 只追加新的一条
     return history, original_history
\ No newline at end of file
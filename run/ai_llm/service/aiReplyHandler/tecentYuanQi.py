@@ -1,6 +1,6 @@
-import httpx
-
-from framework_common.database_util.llmDB import get_user_history, update_user_history
+from framework_common.database_util.llmDB import get_user_history, append_history
+from framework_common.utils import http_clients
+from framework_common.utils.http_clients import get_client
 
 
 async def YuanQiTencent(prompt: list, assistant_id, token, userID):
@@ -18,10 +18,9 @@ async def YuanQiTencent(prompt: list, assistant_id, token, userID):
         "stream": False,
         "messages": prompt
     }
-    async with httpx.AsyncClient(headers=headers, timeout=200) as client:
-        r = await client.post(url, json=data)  # 使用 `json=data`
-        print(r.json())
-        return r.json()["choices"][0]["message"]
+    r = await get_client(url).post(url, json=data, headers=headers, timeout=http_clients.timeout(200))
+    print(r.json())
+    return r.json()["choices"][0]["message"]
 
 
 """
@@ -70,5 +69,5 @@ async def construct_tecent_standard_prompt(processed_message, user_id, bot, even
     history.append(message)
 
     full_prompt = history
-    await update_user_history(user_id, full_prompt)  # 更新数据库中的历史记录
+    await append_history(user_id, message)  # 只追加新的一条
     return full_prompt, original_history
\ No newline at end of file
@@ -1,17 +1,19 @@
-from typing import List
-
-import numpy as np
+import heapq
+import math
+import re
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 from framework_common.utils.install_and_import import install_and_import
 
-sklearn=install_and_import("scikit-learn","sklearn")
-
 jieba=install_and_import("jieba")
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import re
-import gc
-from collections import Counter
+
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+KANA_PATTERN = re.compile(r'[\u3040-\u30ff\u31f0-\u31ff]')
+NGRAM_RANGE = (1, 3)
+MAX_FEATURES = 300
+TOKEN_CACHE_SIZE = 4096
 
 
 def clean_text(text: str) -> str:
@@ -30,15 +32,15 @@ def calculate_entropy(tokens: List[str]) -> float:
         return 0.0
     counter = Counter(tokens)
     total = len(tokens)
-    entropy = -sum((count / total) * np.log2(count / total) for count in counter.values())
+    entropy = -sum((count / total) * math.log2(count / total) for count in counter.values())
     return entropy
 
 def tokenize(text: str) -> List[str]:
     text = clean_text(text.lower().strip())
-    if re.search(r'[\u4e00-\u9fff]', text) and not re.search(r'[\u3040-\u30ff\u31f0-\u31ff]', text):
+    if CJK_PATTERN.search(text) and not KANA_PATTERN.search(text):
         # 中
         tokens = list(jieba.cut(text, cut_all=False))
-    elif re.search(r'[\u3040-\u30ff\u31f0-\u31ff]', text):
+    elif KANA_PATTERN.search(text):
         # 日
         tokens = re.findall(r'[\u3040-\u30ff\u31f0-\u31ff]+', text)
     else:
@@ -52,14 +54,134 @@ def calculate_time_weight(index: int, total: int) -> float:
     """
     return 1 + (total - index) * 0.1
 
+
+class MessageFeatures:
+    """一条消息的分词结果：1~3 元词组的词频与信息熵，同一文本只计算一次"""
+    __slots__ = ("counts", "entropy")
+
+    def __init__(self, text: str):
+        tokens = tokenize(text)
+        self.entropy = calculate_entropy(tokens)
+        tokens = [token for token in tokens if token.strip()]
+        self.counts: Dict[str, int] = Counter(
+            " ".join(tokens[i:i + n]) for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1) for i in range(len(tokens) - n + 1))
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def message_features(text: str) -> MessageFeatures:
+    return MessageFeatures(text)
+
+
+class SimilarityIndex:
+    """
+    一个群最近消息的增量 TF-IDF 索引。消息进出窗口时只更新词组的文档频率、总词频与倒排表，
+    查询时只与含有相同词组的消息计算余弦相似度。与原来每次拟合的 TfidfVectorizer 一致：平滑 idf、l2 归一化，
+    词表只保留总词频最高的 min(MAX_FEATURES, 单词数) 个词组。
+    """
+
+    def __init__(self):
+        self.window: deque[Tuple[str, MessageFeatures]] = deque()
+        self.df: Counter = Counter()
+        self.tf: Counter = Counter()  # 词组在窗口内的总出现次数
+        self.unigrams = 0  # 窗口内不同单词（1 元词组）的个数
+        self.postings: Dict[str, Counter] = {}  # 词组 -> {消息编号: 出现次数}
+        self.first_id = 0  # window[0] 的编号，编号随插入递增
+
+    def _append(self, text: str):
+        features = message_features(text)
+        doc_id = self.first_id + len(self.window)
+        self.window.append((text, features))
+        for term, count in features.counts.items():
+            if term not in self.df and " " not in term:
+                self.unigrams += 1
+            self.df[term] += 1
+            self.tf[term] += count
+            self.postings.setdefault(term, Counter())[doc_id] = count
+
+    def _evict(self):
+        _, features = self.window.popleft()
+        for term, count in features.counts.items():
+            self.df[term] -= 1
+            self.tf[term] -= count
+            if self.df[term] <= 0:
+                del self.df[term]
+                del self.tf[term]
+                del self.postings[term]
+                if " " not in term:
+                    self.unigrams -= 1
+            else:
+                del self.postings[term][self.first_id]
+        self.first_id += 1
+
+    def sync(self, messages: List[str]):
+        """
+        让窗口与 messages（按时间从旧到新）一致：找到当前窗口中与 messages 开头重合的部分，
+        只淘汰之前的旧消息、追加之后的新消息；对不上时整体重建（分词结果有缓存）。
+        """
+        texts = [text for text, _ in self.window]
+        for start in range(len(texts) + 1):
+            overlap = len(texts) - start
+            if overlap <= len(messages) and texts[start:] == messages[:overlap]:
+                break
+        for _ in range(start):
+            self._evict()
+        for text in messages[overlap:]:
+            self._append(text)
+
+    def _vocabulary(self, query: Dict[str, int]) -> set:
+        """总词频（含输入）最高的 min(MAX_FEATURES, 单词数) 个词组"""
+        unigrams = self.unigrams + sum(1 for term in query if " " not in term and term not in self.df)
+        limit = min(MAX_FEATURES, unigrams)
+        if limit >= len(self.tf) + len(query):
+            return set(self.tf) | set(query)
+        tf = self.tf.copy()
+        tf.update(query)
+        return set(heapq.nlargest(limit, tf, key=tf.__getitem__))
+
+    def similarities(self, text: str) -> List[float]:
+        """text 与窗口中每条消息的 TF-IDF 余弦相似度，顺序与窗口一致"""
+        query = message_features(text).counts
+        n = len(self.window) + 1  # 与原实现一样，输入本身也计入文档数
+        vocabulary = self._vocabulary(query)
+
+        def idf(term):
+            return math.log((1 + n) / (1 + self.df.get(term, 0) + (term in query))) + 1
+
+        weights = {}
+        query_weights = {term: count * idf(term) for term, count in query.items() if term in vocabulary}
+        query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+        dots: Counter = Counter()
+        for term, weight in query_weights.items():
+            for doc_id, count in self.postings.get(term, {}).items():
+                dots[doc_id] += weight * count * idf(term)
+        result = [0.0] * len(self.window)
+        if not query_norm:
+            return result
+        for doc_id, dot in dots.items():
+            index = doc_id - self.first_id
+            counts = self.window[index][1].counts
+            norm = math.sqrt(sum((count * weights.setdefault(term, idf(term))) ** 2
+                                 for term, count in counts.items() if term in vocabulary))
+            result[index] = dot / (norm * query_norm)
+        return result
+
+
+# 各群的索引，message_list 不带群号时使用临时索引
+_indexes: Dict[int, SimilarityIndex] = {}
+
+
 async def check_message_similarity(
     input_str: str,
     message_list: List[str],
     similarity_threshold= 0.3,
     frequency_threshold= 0.15,
     min_list_size: int = 10,
-    entropy_threshold: float = 2.0
+    entropy_threshold: float = 2.0,
+    group_id: Optional[int] = None
 ) -> bool:
+    """
+    group_id 不为空时复用该群的增量索引，每条新消息只需处理进出窗口的消息
+    """
     def convert_number(num):
         if isinstance(num, int):
             return num / 100.0
@@ -78,72 +200,111 @@ async def check_message_similarity(
             #print("No valid messages to compare")
             return False
 
-        # 分词输入字符串
-        input_tokens = tokenize(input_str)
-        input_length = len(input_str)
-
         # 动态熵阈值
-        if re.search(r'[\u4e00-\u9fff]', input_str) and not re.search(r'[\u3040-\u30ff\u31f0-\u31ff]', input_str):
+        if CJK_PATTERN.search(input_str) and not KANA_PATTERN.search(input_str):
             # 中
             entropy_threshold = 1.5
-        elif re.search(r'[\u3040-\u30ff\u31f0-\u31ff]', input_str):
+        elif KANA_PATTERN.search(input_str):
             # 日
             entropy_threshold = 2.0
         else:
             # 别的
             entropy_threshold = 2.5
 
-        # 分词
-        tokenized_texts = []
-        entropies = []
-        time_weights = []
-        total_messages = len(message_list)
-        for i, text in enumerate(message_list):
-            tokens = tokenize(text)
-            tokenized_texts.append(' '.join(tokens))
-            entropy = calculate_entropy(tokens)
-            entropies.append(entropy)
-            time_weight = calculate_time_weight(i, total_messages)
-            time_weights.append(time_weight)
+        index = _indexes.setdefault(group_id, SimilarityIndex()) if group_id is not None else SimilarityIndex()
+        index.sync(message_list)
 
         # TF-IDF 词向量：TF-IDF(w, t, T) = TF(w, t) * IDF(w, T)
-        # TF(w, t) = count(w, t) / ∑_{w' ∈ t} count(w', t)
-        # IDF(w, T) = log |T| / |{t ∈ T : w ∈ t}|
-        vectorizer = TfidfVectorizer(
-            lowercase=True,
-            token_pattern=None,
-            tokenizer=lambda x: x.split(),
-            max_features=min(300, len(set([token for text in tokenized_texts for token in text.split()]))),
-            ngram_range=(1, 3),
-            stop_words=None
-        )
-        tfidf_matrix = vectorizer.fit_transform([*tokenized_texts, ' '.join(input_tokens)])
-
-        # 余弦相似度
-        input_vector = tfidf_matrix[-1]
-        message_vectors = tfidf_matrix[:-1]
-        similarities = cosine_similarity(input_vector, message_vectors).flatten()
+        # IDF(w, T) = ln((1 + |T|) / (1 + |{t ∈ T : w ∈ t}|)) + 1
+        similarities = index.similarities(input_str)
 
         # 熵调整和窗口权重
         alpha = 0.3
-        adjusted_similarities = [
-            sim * (entropy / entropy_threshold) ** alpha * time_weight if entropy > 0 else sim * 0.1 * time_weight
-            for sim, entropy, time_weight in zip(similarities, entropies, time_weights)
-        ]
-
-        # frequency = ∑_{i=1}^n 1(sim'(s, t_i) ≥ similarity_threshold) / n
-        high_similarity_count = np.sum(np.array(adjusted_similarities) >= similarity_threshold)
-        similarity_frequency = high_similarity_count / len(message_list)
+        total_messages = len(message_list)
+        high_similarity_count = 0
+        for i, (sim, (_, features)) in enumerate(zip(similarities, index.window)):
+            time_weight = calculate_time_weight(i, total_messages)
+            entropy = features.entropy
+            adjusted = sim * (entropy / entropy_threshold) ** alpha * time_weight if entropy > 0 else sim * 0.1 * time_weight
+            # frequency = ∑_{i=1}^n 1(sim'(s, t_i) ≥ similarity_threshold) / n
+            if adjusted >= similarity_threshold:
+                high_similarity_count += 1
+        similarity_frequency = high_similarity_count / total_messages
 
         #print(
             #f"Similarity frequency: {similarity_frequency:.3f}, Threshold: {frequency_threshold}"
         #)
 
-        del tfidf_matrix, similarities, adjusted_similarities
-        gc.collect()
-
         return similarity_frequency >= frequency_threshold
 
     except Exception as e:
         #print(f"Error in check_message_similarity: {e}")
         return False
+
+
+# 基准：回放一段模拟的群聊记录，每条消息都与最近 50 条比较，对比每次重新分词、重新拟合 TfidfVectorizer 的原实现与增量索引
+# 在仓库根目录运行：python -m run.ai_llm.service.auto_talk
+if __name__ == "__main__":
+    import asyncio
+    import gc
+    import random
+    import time
+
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    def _legacy_check(input_str, message_list, similarity_threshold, frequency_threshold, entropy_threshold):
+        tokenized_texts = []
+        entropies = []
+        time_weights = []
+        for i, text in enumerate(message_list):
+            tokens = tokenize(text)
+            tokenized_texts.append(' '.join(tokens))
+            entropies.append(calculate_entropy(tokens))
+            time_weights.append(calculate_time_weight(i, len(message_list)))
+        vectorizer = TfidfVectorizer(lowercase=True, token_pattern=None, tokenizer=lambda x: x.split(),
+                                     max_features=min(300, len(set([token for text in tokenized_texts for token in text.split()]))),
+                                     ngram_range=(1, 3), stop_words=None)
+        tfidf_matrix = vectorizer.fit_transform([*tokenized_texts, ' '.join(tokenize(input_str))])
+        similarities = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1]).flatten()
+        adjusted = [sim * (entropy / entropy_threshold) ** 0.3 * weight if entropy > 0 else sim * 0.1 * weight
+                    for sim, entropy, weight in zip(similarities, entropies, time_weights)]
+        result = np.sum(np.array(adjusted) >= similarity_threshold) / len(message_list) >= frequency_threshold
+        gc.collect()
+        return result, similarities
+
+    random.seed(0)
+    topics = ["今天晚上吃什么", "这个游戏新版本太难了", "有人一起打本吗", "明天要考试了好慌", "哈哈哈哈笑死我了",
+              "机器人在吗", "谁有这个表情包", "周末去哪里玩", "这个bug怎么修", "你们看昨天的比赛了吗"]
+    tails = ["", "啊", "呢", "！", "？", "真的", "吧", "哈哈", "我觉得还行", "有没有人"]
+    log = [random.choice(topics) + random.choice(tails) for _ in range(600)]
+    window = 50
+
+    async def _bench():
+        list(jieba.cut("预热"))  # jieba 首次使用时加载词典
+        start = time.perf_counter()
+        legacy = []
+        for i in range(window, len(log)):
+            legacy.append(_legacy_check(log[i], log[i - window:i], 0.3, 0.15, 1.5))
+        legacy_time = time.perf_counter() - start
+        print(f"原实现: {(len(log) - window) / legacy_time:.0f} 条/秒")
+
+        start = time.perf_counter()
+        incremental = []
+        for i in range(window, len(log)):
+            incremental.append(await check_message_similarity(log[i], log[i - window:i], group_id=1))
+        incremental_time = time.perf_counter() - start
+        print(f"增量索引: {(len(log) - window) / incremental_time:.0f} 条/秒")
+
+        # 词表截断处总词频相同的词组取舍可能与 sklearn 不同，个别消息的相似度会有出入
+        agree = sum(result == bool(old) for result, (old, _) in zip(incremental, legacy))
+        print(f"与原实现判定一致: {agree}/{len(legacy)}")
+        assert agree >= len(legacy) * 0.9
+        # 窗口对不上时整体重建
+        index = _indexes[1]
+        index.sync(log[:window])
+        assert [text for text, _ in index.window] == log[:window]
+        assert sum(index.df.values()) == sum(len(f.counts) for _, f in index.window)
+
+    asyncio.run(_bench())
@@ -0,0 +1,310 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from developTools.utils.logger import get_logger
+
+logger = get_logger()
+
+EWMA_ALPHA = 0.3  # 错误率与延迟的指数滑动平均系数，越大越看重最近的结果
+ERROR_HALF_LIFE = 30.0  # 错误率随时间衰减的半衰期（秒），出过错的 key 过一段时间会重新被选中
+LATENCY_BUCKET = 2.0  # 延迟相差不到一个区间（秒）的视为同样健康，轮流使用
+RATE_LIMIT_COOLDOWN = 5.0  # 429 且没有 Retry-After 时的初始冷却，连续 429 时翻倍
+FAILURE_COOLDOWN = 15.0  # 连续失败 FAILURE_THRESHOLD 次后的初始冷却，继续失败时翻倍
+FAILURE_THRESHOLD = 3
+AUTH_COOLDOWN = 600.0  # 401/403：key 失效或欠费，长时间不再使用
+MAX_COOLDOWN = 300.0
+# 单个模型的尝试次数与退避
+ATTEMPTS = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+
+
+class NoRetry(Exception):
+    """send 抛出此异常时不再重试，仍按原异常（__cause__）记录 key 的失败"""
+
+
+class KeyState:
+    """一个 (接口地址, api key) 的健康状况"""
+    __slots__ = ("endpoint", "key", "error_rate", "latency", "cooldown_until", "rate_limited", "failures",
+                 "last_used", "successes", "errors", "error_updated")
+
+    def __init__(self, endpoint: str, key: str):
+        self.endpoint = endpoint
+        self.key = key
+        self.error_rate = 0.0
+        self.error_updated = 0.0  # error_rate 最后一次更新的时间
+        self.latency = 0.0  # 尚无数据时为 0，新 key 会先被试用
+        self.cooldown_until = 0.0
+        self.rate_limited = 0  # 连续 429 次数
+        self.failures = 0  # 连续失败次数
+        self.last_used = 0.0
+        self.successes = 0
+        self.errors = 0
+
+    def current_error_rate(self, now: float) -> float:
+        """按距上次更新的时间衰减后的错误率；只有成功才衰减的话，失败过一次的 key 会一直排在后面、再也不被选中"""
+        if not self.error_rate:
+            return 0.0
+        return self.error_rate * 0.5 ** ((now - self.error_updated) / ERROR_HALF_LIFE)
+
+    def _update_error_rate(self, failed: bool, now: float):
+        self.error_rate = self.current_error_rate(now) * (1 - EWMA_ALPHA) + (EWMA_ALPHA if failed else 0.0)
+        self.error_updated = now
+
+    def rank(self, now: float) -> tuple:
+        return round(self.current_error_rate(now), 1), int(self.latency / LATENCY_BUCKET)
+
+    def success(self, latency: float, now: float):
+        self._update_error_rate(False, now)
+        self.latency = latency if not self.latency else self.latency * (1 - EWMA_ALPHA) + latency * EWMA_ALPHA
+        self.rate_limited = 0
+        self.failures = 0
+        self.successes += 1
+
+    def failure(self, status: Optional[int], retry_after: Optional[float], now: float):
+        self._update_error_rate(True, now)
+        self.errors += 1
+        if status == 429:
+            self.rate_limited += 1
+            cooldown = retry_after if retry_after is not None else RATE_LIMIT_COOLDOWN * 2 ** (self.rate_limited - 1)
+        elif status in (401, 403):
+            cooldown = AUTH_COOLDOWN
+        else:
+            self.failures += 1
+            if self.failures < FAILURE_THRESHOLD:
+                return
+            cooldown = FAILURE_COOLDOWN * 2 ** (self.failures - FAILURE_THRESHOLD)
+        self.cooldown_until = max(self.cooldown_until, now + min(cooldown, MAX_COOLDOWN))
+
+
+def error_status(error: BaseException) -> tuple[Optional[int], Optional[float]]:
+    """
+    从异常中取出 HTTP 状态码与 Retry-After 秒数，兼容 httpx.HTTPStatusError 与 openai SDK 的 APIStatusError。
+    连接失败、超时等没有状态码的返回 (None, None)
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return status, retry_after
+
+
+class KeyPool:
+    """
+    按健康状况挑选 api key：跳过冷却中的 key，优先错误率低、延迟低的，同样健康的按最久未用轮流使用。
+
+    用法：
+        response = await pool.request(lambda endpoint, key, model: openaiRequest(..., url=endpoint, apikey=key, model=model),
+                                      models=[model, backup_model])
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.states: dict[tuple[str, str], KeyState] = {}
+
+    def update(self, endpoint: str, keys: list[str]):
+        """同步配置中的 key，已有 key 的统计保留，删除的 key 不再使用"""
+        wanted = {(endpoint, key) for key in keys if key}
+        for item in list(self.states):
+            if item not in wanted:
+                del self.states[item]
+        for item in wanted:
+            if item not in self.states:
+                self.states[item] = KeyState(*item)
+
+    def pick(self) -> KeyState:
+        if not self.states:
+            raise ValueError(f"{self.name} 没有可用的 api key")
+        now = time.monotonic()
+        ready = [state for state in self.states.values() if state.cooldown_until <= now]
+        if not ready:
+            # 全部在冷却中，用最早结束冷却的那个
+            return min(self.states.values(), key=lambda state: state.cooldown_until)
+        best = min(state.rank(now) for state in ready)
+        return min((state for state in ready if state.rank(now) == best), key=lambda state: state.last_used)
+
+    async def request(self, send: Callable[[str, str, str], Awaitable[Any]], models: list[str],
+                      attempts: int = ATTEMPTS, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY) -> Any:
+        """
+        依次尝试 models 中的模型，每个模型最多 attempts 次，每次换用当前最健康的 key，失败后指数退避加随机抖动。
+        400 等请求本身有问题的错误与 NoRetry 直接抛出；全部失败时抛出最后一个异常。
+        """
+        last_error: Optional[BaseException] = None
+        for model in [model for model in models if model]:
+            if last_error is not None:
+                logger.warning(f"{self.name} 切换到备用模型 {model}")
+            for attempt in range(attempts):
+                state = self.pick()
+                now = time.monotonic()
+                if state.cooldown_until > now:
+                    await asyncio.sleep(min(state.cooldown_until - now, max_delay))
+                state.last_used = time.monotonic()
+                try:
+                    result = await send(state.endpoint, state.key, model)
+                except NoRetry as e:
+                    state.failure(*error_status(e.__cause__ or e), time.monotonic())
+                    raise
+                except Exception as e:
+                    status, retry_after = error_status(e)
+                    if status is not None and 400 <= status < 500 and status not in (401, 403, 408, 429):
+                        raise
+                    state.failure(status, retry_after, time.monotonic())
+                    last_error = e
+                    delay = min(base_delay * 2 ** attempt, max_delay) * random.uniform(0.5, 1)
+                    logger.warning(f"{self.name} 请求失败（模型 {model}，key ...{state.key[-4:]}，状态 {status}）: {e!r}，"
+                                   f"第 {attempt + 1}/{attempts} 次，{delay:.2f}秒后重试")
+                    if attempt + 1 < attempts:
+                        await asyncio.sleep(delay)
+                    continue
+                now = time.monotonic()
+                state.success(now - state.last_used, now)
+                return result
+        raise last_error
+
+    def summary(self) -> str:
+        now = time.monotonic()
+        lines = [f"{self.name} key 池："]
+        for state in self.states.values():
+            cooling = f"，冷却剩余 {state.cooldown_until - now:.0f}秒" if state.cooldown_until > now else ""
+            lines.append(f"...{state.key[-4:]} 成功 {state.successes} | 失败 {state.errors} | 错误率 {state.current_error_rate(now):.2f} | "
+                         f"延迟 {state.latency:.2f}秒{cooling}")
+        return "\n".join(lines)
+
+
+# 各模型提供方一个 key 池，每次请求前用 update 同步配置，修改配置后无需重启
+_pools: dict[str, KeyPool] = {}
+
+
+def get_key_pool(name: str, endpoint: str, keys: list[str]) -> KeyPool:
+    pool = _pools.get(name)
+    if pool is None:
+        pool = _pools[name] = KeyPool(name)
+    pool.update(endpoint, keys)
+    return pool
+
+
+# 自检：本地模拟的大模型接口按 key 注入 429 与 500，对比 random.choice 加重试与 key 池的上游错误数，并验证备用模型切换
+# 在仓库根目录运行：python -m run.ai_llm.service.key_pool
+if __name__ == "__main__":
+    import json
+
+    import httpx
+
+    from framework_common.utils.http_clients import close_all, get_client
+
+    class FakeLLM:
+        def __init__(self):
+            self.calls: dict[str, int] = {}
+            self.last_call: dict[str, float] = {}
+
+        def respond(self, key: str, model: str) -> tuple[int, dict, dict]:
+            self.calls[key] = self.calls.get(key, 0) + 1
+            if model == "dead-model":
+                return 503, {}, {"error": "model overloaded"}
+            if model == "bad-request":
+                return 400, {}, {"error": "invalid messages"}
+            if key == "sk-flaky" and random.random() < 0.6:
+                return 500, {}, {"error": "internal error"}
+            if key == "sk-limited":
+                # 每秒只允许一次请求
+                now = time.monotonic()
+                if now - self.last_call.get(key, 0) < 1:
+                    return 429, {"Retry-After": "1"}, {"error": "rate limited"}
+                self.last_call[key] = now
+            return 200, {}, {"choices": [{"message": {"role": "assistant", "content": f"{model} ok"}}]}
+
+        async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while True:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    headers = dict(line.split(b": ", 1) for line in head.split(b"\r\n")[1:] if b": " in line)
+                    headers = {k.lower(): v for k, v in headers.items()}
+                    body = json.loads(await reader.readexactly(int(headers[b"content-length"])))
+                    key = headers[b"authorization"].decode().removeprefix("Bearer ")
+                    await asyncio.sleep(0.005)
+                    status, extra, payload = self.respond(key, body["model"])
+                    data = json.dumps(payload).encode()
+                    extra_headers = "".join(f"{k}: {v}\r\n" for k, v in extra.items()).encode()
+                    writer.write(b"HTTP/1.1 %d X\r\nContent-Type: application/json\r\n%sContent-Length: %d\r\n\r\n"
+                                 % (status, extra_headers, len(data)) + data)
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+    async def _check(number=100):
+        fake = FakeLLM()
+        server = await asyncio.start_server(fake.handle, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/chat/completions"
+        keys = ["sk-good-a", "sk-good-b", "sk-flaky", "sk-limited"]
+
+        async def send(endpoint, key, model):
+            r = await get_client(endpoint).post(endpoint, json={"model": model, "messages": []},
+                                                headers={"Authorization": f"Bearer {key}"})
+            r.raise_for_status()
+            return r.json()["choices"][0]["message"]["content"]
+
+        # 原来的做法：每次随机挑 key，失败就立即重来
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(number):
+            while True:
+                try:
+                    await send(url, random.choice(keys), "main-model")
+                    break
+                except httpx.HTTPStatusError:
+                    errors += 1
+        print(f"random.choice + 重试: 上游错误 {errors} 次 / {number} 次请求，耗时 {time.perf_counter() - start:.2f}秒")
+
+        pool = get_key_pool("fake-openai", url, keys)
+        start = time.perf_counter()
+        for _ in range(number):
+            assert await pool.request(send, ["main-model"], base_delay=0.05) == "main-model ok"
+        errors = sum(state.errors for state in pool.states.values())
+        print(f"key 池: 上游错误 {errors} 次 / {number} 次请求，耗时 {time.perf_counter() - start:.2f}秒")
+        print(pool.summary())
+        good = pool.states[(url, "sk-good-a")].successes + pool.states[(url, "sk-good-b")].successes
+        assert good > number * 0.8, good
+        assert abs(pool.states[(url, "sk-good-a")].successes - pool.states[(url, "sk-good-b")].successes) <= number * 0.2
+
+        # 主模型持续 503 时切换到备用模型
+        assert await pool.request(send, ["dead-model", "backup-model"], attempts=2, base_delay=0.01) == "backup-model ok"
+        print("备用模型切换: 通过")
+        # 400 是请求本身的问题，不重试、不计入 key 的错误
+        calls = sum(fake.calls.values())
+        errors = sum(state.errors for state in pool.states.values())
+        try:
+            await pool.request(send, ["bad-request"])
+            raise AssertionError("400 应直接抛出")
+        except httpx.HTTPStatusError as e:
+            assert e.response.status_code == 400
+        assert sum(fake.calls.values()) == calls + 1
+        assert sum(state.errors for state in pool.states.values()) == errors
+        print("400 不重试: 通过")
+
+        # 只失败过一次的 key 在错误率衰减后重新参与轮换
+        recovering = KeyPool("recovering")
+        recovering.update(url, ["sk-a", "sk-b"])
+        now = time.monotonic()
+        recovering.states[(url, "sk-a")].failure(500, None, now)
+        recovering.states[(url, "sk-b")].success(0.1, now)
+        assert recovering.pick().key == "sk-b"
+        for state in recovering.states.values():
+            state.error_updated -= ERROR_HALF_LIFE * 4
+            state.last_used = 0.0 if state.key == "sk-a" else now
+        assert recovering.pick().key == "sk-a"
+        print("错误率随时间衰减: 通过")
+
+        await close_all()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_check())
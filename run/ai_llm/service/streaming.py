@@ -0,0 +1,235 @@
+import re
+from typing import AsyncIterator, Optional
+
+from developTools.utils import fast_json
+from developTools.utils.logger import get_logger
+
+logger = get_logger()
+
+
+async def iter_sse(lines: AsyncIterator[str]) -> AsyncIterator[dict]:
+    """
+    解析 SSE（text/event-stream）响应，逐个返回 data 字段中的 JSON。
+    多行 data 按规范拼接，openai 的结束标记 [DONE] 与无法解析的事件会被跳过。
+    """
+    data: list[str] = []
+    async for line in lines:
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip())
+            continue
+        if line.strip() or not data:
+            continue  # event:、id:、注释行等
+        payload, data = "\n".join(data), []
+        if payload == "[DONE]":
+            return
+        try:
+            yield fast_json.loads(payload)
+        except ValueError:
+            logger.warning(f"无法解析的 SSE 数据: {payload[:200]}")
+    if data and data != ["[DONE]"]:
+        try:
+            yield fast_json.loads("\n".join(data))
+        except ValueError:
+            pass
+
+
+class OpenAIStreamAssembler:
+    """把 chat.completions 的流式增量拼回与非流式相同的 message，函数调用按 index 拼接 arguments"""
+
+    def __init__(self):
+        self.content: list[str] = []
+        self.reasoning: list[str] = []
+        self.tool_calls: dict[int, dict] = {}
+
+    def feed(self, chunk: dict) -> str:
+        """:return: 本次新增的正文"""
+        choices = chunk.get("choices") or [{}]
+        delta = choices[0].get("delta") or {}
+        if delta.get("reasoning_content"):
+            self.reasoning.append(delta["reasoning_content"])
+        for call in delta.get("tool_calls") or []:
+            entry = self.tool_calls.setdefault(call.get("index", len(self.tool_calls)), {
+                "id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+            if call.get("id"):
+                entry["id"] = call["id"]
+            function = call.get("function") or {}
+            entry["function"]["name"] += function.get("name") or ""
+            entry["function"]["arguments"] += function.get("arguments") or ""
+        text = delta.get("content") or ""
+        if text:
+            self.content.append(text)
+        return text
+
+    def message(self) -> dict:
+        message = {"role": "assistant", "content": "".join(self.content) or None}
+        if self.reasoning:
+            message["reasoning_content"] = "".join(self.reasoning)
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        return message
+
+
+class GeminiStreamAssembler:
+    """把 streamGenerateContent 的各个分块拼回一个 content，相邻的文本合并，functionCall 原样保留"""
+
+    def __init__(self):
+        self.parts: list[dict] = []
+
+    def feed(self, chunk: dict) -> str:
+        candidates = chunk.get("candidates") or [{}]
+        text = ""
+        for part in (candidates[0].get("content") or {}).get("parts") or []:
+            if set(part) == {"text"}:
+                text += part["text"]
+                if self.parts and set(self.parts[-1]) == {"text"}:
+                    self.parts[-1]["text"] += part["text"]
+                    continue
+            self.parts.append(dict(part))
+        return text
+
+    def content(self) -> dict:
+        return {"role": "model", "parts": self.parts or [{"text": ""}]}
+
+
+# 句末标点（可带后引号、括号），英文句点后须跟空白，避免切开小数与网址
+SENTENCE_END = re.compile(r"(?:[。！？!?；;~…\n]+|\.(?=\s))[”’」』）)\]]*")
+
+
+class SentenceSegmenter:
+    """
+    把流式文本切成适合逐条发送的段落：第一段凑够 first_length 个字符后遇到句末就发出，尽早让用户看到回复；
+    之后每段至少 min_length 个字符，避免刷屏。代码块与开头的 <think> 思考内容不会被切开。
+    """
+
+    def __init__(self, first_length: int = 8, min_length: int = 60):
+        self.first_length = first_length
+        self.min_length = min_length
+        self.buffer = ""
+        self.think: Optional[str] = None
+        self.emitted = 0
+
+    def _strip_think(self) -> bool:
+        """:return: 是否仍在等待思考内容结束"""
+        if self.think is not None:
+            return False
+        head = self.buffer.lstrip()
+        if not head or "<think>".startswith(head) or (head.startswith("<think>") and "</think>" not in head):
+            return True
+        if head.startswith("<think>"):
+            think, _, rest = head[len("<think>"):].partition("</think>")
+            self.think = think.strip()
+            self.buffer = rest.lstrip()
+        else:
+            self.think = ""
+        return False
+
+    def feed(self, text: str) -> list[str]:
+        self.buffer += text
+        if self._strip_think():
+            return []
+        segments = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            end = match.end()
+            segment = self.buffer[start:end]
+            if len(segment.strip()) < (self.first_length if self.emitted == 0 and not segments else self.min_length):
+                continue
+            if self.buffer[:end].count("```") % 2:  # 代码块内不切
+                continue
+            segments.append(segment.strip())
+            start = end
+        self.buffer = self.buffer[start:]
+        self.emitted += len(segments)
+        return segments
+
+    def flush(self) -> str:
+        self._strip_think()
+        rest, self.buffer = self.buffer.strip(), ""
+        return rest
+
+
+# 自检：本地模拟的 SSE 接口逐字吐出回复，对比等完整回复再发送与边生成边分段发送的首条消息耗时，并检查增量拼接结果
+# 在仓库根目录运行：python -m run.ai_llm.service.streaming
+if __name__ == "__main__":
+    import asyncio
+    import json
+    import time
+
+    from framework_common.utils.http_clients import close_all, get_client
+
+    REPLY = "喵~主人回来啦！今天过得怎么样呀？我刚刚把房间收拾了一遍，还给你留了小鱼干。要不要一起看会儿书，或者出去散散步呢？"
+    CHUNK_DELAY = 0.03
+
+    def _openai_chunks():
+        yield {"choices": [{"delta": {"role": "assistant", "reasoning_content": "用户回家了"}}]}
+        for i in range(0, len(REPLY), 2):
+            yield {"choices": [{"delta": {"content": REPLY[i:i + 2]}}]}
+        yield {"choices": [{"delta": {"tool_calls": [{"index": 0, "id": "call_1", "type": "function",
+                                                      "function": {"name": "call_weather", "arguments": ""}}]}}]}
+        for piece in ('{"city"', ': "通', '辽"}'):
+            yield {"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}}]}
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = next(int(line.split(b":", 1)[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length:"))
+            stream = json.loads(await reader.readexactly(length)).get("stream")
+            if not stream:
+                await asyncio.sleep(CHUNK_DELAY * len(REPLY) / 2)
+                body = json.dumps({"choices": [{"message": {"role": "assistant", "content": REPLY}}]}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+                return
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for chunk in _openai_chunks():
+                data = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode()
+                writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                await writer.drain()
+                await asyncio.sleep(CHUNK_DELAY)
+            done = b"data: [DONE]\n\n"
+            writer.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(done), done))
+        finally:
+            await writer.drain()
+            writer.close()
+
+    async def _check():
+        server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/chat/completions"
+
+        start = time.perf_counter()
+        r = await get_client(url).post(url, json={"stream": False})
+        segments = [r.json()["choices"][0]["message"]["content"]]
+        print(f"非流式: 首条消息 {time.perf_counter() - start:.2f}秒，共 {len(segments)} 条")
+
+        start = time.perf_counter()
+        first = None
+        segments = []
+        assembler = OpenAIStreamAssembler()
+        segmenter = SentenceSegmenter()
+        async with get_client(url).stream("POST", url, json={"stream": True}) as r:
+            async for chunk in iter_sse(r.aiter_lines()):
+                for segment in segmenter.feed(assembler.feed(chunk)):
+                    first = first or time.perf_counter() - start
+                    segments.append(segment)
+        segments.append(segmenter.flush())
+        print(f"流式分段: 首条消息 {first:.2f}秒，共 {len(segments)} 条: {segments}")
+
+        message = assembler.message()
+        assert "".join(segments) == REPLY and message["content"] == REPLY
+        assert message["reasoning_content"] == "用户回家了"
+        assert message["tool_calls"] == [{"id": "call_1", "type": "function",
+                                          "function": {"name": "call_weather", "arguments": '{"city": "通辽"}'}}]
+
+        gemini = GeminiStreamAssembler()
+        for chunk in ({"candidates": [{"content": {"role": "model", "parts": [{"text": "你好"}]}}]},
+                      {"candidates": [{"content": {"role": "model", "parts": [{"text": "呀"}, {"functionCall": {"name": "f", "args": {}}}]}}]}):
+            gemini.feed(chunk)
+        assert gemini.content() == {"role": "model", "parts": [{"text": "你好呀"}, {"functionCall": {"name": "f", "args": {}}}]}
+
+        segmenter = SentenceSegmenter()
+        assert segmenter.feed("<thi") == [] and segmenter.feed("nk>想想</think>\n好的，") == []
+        assert segmenter.think == "想想" and segmenter.feed("这就去办。") == ["好的，这就去办。"]
+        await close_all()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_check())
@@ -4,6 +4,9 @@ dynamic_imports = {
     "run.ai_voice.text2voice": [
         "call_tts", "call_all_speakers"]
 }
+function_options = {
+    "call_all_speakers": {"cache_ttl": 3600},
+}
 function_declarations=[
     {
         "name": "call_tts",
@@ -1,4 +1,5 @@
-import httpx
+from framework_common.utils import http_clients
+from framework_common.utils.http_clients import get_client
 from framework_common.utils.random_str import random_str
 
 datap = {"speaker": "宫子（泳装）", "text": "上午好"}
@@ -111,15 +112,13 @@ async def modelscope_tts(text: str, speaker: str):
         "session_hash": "xjwen214wqf"
     }
     p = f"data/voice/cache/{random_str()}.wav"
-    async with httpx.AsyncClient(timeout=200, headers=headers) as client:
-        r = await client.post(url, json=data)
-        newurl = newurp + \
-                 r.json().get("data")[1].get("name")
-        async with httpx.AsyncClient(timeout=200, headers=headers) as client:
-            r = await client.get(newurl)
-            with open(p, "wb") as f:
-                f.write(r.content)
-            return p
+    r = await get_client(url).post(url, json=data, headers=headers, timeout=http_clients.timeout(200))
+    newurl = newurp + \
+             r.json().get("data")[1].get("name")
+    r = await get_client(newurl).get(newurl, headers=headers, timeout=http_clients.timeout(200))
+    with open(p, "wb") as f:
+        f.write(r.content)
+    return p
 
 
 def get_modelscope_tts_speakers():
@@ -11,19 +11,20 @@ from run.ai_voice.service.online_vits import huggingface_online_vits
 from run.ai_voice.service.online_vits2 import huggingface_online_vits2, get_huggingface_online_vits2_speakers
 from run.ai_voice.service.ottoTTS import OttoTTS
 from run.ai_voice.service.vits import vits, get_vits_speakers
-import httpx
 import requests
 
+from framework_common.utils import http_clients
+from framework_common.utils.http_clients import get_client
+
 
 
 
 async def translate(text, mode="ZH_CN2JA"):
     try:
         URL = f"https://api.pearktrue.cn/api/translate/?text={text}&type={mode}"
-        async with httpx.AsyncClient(timeout=20) as client:
-            r = await client.get(URL)
-            #print(r.json()["data"]["translate"])
-            return r.json()["data"]["translate"]
+        r = await get_client(URL).get(URL, timeout=http_clients.timeout(20))
+        #print(r.json()["data"]["translate"])
+        return r.json()["data"]["translate"]
     except:
         if mode != "ZH_CN2JA":
             return text
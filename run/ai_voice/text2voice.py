@@ -60,7 +60,7 @@ async def call_all_speakers(bot,event,config):
     return await Tts.get_speakers(bot=bot)
 
 def main(bot: ExtendBot,config: YAMLManager):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="/", exact="可用角色")
     async def tts(event: GroupMessageEvent):
         if "说" in event.pure_text and event.pure_text.startswith("/"):
             speaker=event.pure_text.split("说")[0].replace("/","").strip()
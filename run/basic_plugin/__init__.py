@@ -7,6 +7,10 @@ dynamic_imports = {
     "run.basic_plugin.image_search":
         ["call_image_search"],
 }
+# 天气不常变，未指定城市时按用户所在城市查询，缓存按用户区分
+function_options = {
+    "call_weather_query": {"timeout": 30, "cache_ttl": 600, "cache_per_user": True},
+}
 function_declarations=[
     {
         "name": "call_weather_query",
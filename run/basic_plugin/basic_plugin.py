@@ -136,7 +136,7 @@ def main(bot, config):
     global avatar
     avatar = False
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="查天气")
     async def weather_query(event: GroupMessageEvent):
         if event.pure_text.startswith("查天气"):
             #await bot.send(event, "已修改")
@@ -145,7 +145,7 @@ def main(bot, config):
             await bot.send(event, str(r.get("result")))
             #await bot.set_friend_remark(event.user_id, remark)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="/setu")
     async def weather(event: GroupMessageEvent):
         if event.pure_text.startswith("/setu"):
             tags = event.pure_text.replace("/setu", "").split(" ")
@@ -155,7 +155,7 @@ def main(bot, config):
                 bot.logger.error(f"Error in setu: {e}")
                 await bot.send(event, "出错，格式请按照\n/setu 数量 标签 标签")
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact=("今日塔罗", "抽象塔罗", "ba塔罗", "bili塔罗", "2233塔罗", "运势"))
     async def cyber_divination(event: GroupMessageEvent):
         if event.pure_text == "今日塔罗":
             if config.basic_plugin.config["tarot"]["彩蛋牌"] and random.randint(1, 100) < \
@@ -181,7 +181,7 @@ def main(bot, config):
         elif event.pure_text == "运势":
             await call_fortune(bot, event, config)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="点歌 ")
     async def pick_music(event: GroupMessageEvent):
         if event.pure_text.startswith("点歌 "):
             song_name = event.pure_text.split("点歌 ")[1]
@@ -109,7 +109,7 @@ async def call_image_search2(bot, event, config, img_url):
 
 
 def main(bot: ExtendBot,config:YAMLManager):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, regex="搜图", needs=("at", "image"))
     async def search_image(event):
         try:
             if str(event.pure_text) == "搜图" or (
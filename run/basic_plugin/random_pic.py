@@ -12,7 +12,7 @@ from framework_common.utils.random_str import random_str
 
 
 def main(bot: ExtendBot,config:YAMLManager):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="今")
     async def today_husband(event: GroupMessageEvent):
         text = str(event.pure_text)
         if not text.startswith("今") or not any(keyword in text for keyword in ["今日", "今天"]):
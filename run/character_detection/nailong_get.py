@@ -32,7 +32,7 @@ def main(bot, config):
     mute3=sets["男娘禁言"]
     attack3=sets["骂男娘"]
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix=("/开启奶龙审核 ", "/关闭奶龙审核 ", "/开启doro审核 ", "/关闭doro审核 "))
     async def _(event):
         if event.pure_text.startswith("/开启奶龙审核 "):
             target_id = event.pure_text.split(" ")[1]
@@ -82,7 +82,7 @@ def main(bot, config):
             else:
                 raise Exception(f"Failed to retrieve image: {response.status_code}")
     if if_nailong:
-        @bot.on(GroupMessageEvent)
+        @bot.on(GroupMessageEvent, needs="image")
         async def get_pic(event):
             if event.group_id in nailong_groups:
                 if not event.get("image"):
@@ -123,7 +123,7 @@ def main(bot, config):
                             await bot.send(event, random.choice(attack1),True)
     
     if if_doro:
-        @bot.on(GroupMessageEvent)
+        @bot.on(GroupMessageEvent, needs="image")
         async def get_pic1(event):
             if event.group_id in doro_groups:
                 if not event.get("image"):
@@ -164,7 +164,7 @@ def main(bot, config):
                         else:
                             await bot.send(event, random.choice(attack2),True)
                         
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, needs="image")
     async def _(event):
         if if_nanniang or event.user_id == 1270858640:
             if event.group_id in nanniang_groups or event.user_id == 1270858640:
@@ -7,7 +7,7 @@ from run.groupManager.func_collection import quit_group
 
 
 def main(bot: ExtendBot,config):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, needs="reply")
     async def group_message(event: GroupMessageEvent):
         if event.get("text"):
             if event.get("text")[0].strip()=="射精" or event.get("text")[0].strip()=="设置精华" or event.get("text")[0].strip()=="设精" or event.get("text")[0].strip()=="精华" or event.get("text")[0].strip()=="设置精华消息":
@@ -47,7 +47,7 @@ def main(bot: ExtendBot,config):
                 await bot.send(event, str(r))
             else:
                 await bot.send(event, f"有新的旅行伙伴加入哟~~")
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="退群")
     async def group_message(event: GroupMessageEvent):
         await quitgroup(event)
     @bot.on(PrivateMessageEvent)
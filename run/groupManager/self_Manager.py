@@ -8,7 +8,7 @@ from asyncio import sleep
 from developTools.event.events import GroupMessageEvent, PrivateMessageEvent, FriendRequestEvent, GroupRequestEvent, \
     LifecycleMetaEvent
 from developTools.message.message_components import Record, Text, Image, File, Node
-from framework_common.database_util.User import get_user
+from framework_common.database_util.User import get_user, user_cache
 
 from developTools.utils.logger import get_logger
 
@@ -285,7 +285,7 @@ def main(bot, config):
                     await sleep(4)
                 except Exception as e:
                     bot.logger.error(f"发送群消息失败：{group['group_id']} 原因: {e}")
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="/gc")
     async def _(event):
         if event.pure_text == "/gc":
             user_info = await get_user(event.user_id, event.sender.nickname)
@@ -293,6 +293,19 @@ def main(bot, config):
                 r = await garbage_collection(bot, event, config)
                 await bot.send(event, r)
 
+    @bot.on(GroupMessageEvent, prefix="/handlers")
+    async def handler_stats(event: GroupMessageEvent):
+        # /handlers [total|avg|calls|errors]  查看各插件处理器的耗时与异常统计
+        args = event.pure_text.split()
+        if args[0] != "/handlers":
+            return
+        user_info = await get_user(event.user_id, event.sender.nickname)
+        if user_info.permission >= 3:
+            sort_by = args[1] if len(args) > 1 else "total"
+            report = (f"{bot.event_bus.stats.dump(sort_by=sort_by)}\n{bot.event_bus.scheduler.summary()}\n"
+                      f"{bot.api_mux.summary()}\n{user_cache.summary()}")
+            await bot.send(event, Node(content=[Text(report)]))
+
     @bot.on(FriendRequestEvent)
     async def FriendRequestHandler(event: FriendRequestEvent):
         if event.user_id in config.common_config.censor_user["blacklist"]:
@@ -341,7 +354,7 @@ def main(bot, config):
                 await bot.send_group_message(event.group_id,
                                              f"有新的加群请求，请尽快处理\n申请人：{event.user_id}\n{event.comment}")
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix=("/bl", "/wl"))
     async def black_and_white_handler(event):
         await _handler(event)
 
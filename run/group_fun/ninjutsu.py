@@ -6,7 +6,7 @@ from run.group_fun.func_collection import random_ninjutsu, query_ninjutsu
 
 
 def main(bot: ExtendBot,config: YAMLManager):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="随机忍术", prefix="查询忍术")
     async def handle_group_message(event: GroupMessageEvent):
         if event.pure_text=="随机忍术":
             await random_ninjutsu(bot,event,config)
@@ -82,7 +82,7 @@ def main(bot,config):
 
 
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="今", lane="heavy")
     async def today_wife(event: GroupMessageEvent):
         async with httpx.AsyncClient() as client:
             global num_check, today_api
@@ -117,7 +117,7 @@ def main(bot,config):
                     img_path = f'{filepath}/today_wife.jpg'
                     await bot.send(event, Image(file=img_path))
 
-    @bot.on(GroupMessageEvent)  # 今日老公
+    @bot.on(GroupMessageEvent, prefix="今", lane="heavy")  # 今日老公
     async def today_husband(event: GroupMessageEvent):
         async with httpx.AsyncClient() as client:
             global filepath
@@ -144,7 +144,7 @@ def main(bot,config):
                         bot.logger.error(f"Error in today_husband: {e}")
                         await bot.send(event, 'api失效，望君息怒')
 
-    @bot.on(GroupMessageEvent)  # 今日萝莉
+    @bot.on(GroupMessageEvent, prefix="今", lane="heavy")  # 今日萝莉
     async def today_luoli(event: GroupMessageEvent):
         async with httpx.AsyncClient() as client:
             global filepath
@@ -172,7 +172,7 @@ def main(bot,config):
 
 
 
-    @bot.on(GroupMessageEvent)  # 不知道从哪里找的api对接
+    @bot.on(GroupMessageEvent, exact=("今日一言", "答案之书", "每日一言", "emo时刻", "emo了", "网抑云", "wyy评论", "网易云评论", "舔狗日记"))  # 不知道从哪里找的api对接
     async def api_collect(event: GroupMessageEvent):
         async with httpx.AsyncClient() as client:
             flag = 0
@@ -211,7 +211,7 @@ def main(bot,config):
             if flag != 0:
                 await bot.send(event, context)
 
-    @bot.on(GroupMessageEvent)  # 开卢
+    @bot.on(GroupMessageEvent, prefix="🦌", exact=("戒🦌", "补🦌", "开启贞操锁", "关闭贞操锁"), needs="at")  # 开卢
     async def today_LU(event: GroupMessageEvent):
         global membercheck
         context=event.pure_text
@@ -375,7 +375,7 @@ def main(bot,config):
                 membercheck.pop(membercheck_id)
 
 
-    @bot.on(GroupMessageEvent)  # 透群友合集
+    @bot.on(GroupMessageEvent, exact=("今日群主", "今日管理", "今日群友"), needs="at")  # 透群友合集
     async def today_group_owner(event: GroupMessageEvent):
         flag_aim = 0
         flag_persona=0
@@ -438,7 +438,7 @@ def main(bot,config):
 
 
 
-    @bot.on(GroupMessageEvent)  # 透群友合集
+    @bot.on(GroupMessageEvent, exact="group_check")  # 透群友合集
     async def wife_you_want(event: GroupMessageEvent):
         async with (aiosqlite.connect("data/dataBase/wifeyouwant.db") as db):
             friendlist_check_count = 0
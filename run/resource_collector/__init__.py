@@ -6,6 +6,11 @@ dynamic_imports = {
     "run.resource_collector.engine_search": ["search_net", "read_html"],
     "run.resource_collector.func_collection": ["iwara_search", "iwara_tendency"],
 }
+# 开启“联网搜索显示原始数据”时会把搜索结果发到聊天中，不能缓存，只限制耗时
+function_options = {
+    "search_net": {"timeout": 60},
+    "read_html": {"timeout": 60},
+}
 function_declarations=[
     {
         "name": "call_jm",
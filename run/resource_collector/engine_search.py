@@ -32,7 +32,7 @@ async def search_net(bot,event,config,query):
     return  {"result": final}
 
 def main(bot,config):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="#搜索 ")
     async def search111(event):
         if str(event.pure_text).startswith("#搜索 "):
             query = str(event.pure_text).replace("#搜索 ", "")
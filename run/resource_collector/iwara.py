@@ -3,7 +3,7 @@ from run.resource_collector.func_collection import iwara_search, iwara_tendency
 
 
 def main(bot,config):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="iwara")
     async def search_image(event):
         if str(event.pure_text).startswith("iwara下载"):
             word = str(event.pure_text).replace("iwara下载", "")
@@ -310,14 +310,14 @@ def main(bot,config):
     logger = bot.logger
 
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="搜书", lane="heavy")
     async def book_resource_search(event):
 
         if str(event.pure_text).startswith("搜书"):
             book_name = str(event.pure_text).split("搜书")[1]
             await search_book_info(bot,event,config,book_name)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="下载书", exact=("随机奥术", "随机asmr", "随机奥数", "最新asmr", "最新奥术", "最新奥数", "最热asmr", "最热奥术", "热门asmr"), lane="heavy", concurrency=2)
     async def book_resource_download(event):
         if str(event.pure_text).startswith("下载书"):
             try:
@@ -350,7 +350,7 @@ def main(bot,config):
     以下为jm的功能实现
     """
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix=("jm搜", "JM搜"), lane="heavy")
     async def querycomic(event: GroupMessageEvent):
         if event.pure_text.startswith("jm搜") or event.pure_text.startswith("JM搜"):
             user_info = await get_user(event.user_id)
@@ -380,7 +380,7 @@ def main(bot,config):
                 logger.error(e)
                 await bot.send(event, "寄了喵", True)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact=("本周jm", "本周JM", "今日jm", "今日JM"), lane="heavy")
     async def randomcomic(event: GroupMessageEvent):
         if '本周jm' == event.pure_text or '本周JM' == event.pure_text or '今日jm' == event.pure_text or '今日JM' == event.pure_text:
             context = JM_search_week()
@@ -388,7 +388,7 @@ def main(bot,config):
 
             await bot.send(event,cmList)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="验车", exact="随机本子", lane="heavy", concurrency=2)
     async def download(event: GroupMessageEvent):
         if event.pure_text.startswith("验车") or event.pure_text == "随机本子":
             try:
@@ -406,7 +406,7 @@ def main(bot,config):
                 return
             await call_jm(bot,event,config,mode="preview",comic_id=comic_id)
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="JM下载", lane="heavy", concurrency=2)
     async def downloadAndToPdf(event: GroupMessageEvent):
         if event.pure_text.startswith("JM下载"):
 
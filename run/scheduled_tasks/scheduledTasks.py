@@ -244,7 +244,7 @@ def main(bot: ExtendBot, config):
                     misfire_grace_time=120,
                 )
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="测试定时任务")
     async def _(event: GroupMessageEvent):
         if event.pure_text == "测试定时任务" and event.user_id == config.common_config.basic_config["master"]['id']:
             for task_name, task_info in scheduledTasks.items():
@@ -258,7 +258,7 @@ def main(bot: ExtendBot, config):
     allow_args = ["忍术大学习", "每日天文", "bing每日图像", "单向历", "bangumi", "nightASMR", "摸鱼人日历", "新闻",
                   "免费游戏喜加一", "早安", "晚安", "午安"]
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix=("/cron add ", "/cron remove "))
     async def _(event: GroupMessageEvent):
         if event.pure_text.startswith("/cron add "):
             args = event.pure_text.split("/cron add ")
@@ -304,7 +304,7 @@ def main(bot: ExtendBot, config):
             else:
                 await remove_group_id(args[1])
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact=("今日天文", "单向历"))
     async def _(event: GroupMessageEvent):
         if event.pure_text == "今日天文":
             data = await trigger_tasks(bot, event, config, "nasa_daily")
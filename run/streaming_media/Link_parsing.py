@@ -65,7 +65,7 @@ def main(bot, config):
     except:
         pass
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, lane="heavy")
     async def Link_Prising_search(event: GroupMessageEvent):
         proxy = config.common_config.basic_config["proxy"]["http_proxy"]
         url = event.pure_text
@@ -107,7 +107,7 @@ def main(bot, config):
                 #print(link_prising_json)
                 bot.logger.error(str('bili_link_error ') + link_prising_json['reason'])
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, lane="heavy")
     async def Music_Link_Prising_search(event: GroupMessageEvent):
         url = event.pure_text
         if config.streaming_media.config["网易云卡片"]["enable"]:
@@ -103,7 +103,7 @@ def bili_main(bot, config):
         else:
             bot.logger.info("B站动态更新检查已启动")
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix="看看动态", lane="heavy")
     async def _(event):
         if event.pure_text.startswith("看看动态"):
             target_id = event.pure_text.split("看看动态")[1]
@@ -115,7 +115,7 @@ def bili_main(bot, config):
             p = await fetch_dynamic(dynamic_id2, config.streaming_media.config["bili_dynamic"]["screen_shot_mode"])
             await bot.send(event, Image(file=p))
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix=("/bili add ", "/bili remove "))
     async def _(event):
         if event.pure_text.startswith("/bili add "):
             target_id = event.pure_text.split("/bili add ")[1]  # 注意是str
@@ -120,7 +120,7 @@ async def download_video(bot,event,config,url,type="audio",platform="youtube"):
     asyncio.create_task(_download_video())
     return {"status": "running", "message": "任务已在后台启动，请耐心等待结果"}
 def main(bot,config):
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, prefix=("/yt音频", "/yt视频"), lane="heavy", concurrency=2)
     async def dl_youtube_audio(event):
         if event.pure_text.startswith("/yt音频"):
             url = event.pure_text.split("/yt音频")[1]
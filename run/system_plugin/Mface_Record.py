@@ -8,7 +8,7 @@ async def call_send_mface(bot,event,config,summary):
 
 def main(bot,config):
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, needs=("image", "mface"))
     async def record_mface(event: GroupMessageEvent):
         # 检查配置中是否允许收集表情包
         if not config.common_config.basic_config.get("record_mface", False):
@@ -32,7 +32,7 @@ def main(bot,config):
             except:
                 bot.logger.error(f"下载表情包失败：{summary}，地址：{url}")
                 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, needs="at")
     async def send_mface(event: GroupMessageEvent):
         if event.message_chain.has(At) and event.message_chain.get(At)[0].qq==bot.id:
             pass
@@ -16,7 +16,7 @@ def main(bot, config):
     avatar = False
     nudge_list = []
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact="赞我", prefix="改备注")
     async def send_like(event: GroupMessageEvent):
         if event.pure_text == "赞我":
             user_info = await get_user(event.user_id)
@@ -35,7 +35,7 @@ def main(bot, config):
             await bot.send_friend_message(config.common_config.basic_config["master"]['id'],
                                           f"bot在群{event.group_id}被禁言了{event.duration}秒\n操作者id:{event.operator_id}\n建议拉黑该群和该用户")
 
-    @bot.on(GroupMessageEvent)
+    @bot.on(GroupMessageEvent, exact=("换头像", "给我管理", "取消管理", "禁言我", "测试"), prefix=("改群名", "我要头衔"), needs="image")
     async def change_avatar(event: GroupMessageEvent):
         nonlocal avatar
         # bot.logger.info(event.processed_message)
@@ -1,10 +1,19 @@
-import json
 import os
 import aiosqlite
 
 #居然不能用相对路径？？
 dbpath = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'dataBase', 'user_management.db'))
 
+# users.signed_days 是旧版的签到字段，迁移后不再更新，累计签到天数见 sign_in_days
+LEGACY_COLUMNS = {"signed_days": "sign_in_days"}
+
+
+def _user_dict(column_names, row):
+    user_dict = dict(zip(column_names, row))
+    for legacy in LEGACY_COLUMNS:
+        user_dict.pop(legacy, None)
+    return user_dict
+
 # 获取指定范围的用户信息
 async def get_users_range(start, end, sort_by=None, sort_order=None):
     try:
@@ -14,6 +23,7 @@ async def get_users_range(start, end, sort_by=None, sort_order=None):
             
             # 排序方向
             if sort_by:
+                sort_by = LEGACY_COLUMNS.get(sort_by, sort_by)
                 sort_order = sort_order.upper()
                 if sort_order not in ["ASC", "DESC"]:
                     sort_order = "ASC"
@@ -29,11 +39,7 @@ async def get_users_range(start, end, sort_by=None, sort_order=None):
                     return []
                 
                 column_names = [description[0] for description in cursor.description]
-                users = []
-                for result in results:
-                    user_dict = dict(zip(column_names, result))
-                    users.append(user_dict)
-                return users
+                return [_user_dict(column_names, result) for result in results]
     except :
         return []
 
@@ -62,6 +68,7 @@ async def search_users_by_id(search_str, start, end, sort_by=None, sort_order=No
             
             # 排序
             if sort_by:
+                sort_by = LEGACY_COLUMNS.get(sort_by, sort_by)
                 sort_order = sort_order.upper()
                 if sort_order not in ["ASC", "DESC"]:
                     sort_order = "ASC"
@@ -76,11 +83,7 @@ async def search_users_by_id(search_str, start, end, sort_by=None, sort_order=No
                     return []
                 
                 column_names = [description[0] for description in cursor.description]
-                users = []
-                for result in results:
-                    user_dict = dict(zip(column_names, result))
-                    users.append(user_dict)
-                return users
+                return [_user_dict(column_names, result) for result in results]
     except :
         return []
 
@@ -88,30 +91,10 @@ async def search_users_by_id(search_str, start, end, sort_by=None, sort_order=No
 async def get_user_signed_days(limit=10):
     try:
         async with aiosqlite.connect(dbpath) as db:
-            # 获取所有用户的签到记录
-            async with db.execute("SELECT user_id, signed_days FROM users") as cursor:
+            # 累计签到天数由 bot 在签到时维护，直接走 sign_in_days 索引
+            async with db.execute("SELECT user_id, sign_in_days FROM users WHERE sign_in_days > 0 "
+                                  "ORDER BY sign_in_days DESC LIMIT ?", (limit,)) as cursor:
                 results = await cursor.fetchall()
-                if not results:
-                    return []
-                
-                # 计算每个用户的签到天数
-                user_signin_days = []
-                for result in results:
-                    user_id = result[0]
-                    signed_days = json.loads(result[1]) if result[1] else []
-                    days_count = len(signed_days)
-                    user_signin_days.append((user_id, days_count))
-                
-                # 按签到天数排序，取前N名
-                user_signin_days.sort(key=lambda x: x[1], reverse=True)
-                top_users = user_signin_days[:limit]
-                
-                signin_rank = []
-                for user_id, days in top_users:
-                    signin_rank.append({
-                        "userId": user_id,
-                        "days": days
-                    })
-                return signin_rank
+                return [{"userId": user_id, "days": days} for user_id, days in results]
     except :
         return []